@@ -0,0 +1,45 @@
+"""Decisions for adaptive sampling: when the judges agree enough, and when a solution is good enough to stop."""
+
+from collections import Counter
+from typing import Callable, Hashable, List, Optional
+
+# At first this many judges are sampled, and more up to the maximum only if they have no majority.
+INITIAL_JUDGES = 2
+MAX_JUDGES = 5
+# Solutions are sampled this many at a time, until one of them runs cleanly with every evaluation function.
+SOLUTIONS_PER_ROUND = 2
+
+
+def majority(judgements: List, choice: Callable[[dict], Hashable]) -> Optional[int]:
+    """Returns the index of the first judge whose choice more than half of the judges share, or None if there's none."""
+    if not judgements:
+        return None
+    choices = [choice(judgement) for judgement in judgements]
+    most_common, count = Counter(choices).most_common(1)[0]
+    if count * 2 <= len(choices):
+        return None
+    return choices.index(most_common)
+
+
+def agreement_ranking(
+    judgements: List, choice: Callable[[dict], Hashable], id_key: str, rationale_key: str
+) -> Optional[dict]:
+    """A ranking of the judges in the schema of the meta-ranking prompts, if the judges have a majority.
+
+    This stands in for asking an LLM to judge the judges, when there's nothing to decide.
+    """
+    judge_index = majority(judgements, choice)
+    if judge_index is None:
+        return None
+    agreeing = sum(choice(judgement) == choice(judgements[judge_index]) for judgement in judgements)
+    return {
+        id_key: judge_index,
+        rationale_key: f"{agreeing} of {len(judgements)} judges agree, so the judges were not ranked.",
+    }
+
+
+def runs_cleanly(outputs: List[dict]) -> bool:
+    """Whether a solution ran with every evaluation function without errors, timeouts or error output."""
+    return bool(outputs) and all(
+        output["returncode"] == 0 and not output["timed_out"] and not output["stderr"].strip() for output in outputs
+    )
@@ -0,0 +1,85 @@
+"""Local aggregation of the rankings of several judges, instead of asking an LLM to judge the judges."""
+
+from typing import TYPE_CHECKING, Callable, Hashable, List, Sequence
+
+# NumPy is imported by the functions which use it, so that importing the pipeline with the default LLM meta-ranking
+# doesn't load it.
+if TYPE_CHECKING:
+    import numpy
+
+# Asking an LLM to rank the judges, aggregating their rankings locally without a call, or aggregating locally
+# and escalating to an LLM only when the judges disagree.
+LLM = "llm"
+LOCAL = "local"
+ESCALATE = "escalate"
+META_RANKING_MODES = (LLM, LOCAL, ESCALATE)
+
+
+def score_matrix(
+    judgements: List, ranked: Callable[[object], List[Hashable]], candidate_ids: Sequence[Hashable]
+) -> "numpy.ndarray":
+    """The Borda scores given by each judge to each candidate, as a candidates × judges matrix.
+
+    `ranked(judgement)` gives the ids a judge ranked, from the best down. They are scored n - 1, n - 2 and so on,
+    and the candidates a judge left out share the mean of the remaining scores, so that choosing only the best
+    candidate counts as a ranking with a tie for the rest.
+    """
+    import numpy as np
+
+    index = {candidate_id: row for row, candidate_id in enumerate(candidate_ids)}
+    number_of_candidates = len(candidate_ids)
+    scores = np.empty((number_of_candidates, len(judgements)))
+    for column, judgement in enumerate(judgements):
+        rows = list(dict.fromkeys(index[candidate_id] for candidate_id in ranked(judgement) if candidate_id in index))
+        remaining = number_of_candidates - len(rows)
+        scores[:, column] = (remaining - 1) / 2 if remaining else 0
+        scores[rows, column] = number_of_candidates - 1 - np.arange(len(rows))
+    return scores
+
+
+def kendall_tau(scores: "numpy.ndarray") -> "numpy.ndarray":
+    """The Kendall tau-b correlations between all the columns of a matrix of scores, as a columns × columns matrix.
+
+    Columns with every candidate tied correlate with nothing, by 0.
+    """
+    import numpy as np
+
+    signs = np.sign(scores[:, None, :] - scores[None, :, :])
+    concordance = np.einsum("ijk,ijl->kl", signs, signs)
+    norms = np.sqrt(np.diag(concordance))
+    denominator = np.outer(norms, norms)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        return np.where(denominator > 0, concordance / np.where(denominator > 0, denominator, 1), 0.0)
+
+
+def aggregate(
+    judgements: List, ranked: Callable[[object], List[Hashable]], candidate_ids: Sequence[Hashable]
+) -> dict:
+    """Aggregates the rankings of the judges into a consensus, and measures how well each judge agrees with it.
+
+    The consensus orders the candidates by their total Borda score. The best judge is the one agreeing most with
+    the others by Kendall tau, which is the input ranking closest to a Kemeny consensus within a factor of two.
+    The agreement of each judge is its Kendall tau with the consensus, and the overall agreement their mean.
+    """
+    import numpy as np
+
+    scores = score_matrix(judgements, ranked, candidate_ids)
+    consensus = scores.sum(axis=1)
+    correlations = kendall_tau(np.column_stack([scores, consensus]))
+    judge_correlations = correlations[:-1, :-1]
+    number_of_judges = len(judgements)
+    mean_correlation_with_others = (
+        (judge_correlations.sum(axis=1) - np.diag(judge_correlations)) / (number_of_judges - 1)
+        if number_of_judges > 1
+        else np.ones(number_of_judges)
+    )
+    judge_agreement = correlations[:-1, -1]
+    # Stable, so that tied candidates keep their order.
+    order = np.argsort(-consensus, kind="stable")
+    return {
+        "consensus": [candidate_ids[row] for row in order],
+        "consensus_scores": [float(consensus[row]) for row in order],
+        "judge_agreement": [float(agreement) for agreement in judge_agreement],
+        "agreement": float(judge_agreement.mean()) if number_of_judges else 0.0,
+        "best_judge": int(np.argmax(mean_correlation_with_others)) if number_of_judges else None,
+    }
@@ -0,0 +1,204 @@
+"""Pluggable LLM backends for chat completions."""
+
+import hashlib
+import json
+import math
+import random
+import re
+import time
+from dataclasses import dataclass
+from typing import Callable, Dict, List, Optional, Union
+
+from .errors import TransientError
+from .serialization import count_tokens
+
+SCHEMA_PATTERN = re.compile(r"<JSON-Schema>(.*?)</JSON-Schema>", re.DOTALL)
+
+
+@dataclass
+class Completion:
+    content: str
+    prompt_tokens: Optional[int] = None
+    completion_tokens: Optional[int] = None
+
+    @property
+    def total_tokens(self) -> Optional[int]:
+        if self.prompt_tokens is None or self.completion_tokens is None:
+            return None
+        return self.prompt_tokens + self.completion_tokens
+
+
+class Backend:
+    """Produces chat completions for sessions of messages.
+
+    Errors are raised as they are, `rate_limit.is_retryable` decides which ones are retried. Backends which can
+    sample several completions in a single request set `max_samples_per_request` and override `complete_n`.
+    """
+
+    max_samples_per_request = 1
+
+    def complete(self, session, model: str, temperature: float, sample_index: int = 0) -> Completion:
+        raise NotImplementedError
+
+    def complete_n(self, session, model: str, temperature: float, sample_indices: List[int]) -> List[Completion]:
+        """Returns a completion for each sample index, at most `max_samples_per_request` in a single request.
+
+        The token usage of a request is reported on its first completion, because it's only known for the whole
+        request: the prompt is charged only once however many completions are sampled.
+        """
+        return [self.complete(session, model, temperature, sample_index) for sample_index in sample_indices]
+
+
+class OpenAIBackend(Backend):
+    """Chat completions from the OpenAI API, sampling several completions of a prompt in one request with `n`.
+
+    Set `max_samples_per_request` to 1 for compatible APIs which don't support `n`.
+    """
+
+    def __init__(self, client, max_samples_per_request: int = 128):
+        self.client = client
+        self.max_samples_per_request = max_samples_per_request
+
+    def complete(self, session, model: str, temperature: float, sample_index: int = 0) -> Completion:
+        return self.complete_n(session, model, temperature, [sample_index])[0]
+
+    def complete_n(self, session, model: str, temperature: float, sample_indices: List[int]) -> List[Completion]:
+        completion = self.client.chat.completions.create(
+            model=model, messages=session, temperature=temperature, n=len(sample_indices)
+        )
+        usage = completion.usage
+        return [
+            Completion(
+                content=choice.message.content,
+                prompt_tokens=(None if usage is None else usage.prompt_tokens) if index == 0 else 0,
+                completion_tokens=(None if usage is None else usage.completion_tokens) if index == 0 else 0,
+            )
+            for index, choice in enumerate(sorted(completion.choices, key=lambda choice: choice.index))
+        ]
+
+
+class StubBackend(Backend):
+    """A deterministic offline backend for tests and benchmarks.
+
+    Prompts with a `<JSON-Schema>` block get a JSON instance conforming to the schema, and other prompts get
+    a Python code block: a solution function when an evaluation function is given, an evaluation function otherwise.
+    The response only depends on the session and the sample index. The latency is either fixed, drawn by a
+    function from a random generator, or given as a distribution for `latency_distribution`. A fraction
+    `error_rate` of the requests fail with a retryable error after the latency. Like the OpenAI API, up to
+    `max_samples_per_request` completions are sampled in a single request.
+    """
+
+    def __init__(
+        self,
+        latency: Union[float, dict, Callable[[random.Random], float]] = 0.0,
+        error_rate: float = 0.0,
+        max_samples_per_request: int = 128,
+    ):
+        self.latency = latency_distribution(latency) if isinstance(latency, dict) else latency
+        self.error_rate = error_rate
+        self.max_samples_per_request = max_samples_per_request
+        # Errors and latencies are drawn independently of the deterministic responses.
+        self.rng = random.Random(0)
+
+    def complete(self, session, model: str, temperature: float, sample_index: int = 0) -> Completion:
+        return self.complete_n(session, model, temperature, [sample_index])[0]
+
+    def complete_n(self, session, model: str, temperature: float, sample_indices: List[int]) -> List[Completion]:
+        latency = self.latency(self.rng) if callable(self.latency) else self.latency
+        if latency > 0:
+            time.sleep(latency)
+        if self.error_rate > 0 and self.rng.random() < self.error_rate:
+            raise TransientError("Simulated backend failure.")
+        contents = [self._content(session, sample_index) for sample_index in sample_indices]
+        prompt_tokens = sum(count_tokens(message["content"], model) for message in session)
+        completion_tokens = sum(count_tokens(content, model) for content in contents)
+        return [
+            Completion(
+                content,
+                prompt_tokens=prompt_tokens if index == 0 else 0,
+                completion_tokens=completion_tokens if index == 0 else 0,
+            )
+            for index, content in enumerate(contents)
+        ]
+
+    def _content(self, session, sample_index: int) -> str:
+        seed = hashlib.sha256(json.dumps([session, sample_index], sort_keys=True).encode("utf-8")).digest()
+        rng = random.Random(seed)
+        prompt = session[-1]["content"]
+        schema_match = SCHEMA_PATTERN.search(prompt)
+        if schema_match is not None:
+            content = json.dumps(schema_instance(json.loads(schema_match.group(1)), rng))
+        elif "<evaluation-function>" in prompt:
+            content = f"```python\ndef solution(*args, **kwargs):\n    return {rng.randint(0, 100)}\n```"
+        else:
+            content = (
+                "```python\n"
+                "result = solution()\n"
+                f"print(f\"Result: {{result}}, expected: {rng.randint(0, 100)}\")\n"
+                "```"
+            )
+        return content
+
+
+def latency_distribution(spec: dict) -> Callable[[random.Random], float]:
+    """Returns a latency sampler from a JSON friendly distribution spec.
+
+    For example {"distribution": "lognormal", "median": 0.8, "sigma": 0.5}, {"distribution": "exponential",
+    "mean": 1.0} or {"distribution": "uniform", "low": 0.5, "high": 2.0}.
+    """
+    distribution = spec.get("distribution", "fixed")
+    if distribution == "fixed":
+        return lambda rng: spec["seconds"]
+    if distribution == "lognormal":
+        return lambda rng: rng.lognormvariate(math.log(spec["median"]), spec.get("sigma", 0.5))
+    if distribution == "exponential":
+        return lambda rng: rng.expovariate(1 / spec["mean"])
+    if distribution == "uniform":
+        return lambda rng: rng.uniform(spec["low"], spec["high"])
+    raise ValueError(f"Unknown latency distribution {distribution}.")
+
+
+def schema_instance(schema: dict, rng: random.Random, name: str = "value", index: int = 0):
+    """Generates a random instance of the subset of JSON Schema used in the prompts."""
+    if "enum" in schema:
+        return rng.choice(schema["enum"])
+    schema_type = schema.get("type")
+    if schema_type == "object":
+        return {
+            property_name: schema_instance(property_schema, rng, property_name, index)
+            for property_name, property_schema in schema.get("properties", {}).items()
+        }
+    if schema_type == "array":
+        item_schema = schema.get("items", {})
+        length = schema.get("minItems", schema.get("maxItems", 3))
+        items = [schema_instance(item_schema, rng, name, item_index) for item_index in range(length)]
+        _make_enums_distinct(item_schema, items, rng)
+        return items
+    if schema_type == "integer":
+        return rng.randint(0, 10)
+    if schema_type == "number":
+        return rng.random()
+    if schema_type == "boolean":
+        return rng.random() < 0.5
+    return f"{name} {index}"
+
+
+def _make_enums_distinct(item_schema: dict, items, rng: random.Random):
+    # For example, the ids in a ranking should all be different.
+    for property_name, property_schema in item_schema.get("properties", {}).items():
+        values = property_schema.get("enum")
+        if values is not None and len(values) >= len(items):
+            for item, value in zip(items, rng.sample(values, len(items))):
+                item[property_name] = value
+
+
+# Backend factories by name, called with the context and the backend options of the configuration.
+BACKENDS: Dict[str, Callable[..., Backend]] = {
+    "openai": lambda context, **options: OpenAIBackend(context.client, **options),
+    "stub": lambda context, **options: StubBackend(**options),
+}
+
+
+def register_backend(name: str, factory: Callable[..., Backend]):
+    """Makes a backend available by name in the configuration."""
+    BACKENDS[name] = factory
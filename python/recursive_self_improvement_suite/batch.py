@@ -0,0 +1,146 @@
+"""Batch driver running many iterations from a shared work queue of tasks."""
+
+import logging
+import queue
+import threading
+from typing import Iterator, Optional
+
+from . import engine
+from .checkpoint import Checkpoint
+from .config import get_context
+from .errors import ChatError, InvalidResponseError
+from .task_family import TaskFamily, get_task_family
+
+
+def is_recoverable(error: Exception) -> bool:
+    """Whether the failure only loses the work item at hand, not the whole batch.
+
+    Backend failures which persisted through the retries and responses which stayed invalid are recoverable.
+    Configuration and programming errors, and backend failures which retrying doesn't help, like a rejected API key,
+    are not.
+    """
+    return isinstance(error, InvalidResponseError) or (isinstance(error, ChatError) and error.retryable)
+
+
+_DONE = object()
+# The stage marking a task whose trajectory the caller has received, so that a resumed batch doesn't yield it again.
+DELIVERED_STAGE = "delivered"
+
+
+def run_batch(
+    iterations: int,
+    challenges_per_iteration: int = 2,
+    max_in_flight: int = 4,
+    concurrency: int = engine.DEFAULT_CONCURRENCY,
+    checkpoint_directory: Optional[str] = None,
+    family: Optional[TaskFamily] = None,
+) -> Iterator[dict]:
+    """Runs the iterations of the task family and yields the trajectories of the tasks in the order they complete.
+
+    A producer selects the tasks of each iteration into a bounded work queue, and `max_in_flight` workers
+    process tasks from it, so that the next iteration's tasks are being selected while the previous
+    ones are still being solved. A task which fails recoverably is logged and skipped. Any other failure stops
+    the batch and is raised to the caller. The family is config.task_family by default, and the tasks are
+    challenges for the coding family.
+
+    With a checkpoint directory, a task is marked as delivered once the caller asks for the next trajectory, that
+    is, after it has written the previous one, and a resumed batch skips the delivered tasks.
+    """
+    family = family if family is not None else get_task_family(get_context().config.task_family)
+    task_name = family.task_name
+    checkpoint = Checkpoint(checkpoint_directory)
+    work = queue.Queue(maxsize=max_in_flight)
+    results = queue.Queue()
+    # The unrecoverable failures of the threads, and whether the batch is stopping because of them.
+    failures = []
+    stopping = threading.Event()
+
+    def fail(error: Exception):
+        failures.append(error)
+        stopping.set()
+
+    def produce():
+        try:
+            for iteration in range(iterations):
+                if stopping.is_set():
+                    return
+                iteration_checkpoint = checkpoint.scope(f"iteration-{iteration}")
+                try:
+                    selection = family.select_tasks(
+                        iteration_checkpoint, concurrency, challenges_per_iteration, iteration
+                    )
+                except Exception as e:
+                    if not is_recoverable(e):
+                        raise
+                    logging.error(f"Selecting the {task_name}s of iteration {iteration} failed: {e}")
+                    continue
+                for index in range(len(selection[family.best_tasks_key])):
+                    work.put((iteration, index, selection, iteration_checkpoint.scope(f"{task_name}-{index}")))
+        except Exception as e:
+            fail(e)
+        finally:
+            for _ in range(max_in_flight):
+                work.put(_DONE)
+
+    def consume():
+        try:
+            while True:
+                item = work.get()
+                if item is _DONE:
+                    return
+                if stopping.is_set():
+                    # The rest of the work is drained, so that the producer isn't blocked.
+                    continue
+                iteration, index, selection, task_checkpoint = item
+                if task_checkpoint.completed(DELIVERED_STAGE):
+                    logging.info(f"Skipping {task_name} {index} of iteration {iteration}, which was delivered already")
+                    continue
+                try:
+                    trajectory = family.process_task(
+                        selection[family.best_tasks_key][index], task_checkpoint, concurrency
+                    )
+                except Exception as e:
+                    if not is_recoverable(e):
+                        fail(e)
+                        continue
+                    logging.error(f"{task_name.capitalize()} {index} of iteration {iteration} failed: {e}")
+                    continue
+                results.put(
+                    (
+                        task_checkpoint,
+                        {
+                            "task_family": family.name,
+                            "iteration": iteration,
+                            f"{task_name}_index": index,
+                            f"{task_name}_selection": {
+                                key: value for key, value in selection.items() if key != family.best_tasks_key
+                            },
+                            **trajectory,
+                        },
+                    )
+                )
+        finally:
+            results.put(_DONE)
+
+    threads = [threading.Thread(target=produce, daemon=True)] + [
+        threading.Thread(target=consume, daemon=True) for _ in range(max_in_flight)
+    ]
+    for thread in threads:
+        thread.start()
+    running_workers = max_in_flight
+    try:
+        while running_workers > 0:
+            result = results.get()
+            if failures:
+                raise failures[0]
+            if result is _DONE:
+                running_workers -= 1
+            else:
+                task_checkpoint, trajectory = result
+                yield trajectory
+                task_checkpoint.stage(DELIVERED_STAGE, lambda: True)
+        if failures:
+            raise failures[0]
+    finally:
+        # Also when the caller stops early.
+        stopping.set()
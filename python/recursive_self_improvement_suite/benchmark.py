@@ -0,0 +1,189 @@
+"""End-to-end benchmark of the coding pipeline against a simulated LLM backend."""
+
+import json
+import logging
+import threading
+import time
+from collections import defaultdict
+from datetime import datetime, timezone
+from typing import Dict, List, Optional, Union
+
+from . import engine
+from . import recursive_self_improvement_suite as suite
+from .backends import Backend, Completion, StubBackend
+from .checkpoint import Checkpoint, current_stage
+from .config import Config, Context, get_context, set_context
+from .metrics import stage_kind
+
+
+class RecordingBackend(Backend):
+    """Wraps a backend and records the stage, the latency and the outcome of every request."""
+
+    def __init__(self, backend: Backend):
+        self.backend = backend
+        self.max_samples_per_request = backend.max_samples_per_request
+        self.calls = []
+        self.lock = threading.Lock()
+
+    def complete(self, session, model: str, temperature: float, sample_index: int = 0) -> Completion:
+        return self.complete_n(session, model, temperature, [sample_index])[0]
+
+    def complete_n(self, session, model: str, temperature: float, sample_indices: List[int]) -> List[Completion]:
+        stage = current_stage.get()
+        start = time.monotonic()
+        succeeded = False
+        try:
+            completions = self.backend.complete_n(session, model, temperature, sample_indices)
+            succeeded = True
+            return completions
+        finally:
+            with self.lock:
+                self.calls.append(
+                    {
+                        "stage": stage,
+                        "model": model,
+                        "latency": time.monotonic() - start,
+                        "samples": len(sample_indices),
+                        "succeeded": succeeded,
+                    }
+                )
+
+
+def percentile(values: List[float], q: float) -> Optional[float]:
+    """The q:th percentile of the values by linear interpolation between the closest ranks."""
+    if not values:
+        return None
+    ordered = sorted(values)
+    position = (len(ordered) - 1) * q / 100
+    lower = int(position)
+    upper = min(lower + 1, len(ordered) - 1)
+    return ordered[lower] + (ordered[upper] - ordered[lower]) * (position - lower)
+
+
+def summarize(values: List[float]) -> Dict[str, Optional[float]]:
+    return {
+        "count": len(values),
+        "mean": sum(values) / len(values) if values else None,
+        "p50": percentile(values, 50),
+        "p95": percentile(values, 95),
+        "p99": percentile(values, 99),
+        "max": max(values, default=None),
+    }
+
+
+def run_benchmark(
+    iterations: int = 3,
+    latency: Union[float, dict] = 0.0,
+    error_rate: float = 0.0,
+    concurrency: int = engine.DEFAULT_CONCURRENCY,
+    requests_per_minute: float = 1e6,
+    tokens_per_minute: float = 1e9,
+    max_samples_per_request: int = 128,
+    adaptive_sampling: bool = False,
+) -> dict:
+    """Runs iterations of the coding pipeline stages against the stub backend, and returns the measurements.
+
+    The rate limits default to practically unlimited, so that the orchestration itself is measured.
+    """
+    recorder = RecordingBackend(
+        StubBackend(latency=latency, error_rate=error_rate, max_samples_per_request=max_samples_per_request)
+    )
+    benchmark_config = Config(
+        backend="stub",
+        requests_per_minute=requests_per_minute,
+        tokens_per_minute=tokens_per_minute,
+        adaptive_sampling=adaptive_sampling,
+    )
+    stage_durations = defaultdict(list)
+    stage_lock = threading.Lock()
+
+    def observe(qualified_name: str, seconds: float):
+        with stage_lock:
+            stage_durations[stage_kind(qualified_name)].append(seconds)
+
+    iteration_durations = []
+    previous_context = get_context()
+    benchmark_context = set_context(Context(benchmark_config, backend=recorder))
+    start = time.monotonic()
+    try:
+        for iteration in range(iterations):
+            iteration_start = time.monotonic()
+            checkpoint = Checkpoint(name=f"iteration-{iteration}", observer=observe)
+            suite.run_iteration(checkpoint, concurrency)
+            iteration_durations.append(time.monotonic() - iteration_start)
+            logging.info(f"Benchmark iteration {iteration} took {iteration_durations[-1]:.2f}s")
+    finally:
+        set_context(previous_context)
+    wall_seconds = time.monotonic() - start
+
+    # The stub counts the prompt tokens like the real backend would, so these measure the prompt sizes per builder.
+    call_totals = benchmark_context.metrics.summary()
+    calls_by_stage = defaultdict(list)
+    for call in recorder.calls:
+        calls_by_stage[stage_kind(call["stage"])].append(call)
+    return {
+        "timestamp": datetime.now(timezone.utc).isoformat(),
+        "parameters": {
+            "iterations": iterations,
+            "latency": latency,
+            "error_rate": error_rate,
+            "concurrency": concurrency,
+            "requests_per_minute": requests_per_minute,
+            "tokens_per_minute": tokens_per_minute,
+            "max_samples_per_request": max_samples_per_request,
+            "adaptive_sampling": adaptive_sampling,
+        },
+        "end_to_end": {
+            "wall_seconds": wall_seconds,
+            "iterations_per_minute": iterations / wall_seconds * 60,
+            "calls": len(recorder.calls),
+            "failed_calls": sum(not call["succeeded"] for call in recorder.calls),
+            "samples": sum(call["samples"] for call in recorder.calls if call["succeeded"]),
+            "calls_per_second": len(recorder.calls) / wall_seconds,
+            "iteration_seconds": summarize(iteration_durations),
+            "call_latency_seconds": summarize([call["latency"] for call in recorder.calls]),
+        },
+        "stages": {
+            stage: {
+                "stage_seconds": summarize(durations),
+                "calls": len(calls_by_stage[stage]),
+                "failed_calls": sum(not call["succeeded"] for call in calls_by_stage[stage]),
+                "call_latency_seconds": summarize([call["latency"] for call in calls_by_stage[stage]]),
+                "mean_prompt_tokens": (
+                    call_totals[stage]["prompt_tokens"] / call_totals[stage]["calls"] if stage in call_totals else None
+                ),
+            }
+            for stage, durations in sorted(stage_durations.items())
+        },
+    }
+
+
+def record_results(results: dict, path: str):
+    """Appends the results as a JSON line, so that the runs in the file can be compared with each other."""
+    with open(path, "a", encoding="utf-8") as results_file:
+        results_file.write(json.dumps(results, sort_keys=True) + "\n")
+
+
+def format_results(results: dict) -> str:
+    """A human readable table of the results."""
+    end_to_end = results["end_to_end"]
+    lines = [
+        f"{results['parameters']['iterations']} iterations in {end_to_end['wall_seconds']:.2f}s: "
+        f"{end_to_end['iterations_per_minute']:.2f} iterations/min, {end_to_end['calls_per_second']:.2f} calls/s, "
+        f"{end_to_end['calls']} calls of which {end_to_end['failed_calls']} failed",
+        f"{'stage':<36} {'calls':>6} {'p50 s':>8} {'p95 s':>8} {'p99 s':>8} {'prompt tok':>10}",
+    ]
+
+    def row(name, summary, calls, prompt_tokens=None):
+        prompt_tokens = "-" if prompt_tokens is None else f"{prompt_tokens:.0f}"
+        return (
+            f"{name:<36} {calls:>6} {summary['p50']:>8.3f} {summary['p95']:>8.3f} {summary['p99']:>8.3f} "
+            f"{prompt_tokens:>10}"
+        )
+
+    lines.append(row("iteration", end_to_end["iteration_seconds"], end_to_end["calls"]))
+    for stage, measurements in results["stages"].items():
+        lines.append(
+            row(stage, measurements["stage_seconds"], measurements["calls"], measurements["mean_prompt_tokens"])
+        )
+    return "\n".join(lines)
@@ -0,0 +1,121 @@
+"""Content-addressed persistent cache for chat completions."""
+
+import hashlib
+import json
+import sqlite3
+import threading
+import time
+from typing import Optional
+
+# Reads and writes the cache. Reruns with identical prompts are served from the cache.
+READ_THROUGH = "read-through"
+# Only writes the cache, for example to collect fresh samples while still keeping them for later reruns.
+WRITE_ONLY = "write-only"
+MODES = (READ_THROUGH, WRITE_ONLY)
+
+# Eviction is checked after this many writes instead of after every one.
+EVICTION_INTERVAL = 100
+
+
+def cache_key(model: str, session, temperature: float, sample_index: int) -> str:
+    """Hashes everything which determines the distribution of a completion, plus the index of the sample."""
+    content = json.dumps(
+        {
+            "model": model,
+            "session": session,
+            "temperature": temperature,
+            "sample_index": sample_index,
+        },
+        sort_keys=True,
+        separators=(",", ":"),
+        ensure_ascii=False,
+    )
+    return hashlib.sha256(content.encode("utf-8")).hexdigest()
+
+
+class ResponseCache:
+    """An SQLite backed cache of chat completions, safe to share between threads.
+
+    Entries older than `max_age_seconds` are evicted, and the least recently used entries are evicted
+    when the stored responses exceed `max_bytes`.
+    """
+
+    def __init__(
+        self,
+        path: str,
+        mode: str = READ_THROUGH,
+        max_bytes: Optional[int] = None,
+        max_age_seconds: Optional[float] = None,
+    ):
+        if mode not in MODES:
+            raise ValueError(f"Unknown cache mode {mode}, expected one of {MODES}.")
+        self.mode = mode
+        self.max_bytes = max_bytes
+        self.max_age_seconds = max_age_seconds
+        self.writes = 0
+        self.lock = threading.Lock()
+        self.connection = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self.connection.execute("PRAGMA journal_mode=WAL")
+        self.connection.execute(
+            """\
+CREATE TABLE IF NOT EXISTS responses (
+    key TEXT PRIMARY KEY,
+    response TEXT NOT NULL,
+    size INTEGER NOT NULL,
+    created REAL NOT NULL,
+    accessed REAL NOT NULL
+)"""
+        )
+        self.connection.execute("CREATE INDEX IF NOT EXISTS responses_accessed ON responses (accessed)")
+        self.evict()
+
+    def get(self, key: str) -> Optional[str]:
+        if self.mode != READ_THROUGH:
+            return None
+        now = time.time()
+        with self.lock:
+            row = self.connection.execute(
+                "SELECT response, created FROM responses WHERE key = ?", (key,)
+            ).fetchone()
+            if row is None:
+                return None
+            response, created = row
+            if self.max_age_seconds is not None and created < now - self.max_age_seconds:
+                return None
+            self.connection.execute("UPDATE responses SET accessed = ? WHERE key = ?", (now, key))
+        return response
+
+    def put(self, key: str, response: str):
+        now = time.time()
+        with self.lock:
+            self.connection.execute(
+                "INSERT OR REPLACE INTO responses (key, response, size, created, accessed) VALUES (?, ?, ?, ?, ?)",
+                (key, response, len(response.encode("utf-8")), now, now),
+            )
+            self.writes += 1
+            evict = self.writes % EVICTION_INTERVAL == 0
+        if evict:
+            self.evict()
+
+    def evict(self):
+        """Removes expired entries, and then the least recently used ones until the size limit is met."""
+        with self.lock:
+            if self.max_age_seconds is not None:
+                self.connection.execute(
+                    "DELETE FROM responses WHERE created < ?", (time.time() - self.max_age_seconds,)
+                )
+            if self.max_bytes is not None:
+                # Keeps the most recently accessed entries whose cumulative size fits in the limit.
+                self.connection.execute(
+                    """\
+DELETE FROM responses WHERE key IN (
+    SELECT key FROM (
+        SELECT key, SUM(size) OVER (ORDER BY accessed DESC, key) AS cumulative_size FROM responses
+    ) WHERE cumulative_size > ?
+)""",
+                    (self.max_bytes,),
+                )
+
+    def close(self):
+        with self.lock:
+            self.connection.close()
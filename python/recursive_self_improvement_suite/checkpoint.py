@@ -0,0 +1,80 @@
+"""On-disk checkpoints for resuming pipeline stages."""
+
+import contextvars
+import gzip
+import json
+import logging
+import os
+import time
+from typing import Callable, Optional, TypeVar
+
+T = TypeVar("T")
+
+# The full name of the stage being computed, for example "challenge-0/solutions", for attributing calls to stages.
+current_stage = contextvars.ContextVar("current_stage", default=None)
+
+
+class Checkpoint:
+    """Persists the output of each completed stage in a directory, so that a rerun resumes after the last one.
+
+    Each stage is stored as compact, gzip compressed JSON. Without a directory nothing is persisted and every
+    stage is computed. The optional observer is called with the full name and the duration of every computed stage.
+    """
+
+    def __init__(
+        self,
+        directory: Optional[str] = None,
+        name: str = "",
+        observer: Optional[Callable[[str, float], None]] = None,
+    ):
+        self.directory = directory
+        self.name = name
+        self.observer = observer
+        if directory is not None:
+            os.makedirs(directory, exist_ok=True)
+
+    def path(self, name: str) -> str:
+        return os.path.join(self.directory, f"{name}.json.gz")
+
+    def scope(self, name: str) -> "Checkpoint":
+        """Returns a checkpoint for the stages of a sub-pipeline, for example a single challenge."""
+        return Checkpoint(
+            None if self.directory is None else os.path.join(self.directory, name),
+            self.qualified_name(name),
+            self.observer,
+        )
+
+    def qualified_name(self, name: str) -> str:
+        return f"{self.name}/{name}" if self.name else name
+
+    def completed(self, name: str) -> bool:
+        """Whether the stage has been completed and stored. Never without a directory."""
+        return self.directory is not None and os.path.exists(self.path(name))
+
+    def stage(self, name: str, compute: Callable[[], T]) -> T:
+        """Returns the stored output of the stage if it has been completed, or computes and stores it."""
+        if self.directory is None:
+            return self._compute(name, compute)
+        path = self.path(name)
+        if os.path.exists(path):
+            logging.info(f"Resuming from the checkpoint of stage {name} in {path}")
+            with gzip.open(path, "rt", encoding="utf-8") as stage_file:
+                return json.load(stage_file)
+        value = self._compute(name, compute)
+        # Written to a temporary file first so that an interrupted write never looks like a completed stage.
+        temporary_path = f"{path}.tmp"
+        with gzip.open(temporary_path, "wt", encoding="utf-8") as stage_file:
+            json.dump(value, stage_file, separators=(",", ":"), ensure_ascii=False)
+        os.replace(temporary_path, path)
+        return value
+
+    def _compute(self, name: str, compute: Callable[[], T]) -> T:
+        qualified_name = self.qualified_name(name)
+        token = current_stage.set(qualified_name)
+        start = time.monotonic()
+        try:
+            return compute()
+        finally:
+            current_stage.reset(token)
+            if self.observer is not None:
+                self.observer(qualified_name, time.monotonic() - start)
@@ -1,16 +1,148 @@
 """Console script for recursive_self_improvement_suite."""
+import contextlib
+import json
+import logging
 import sys
 import click
 
+from . import engine
+from . import writer
+from .config import configure, get_context
 
-@click.command()
-def main(args=None):
+
+@click.group()
+@click.option("--config", default=None, help="Path of the JSON configuration file. Defaults to apikey.json if present.")
+@click.option(
+    "--log-level",
+    default="INFO",
+    show_default=True,
+    type=click.Choice(["DEBUG", "INFO", "WARNING", "ERROR"], case_sensitive=False),
+)
+def main(config, log_level):
     """Console script for recursive_self_improvement_suite."""
-    click.echo(
-        "Replace this message by putting your code into "
-        "recursive_self_improvement_suite.cli.main"
+    logging.basicConfig(level=log_level.upper())
+    configure(config)
+
+
+@main.command()
+@click.option("--iterations", default=1, show_default=True, help="Number of iterations to run.")
+@click.option(
+    "--challenges-per-iteration", default=2, show_default=True, help="Number of best challenges solved per iteration."
+)
+@click.option("--max-in-flight", default=4, show_default=True, help="Maximum number of challenges processed at once.")
+@click.option(
+    "--concurrency", default=engine.DEFAULT_CONCURRENCY, show_default=True, help="Maximum concurrent calls per batch."
+)
+@click.option("--checkpoint-directory", default=None, help="Directory for resumable stage checkpoints.")
+@click.option("--task-family", default=None, help="Family of tasks to run. Defaults to task_family of the configuration.")
+@click.option("--output", default=None, help="Directory for the JSONL trajectory shards. Printed to stdout if not given.")
+@click.option(
+    "--shard-size",
+    default=writer.DEFAULT_MAX_SHARD_BYTES,
+    show_default=True,
+    help="Uncompressed size in bytes after which a new shard is started.",
+)
+@click.option("--compress/--no-compress", default=False, show_default=True, help="Gzip the trajectory shards.")
+@click.option("--metrics", default=None, help="File to write the per-call token, latency and cost metrics to.")
+@click.option(
+    "--dpo-output", default=None, help="Directory for JSONL shards of chosen and rejected pairs from the rankings."
+)
+@click.option(
+    "--unleashed/--no-unleashed", default=False, show_default=True, help='Prefix the DPO prompts with "UNLEASHED:".'
+)
+def run(
+    iterations,
+    challenges_per_iteration,
+    max_in_flight,
+    concurrency,
+    checkpoint_directory,
+    task_family,
+    output,
+    shard_size,
+    compress,
+    metrics,
+    dpo_output,
+    unleashed,
+):
+    """Runs improvement iterations, writing each trajectory as a JSON line as soon as it completes."""
+    from .batch import run_batch
+    from .dpo import PreferencePairExporter
+    from .task_family import close_task_families, get_task_family
+
+    trajectories = run_batch(
+        iterations,
+        challenges_per_iteration,
+        max_in_flight,
+        concurrency,
+        checkpoint_directory,
+        None if task_family is None else get_task_family(task_family),
+    )
+    with contextlib.ExitStack() as stack:
+        stack.callback(close_task_families)
+        if dpo_output is not None:
+            exporter = stack.enter_context(
+                PreferencePairExporter(dpo_output, unleashed=unleashed, max_shard_bytes=shard_size, compress=compress)
+            )
+
+            def exported(trajectories):
+                # The pairs are written as each trajectory completes, before the trajectory itself.
+                for trajectory in trajectories:
+                    exporter.export(trajectory)
+                    yield trajectory
+
+            trajectories = exported(trajectories)
+        if output is None:
+            for trajectory in trajectories:
+                click.echo(json.dumps(trajectory, ensure_ascii=False))
+        else:
+            with writer.ShardedJsonlWriter(output, max_shard_bytes=shard_size, compress=compress) as trajectory_writer:
+                for trajectory in trajectories:
+                    trajectory_writer.write(trajectory)
+    collector = get_context().metrics
+    click.echo(collector.summary_table(), err=True)
+    if metrics is not None:
+        collector.write(metrics)
+    return 0
+
+
+@main.command()
+@click.option("--iterations", default=3, show_default=True, help="Number of iterations to run.")
+@click.option(
+    "--latency",
+    default="0",
+    show_default=True,
+    help='Simulated call latency in seconds, or a JSON distribution like \'{"distribution": "lognormal", "median": 1}\'.',
+)
+@click.option("--error-rate", default=0.0, show_default=True, help="Fraction of simulated calls failing transiently.")
+@click.option(
+    "--concurrency", default=engine.DEFAULT_CONCURRENCY, show_default=True, help="Maximum concurrent calls per batch."
+)
+@click.option(
+    "--samples-per-request",
+    default=128,
+    show_default=True,
+    help="Maximum completions sampled in a single simulated request. 1 requests every sample separately.",
+)
+@click.option(
+    "--adaptive/--no-adaptive", default=False, show_default=True, help="Sample judges and solutions adaptively."
+)
+@click.option(
+    "--results", default="benchmark-results.jsonl", show_default=True, help="File to append the results to."
+)
+def benchmark(iterations, latency, error_rate, concurrency, samples_per_request, adaptive, results):
+    """Benchmarks the coding pipeline against a simulated backend, offline."""
+    from .benchmark import format_results, record_results, run_benchmark
+
+    measurements = run_benchmark(
+        iterations,
+        json.loads(latency),
+        error_rate,
+        concurrency,
+        max_samples_per_request=samples_per_request,
+        adaptive_sampling=adaptive,
     )
-    click.echo("See click documentation at https://click.palletsprojects.com/")
+    record_results(measurements, results)
+    click.echo(format_results(measurements))
     return 0
 
 
@@ -0,0 +1,48 @@
+"""Construction of the API client, with an explicitly tuned pool of kept-alive HTTP connections."""
+
+from typing import Optional
+
+# Without max_concurrent_requests, at most this many connections are opened at the same time.
+DEFAULT_MAX_CONNECTIONS = 64
+
+
+def http_client(
+    max_connections: int = DEFAULT_MAX_CONNECTIONS,
+    max_keepalive_connections: Optional[int] = None,
+    keepalive_expiry: float = 30.0,
+    timeout: float = 60.0,
+    connect_timeout: float = 10.0,
+):
+    """A synchronous HTTP client with a connection pool, safe to share between threads.
+
+    By default every pooled connection is kept alive for reuse, so that a burst of concurrent calls doesn't pay
+    for new TLS handshakes each time. `timeout` applies to reading, writing and waiting for a pooled connection.
+    """
+    # Imported here, so that importing the suite stays cheap for processes never calling the API.
+    import httpx
+
+    if max_keepalive_connections is None:
+        max_keepalive_connections = max_connections
+    return httpx.Client(
+        limits=httpx.Limits(
+            max_connections=max_connections,
+            max_keepalive_connections=max_keepalive_connections,
+            keepalive_expiry=keepalive_expiry,
+        ),
+        timeout=httpx.Timeout(timeout, connect=connect_timeout),
+    )
+
+
+def openai_client(config):
+    """An OpenAI client for the configuration, with a pool of as many connections as there can be requests in flight."""
+    from openai import OpenAI
+
+    http_options = {"max_connections": config.max_concurrent_requests or DEFAULT_MAX_CONNECTIONS}
+    http_options.update(config.http or {})
+    return OpenAI(
+        api_key=config.apikey,
+        organization=config.org,
+        # Retries are scheduled by us, so that all the workers share the rate limits and backoffs.
+        max_retries=0,
+        http_client=http_client(**http_options),
+    )
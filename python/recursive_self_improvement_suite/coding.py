@@ -1,6 +1,19 @@
-"""Coding task prompts."""
+"""Coding task prompts, and the coding task family."""
 
-from typing import List
+import logging
+from typing import Iterator, List, Optional, Tuple
+
+from . import adaptive
+from . import dpo
+from . import recursive_self_improvement_suite as suite
+from . import routing
+from . import sandbox
+from . import tournament
+from .checkpoint import Checkpoint
+from .config import get_context
+from .prompts import JSON_SCHEMA_DRAFT, compare_schema, object_schema, output_schema, section
+from .serialization import compact_json, render_text
+from .task_family import TaskFamily
 
 # The Code Llama prompts are given here as an inspiration, not something we want to follow.
 # We need to make at least the following improvements:
@@ -96,29 +109,26 @@ Your code should pass these tests:\n\n{tests}\nYour code should start with a [PY
 # Note that initially we don't specify the JSON Schema, and let the bot to decide it. After that, we codify that schema.
 
 
+def generate_challenges_schema(n: int = 10) -> dict:
+    return {
+        "$schema": JSON_SCHEMA_DRAFT,
+        "type": "array",
+        "minItems": n,
+        "maxItems": n,
+        "items": {
+            "type": "object",
+            "properties": {
+                "domain": {"type": "string"},
+                "id": {"type": "string"},
+                "description": {"type": "string"},
+            },
+            "required": ["id", "description"],
+            "additionalProperties": False,
+        },
+    }
+
+
 def generate_challenges(n: int = 10):
-    schema = """\
-{
-  "$schema": "https://json-schema.org/draft/2020-12/schema",
-  "type": "array",
-  "items": {
-    "type": "object",
-    "properties": {
-      "domain": {
-        "type": "string"
-      },
-      "id": {
-        "type": "string"
-      },
-      "description": {
-        "type": "string"
-      }
-    },
-    "required": ["id", "description"],
-    "additionalProperties": false
-  }
-}
-"""
     return f"""\
 Please help me generate some open-ended programming challenges in Python.
 The challenges shouldn't be puzzles, but components in a real-world application.
@@ -133,17 +143,38 @@ an evaluation function which calls the challenge solution so that you can easily
 and the quality of these solutions by seeing what your evaluation function prints out.
 Your output must conform exactly to the following JSON Schema:
 <JSON-Schema>
-{schema}
+{compact_json(generate_challenges_schema(n))}
 </JSON-Schema>
 Now, please give me {n} programming challenge descriptions. Produce them in a JSON form without Markdown notation because they are read by a machine.
 """
 
-def generate_evaluation_function(challenge: str):
-    return f"""\
+
+# Providers cache the longest prefix a prompt shares with recent ones, and prompts are sampled many times over.
+# So the prompts start with the content they have in common, always in the same order and with the same wording:
+# the challenge, then the evaluation function, then the candidates being ranked, and only then the rankings,
+# the instructions and the JSON Schema which are specific to the prompt.
+
+
+def _challenge_prefix(challenge: str, evaluation_function: Optional[str] = None) -> str:
+    """The beginning shared by the prompts about a challenge, and those about its evaluation function."""
+    prefix = f"""\
 Here is a programming challenge:
 <challenge>
-{challenge}
+{render_text(challenge)}
 </challenge>
+"""
+    if evaluation_function is not None:
+        prefix += f"""\
+Here is the evaluation function which runs the solutions to the challenge and prints out their results:
+<evaluation-function>
+{evaluation_function}
+</evaluation-function>
+"""
+    return prefix
+
+
+def generate_evaluation_function(challenge: str):
+    return _challenge_prefix(challenge) + """\
 Many software engineers will try to generate a great solution for this challenge. Your job is to evaluate and
 rank their solutions.
 Now, I need you to produce a small Python code which runs a black box solution function provided by a software engineer,
@@ -162,94 +193,79 @@ Answer just by giving the Python code with Markdown notation.
 """
 
 def generate_solutions(challenge: str, evaluation_function: str):
-    return f"""\
-Here is a programming challenge:
-<challenge>
-{challenge}
-</challenge>
-Here is the code used to evaluate your solution:
-<evaluation-function>
-{evaluation_function}
-</evaluation-function>
-
+    return _challenge_prefix(challenge, evaluation_function) + """\
 I need you to produce a small Python code which solves the given problem as evaluated by the evaluation code.
 Answer just by giving the Python code with Markdown notation.
 """
 
+def evaluate_challenges_schema(challenge_ids: List[str], n: int = 5) -> dict:
+    return {
+        "$schema": JSON_SCHEMA_DRAFT,
+        "type": "array",
+        "minItems": n,
+        "maxItems": n,
+        "items": {
+            "type": "object",
+            "properties": {
+                "rationale": {"type": "string"},
+                "id": {"type": "string", "enum": list(challenge_ids)},
+            },
+            "required": ["id", "rationale"],
+            "additionalProperties": False,
+        },
+        "description": "Your answer is an array of the given number of the best challenges ranked from the best to the worst. Each item in the array has both a rationale for its relative ranking, highlighting its good and bad qualities relative to others, and the id of the challenge. Be careful to produce a JSON array of objects as per the given schema.",
+    }
+
+
 def evaluate_challenges(challenges: List[str], challenge_ids: List[str], n: int = 5):
-    schema = f"""\
-{{
-  "$schema": "https://json-schema.org/draft/2020-12/schema",
-  "type": "array",
-  "items": {{
-    "type": "object",
-    "properties": {{
-      "rationale": {{
-        "type": "string"
-      }},
-      "id": {{
-        "type": "string",
-        "enum": {challenge_ids}
-      }}
-    }},
-    "required": ["id", "rationale"],
-    "additionalProperties": false
-  }},
-  "description": "Your answer is an array of the given number of the best challenges ranked from the best to the worst. Each item in the array has both a rationale for its relative ranking, highlighting its good and bad qualities relative to others, and the id of the challenge. Be careful to produce a JSON array of objects as per the given schema.",
-}}
-"""
-    return f"""\
-Here are some programming challenges which need to be evaluated and ranked:
-<challenges>
-{challenges}
-</challenges>
-Your output must conform exactly to the following JSON Schema:
-<JSON-Schema>
-{schema}
-</JSON-Schema>
+    return (
+        section("challenges", challenges, "challenge")
+        + f"""\
+Above are some programming challenges which need to be evaluated and ranked.
 Please choose the best {n}. Evaluate the challenges based on the following criteria:
 - Innovativeness and novelty. The challenge should not be very similar to known interview questions, or programming puzzles.
 - Requires various skills and domain knowledge to solve well.
 - Can be solved with few lines of code with a single function call entrypoint.
 Now, please produce a JSON response without Markdown notation which refers to the rationales and the best {n} challenges from this set by id.
 """
+        + output_schema(evaluate_challenges_schema(challenge_ids, n))
+    )
+
+
+def evaluate_evaluation_functions_schema(evaluation_function_ids: List[int]) -> dict:
+    return object_schema(
+        {
+            "best_evaluation_function_id": {"type": "integer", "enum": list(evaluation_function_ids)},
+            "rationale": {"type": "string"},
+        },
+        ["best_evaluation_function_id", "rationale"],
+    )
 
 
 def evaluate_evaluation_functions(
-    challenge: str, evaluation_functions: List[str], evaluation_function_ids: List[int],
+    challenge: str, evaluation_functions: List[dict], evaluation_function_ids: List[int],
 ):
-    schema = f"""
-{{
-  "$schema": "https://json-schema.org/draft/2020-12/schema",
-  "type": "object",
-  "properties": {{
-    "best_evaluation_function_id": {{
-      "type": "integer",
-      "enum": {evaluation_function_ids}
-    }},
-    "rationale": {{
-      "type": "string"
-    }}
-  }},
-  "required": ["best_evaluation_function_id", "rationale"],
-  "additionalProperties": false
-}}
-"""
-    return f"""\
-Here is a programming challenge, and a set of evaluation functions:
-<challenge>
-{challenge}
-</challenge>
-<evaluation-functions>
-{evaluation_functions}
-</evaluation-functions>
-Your output must conform exactly to the following JSON Schema:
-<JSON-Schema>
-{schema}
-</JSON-Schema>
+    return (
+        _challenge_prefix(challenge)
+        + section("evaluation-functions", evaluation_functions, "evaluation-function")
+        + """\
+Above are a programming challenge, and a set of evaluation functions for it.
 Please provide a rationale and choose the best evaluation function which evaluates the quality of the sample solution in the most suitable manner.
 Produce the rationale and the best evaluation function id in a valid JSON object without Markdown notation.
 """
+        + output_schema(evaluate_evaluation_functions_schema(evaluation_function_ids))
+    )
+
+
+def evaluate_solutions_schema(solution_ids: List[int]) -> dict:
+    return object_schema(
+        {
+            "rationale": {"type": "string"},
+            "sample_solution_id": {"type": "integer", "enum": list(solution_ids)},
+        },
+        ["rationale", "sample_solution_id"],
+    )
+
 
 def evaluate_solutions(
     challenge: str,
@@ -257,82 +273,58 @@ def evaluate_solutions(
     sample_solutions_with_evaluation_function_outputs: str,
     solution_ids: List[int],
 ):
-    schema = f"""
-{{
-  "$schema": "https://json-schema.org/draft/2020-12/schema",
-  "type": "object",
-  "properties": {{
-    "rationale": {{
-      "type": "string"
-    }},
-    "sample_solution_id": {{
-      "type": "integer",
-      "enum": {solution_ids}
-
-    }}
-  }},
-  "required": ["rationale", "sample_solution_id"],
-  "additionalProperties": false
-}}
-"""
-    return f"""\
-Here is a programming challenge, an evaluation function and a set of sample solutions for it:
-<challenge>
-{challenge}
-</challenge>
-<evaluation-function>
-{evaluation_function}
-</evaluation-function>
-<sample-solutions-with-evaluation-function-outputs>
-{sample_solutions_with_evaluation_function_outputs}
-</sample-solutions-with-evaluation-function-outputs>
+    return (
+        _challenge_prefix(challenge, evaluation_function)
+        + section(
+            "sample-solutions-with-evaluation-function-outputs",
+            sample_solutions_with_evaluation_function_outputs,
+            "sample-solution",
+        )
+        + """\
+Above are a programming challenge, an evaluation function and a set of sample solutions for it.
 Please provide a rationale for the best sample solution and produce its id.
 Do not evaluate the evaluation function here, just the best solution based on all the information you have.
 Produce the rationale and the sample solution id in a valid JSON object without Markdown notation.
-Your output must conform exactly to the following JSON Schema:
-<JSON-Schema>
-{schema}
-</JSON-Schema>
 """
+        + output_schema(evaluate_solutions_schema(solution_ids))
+    )
+
+
+def evaluate_challenge_rankings_schema(ranking_ids: List[int]) -> dict:
+    return object_schema(
+        {
+            "best_challenge_ranking_rationale": {"type": "string"},
+            "best_challenge_ranking_id": {"type": "integer", "enum": list(ranking_ids)},
+        },
+        ["best_challenge_ranking_rationale", "best_challenge_ranking_id"],
+    )
 
 
 # Note that rankings include rationales for rankings which makes it easier to decide which one is the best.
+# The rankings refer to the challenges, evaluation functions and solutions by id, so they are given only once per prompt.
 def evaluate_challenge_rankings(challenges: List[str], rankings: List[str], ranking_ids: List[int]):
-    schema = f"""
-{{
-  "$schema": "https://json-schema.org/draft/2020-12/schema",
-  "type": "object",
-  "properties": {{
-    "best_challenge_ranking_rationale": {{
-      "type": "string"
-    }},
-    "best_challenge_ranking_id": {{
-      "type": "integer",
-      "enum": {ranking_ids}
-
-    }}
-  }},
-  "required": ["rationale", "sample_solution_id"],
-  "additionalProperties": false
-}}
-"""
-    return f"""\
-Here is a set of programming challenges:
-<challenges>
-{challenges}
-</challenges>
-<rankings>
-{rankings}
-</rankings>
+    return (
+        section("challenges", challenges, "challenge")
+        + section("rankings", rankings, "ranking")
+        + """\
+Above are a set of programming challenges, and rankings of them.
 Each ranking is from a different judge. Your task is not to rank the programming challenges, this has already been done by multiple judges.
 Please rank the challenge rankings ao we get a ranking for the judges, from the best judge to the worst one.
 Please provide a rationale for the best challenge ranking and provide the best ranking id for the challenge rankings.
 Produce the rationale and the ranking id in plain JSON without Markdown notation.
-Your output must conform exactly to the following JSON Schema:
-<JSON-Schema>
-{schema}
-</JSON-Schema>
 """
+        + output_schema(evaluate_challenge_rankings_schema(ranking_ids))
+    )
+
+
+def evaluate_solution_ranking_schema(ranking_ids: List[int]) -> dict:
+    return object_schema(
+        {
+            "rationale": {"type": "string"},
+            "ranking_id": {"type": "integer", "enum": list(ranking_ids)},
+        },
+        ["rationale", "ranking_id"],
+    )
 
 
 def evaluate_solution_ranking(
@@ -342,88 +334,547 @@ def evaluate_solution_ranking(
     sample_rankings_of_solutions: List[str],
     ranking_ids: List[int],
 ):
-    schema = f"""
-{{
-  "$schema": "https://json-schema.org/draft/2020-12/schema",
-  "type": "object",
-  "properties": {{
-    "rationale": {{
-      "type": "string"
-    }},
-    "ranking_id": {{
-      "type": "integer",
-      "enum": {ranking_ids}
-
-    }}
-  }},
-  "required": ["rationale", "sample_solution_id"],
-  "additionalProperties": false
-}}
-"""
-
-    return f"""\
-Here is a programming challenge, an evaluation function, a set of sample solutions for it, and a set of rankings for the sample solutions:
-<challenge>
-{challenge}
-</challenge>
-<evaluation-function>
-{evaluation_function}
-</evaluation-function>
-<sample-solutions-with-evaluation-function-outputs>
-{sample_solutions_with_evaluation_function_outputs}
-</sample-solutions-with-evaluation-function-outputs>
-<sample-rankings-of-solutions>
-{sample_rankings_of_solutions}
-</sample-rankings-of-solutions>
+    return (
+        _challenge_prefix(challenge, evaluation_function)
+        + section(
+            "sample-solutions-with-evaluation-function-outputs",
+            sample_solutions_with_evaluation_function_outputs,
+            "sample-solution",
+        )
+        + section("sample-rankings-of-solutions", sample_rankings_of_solutions, "ranking")
+        + """\
+Above are a programming challenge, an evaluation function, a set of sample solutions for it, and a set of rankings for the sample solutions.
 Please provide a rationale and choose the best ranking id for the solutions.
 Produce the rationale and the ranking id in plain JSON without Markdown notation.
-Your output must conform exactly to the following JSON Schema:
-<JSON-Schema>
-{schema}
-</JSON-Schema>
 """
+        + output_schema(evaluate_solution_ranking_schema(ranking_ids))
+    )
+
+
+def evaluate_evaluation_function_ranking_schema(ranking_ids: List[int]) -> dict:
+    return object_schema(
+        {
+            "rationale": {"type": "string"},
+            "best_ranking_id": {"type": "integer", "enum": list(ranking_ids)},
+        },
+        ["rationale", "best_ranking_id"],
+    )
 
 
 def evaluate_evaluation_function_ranking(
     challenge: str,
-    evaluation_functions: List[str],
+    evaluation_functions: List[dict],
     sample_rankings_of_evaluation_functions: List[str],
     ranking_ids: List[int],
 ):
-    schema = f"""
-{{
-  "$schema": "https://json-schema.org/draft/2020-12/schema",
-  "type": "object",
-  "properties": {{
-    "rationale": {{
-      "type": "string"
-    }},
-    "best_ranking_id": {{
-      "type": "integer",
-      "enum": {ranking_ids}
-
-    }}
-  }},
-  "required": ["rationale", "best_ranking_id"],
-  "additionalProperties": false
-}}
-"""
-    return f"""\
-Here is a programming challenge, candidate evaluation functions, and a set of rankings for the evaluation functions:
-<challenge>
-{challenge}
-</challenge>
-<evaluation-functions>
-{evaluation_functions}
-</evaluation-functions>
-<sample-rankings-of-evaluation-functions>
-{sample_rankings_of_evaluation_functions}
-</sample-rankings-of-evaluation-functions>
+    return (
+        _challenge_prefix(challenge)
+        + section("evaluation-functions", evaluation_functions, "evaluation-function")
+        + section("sample-rankings-of-evaluation-functions", sample_rankings_of_evaluation_functions, "ranking")
+        + """\
+Above are a programming challenge, candidate evaluation functions, and a set of rankings for the evaluation functions.
 Each ranking is from a different judge. Your task is to select the best ranking, to judge the judges.
 Please provide a rationale and choose the best ranking for the evaluation functions.
 Produce the rational and the ranking id in plain JSON without Markdown notation.
-Your output must conform exactly to the following JSON Schema:
-<JSON-Schema>
-{schema}
-</JSON-Schema>
 """
+        + output_schema(evaluate_evaluation_function_ranking_schema(ranking_ids))
+    )
+
+
+def rank_evaluation_functions_by_outputs_schema(evaluation_function_ids: List[int]) -> dict:
+    return {
+        "$schema": JSON_SCHEMA_DRAFT,
+        "type": "array",
+        "minItems": len(evaluation_function_ids),
+        "maxItems": len(evaluation_function_ids),
+        "items": {
+            "type": "object",
+            "properties": {
+                "rationale": {"type": "string"},
+                "id": {"type": "integer", "enum": list(evaluation_function_ids)},
+            },
+            "required": ["id", "rationale"],
+            "additionalProperties": False,
+        },
+        "description": "Your answer is an array of all the evaluation functions ranked from the best to the worst. Each item in the array has both a rationale for its relative ranking and the id of the evaluation function.",
+    }
+
+
+def rank_evaluation_functions_by_outputs(
+    challenge: str,
+    best_solution: str,
+    evaluation_functions_with_outputs: List[dict],
+    evaluation_function_ids: List[int],
+):
+    return (
+        _challenge_prefix(challenge)
+        + f"""\
+Here is the best solution to the challenge:
+<solution>
+{best_solution}
+</solution>
+"""
+        + section("evaluation-functions-with-outputs", evaluation_functions_with_outputs, "evaluation-function")
+        + """\
+Above are a programming challenge, the best solution to it, and a set of evaluation functions with their outputs
+when run against the best solution.
+Please rank the evaluation functions by how well their outputs tell the quality of the solution.
+Produce the ranking in plain JSON without Markdown notation.
+"""
+        + output_schema(rank_evaluation_functions_by_outputs_schema(evaluation_function_ids))
+    )
+
+
+# Pairwise comparisons for ranking in a tournament, with a bounded prompt size however many candidates there are.
+
+
+def compare_challenges(first_challenge: dict, second_challenge: dict):
+    return (
+        section("challenges", [first_challenge, second_challenge], "challenge")
+        + """\
+Above are two programming challenges which need to be compared.
+Please choose the better one based on the following criteria:
+- Innovativeness and novelty. The challenge should not be very similar to known interview questions, or programming puzzles.
+- Requires various skills and domain knowledge to solve well.
+- Can be solved with few lines of code with a single function call entrypoint.
+Produce the rationale and the id of the better challenge in a valid JSON object without Markdown notation.
+"""
+        + output_schema(compare_schema([first_challenge["id"], second_challenge["id"]]))
+    )
+
+
+def compare_solutions(
+    challenge: str,
+    evaluation_function: str,
+    first_solution_with_evaluation_function_output: dict,
+    second_solution_with_evaluation_function_output: dict,
+):
+    return (
+        _challenge_prefix(challenge, evaluation_function)
+        + section(
+            "sample-solutions-with-evaluation-function-outputs",
+            [first_solution_with_evaluation_function_output, second_solution_with_evaluation_function_output],
+            "sample-solution",
+        )
+        + """\
+Above are a programming challenge, an evaluation function and two sample solutions for it.
+Please provide a rationale for the better sample solution and produce its id.
+Do not evaluate the evaluation function here, just the better solution based on all the information you have.
+Produce the rationale and the sample solution id in a valid JSON object without Markdown notation.
+"""
+        + output_schema(
+            compare_schema(
+                [
+                    first_solution_with_evaluation_function_output["id"],
+                    second_solution_with_evaluation_function_output["id"],
+                ]
+            )
+        )
+    )
+
+
+def _run_evaluations(evaluation_functions, solutions, by_solution: bool = False):
+    """Runs every evaluation function against every solution, indexed [evaluation function][solution] or the other way."""
+    outputs = [
+        [result.to_dict() for result in results] for results in sandbox.run_evaluations(evaluation_functions, solutions)
+    ]
+    return [list(by_evaluation) for by_evaluation in zip(*outputs)] if by_solution else outputs
+
+
+def _prompt_output(output: dict) -> dict:
+    """An output of a run for the prompts, without its duration.
+
+    The duration varies from run to run, so it's only kept in the trajectory, and the prompts stay cached on a rerun.
+    """
+    return {key: value for key, value in output.items() if key != "duration_seconds"}
+
+
+class CodingTaskFamily(TaskFamily):
+    """Open-ended programming challenges, solved and evaluated in a sandbox, with LLM-written evaluation functions."""
+
+    name = "coding"
+    task_name = "challenge"
+    # The numbers of challenges and solutions are configured, in config.number_of_challenges and
+    # config.number_of_solutions.
+    number_of_challenge_rankings = 3
+    number_of_evaluation_functions = 5
+    number_of_evaluation_rankings = 2
+    number_of_solution_rankings = 2
+
+    def select_tasks(self, checkpoint: Checkpoint, concurrency: int, number_of_tasks: int, iteration: int = 0) -> dict:
+        """Generates challenges, ranks them and ranks the rankings.
+
+        The challenges of each iteration are a sample of their own, so that they are not the cached ones of the first.
+
+        Returns the challenges, their rankings, the best ranking and the `number_of_tasks` best challenges by it.
+        With a challenge index configured, near-duplicates of earlier challenges are returned separately and not ranked.
+        In the tournament ranking mode, the rankings are replaced by the tournament of the challenges.
+        """
+        number_of_challenges = get_context().config.number_of_challenges
+
+        challenges_prompt = generate_challenges(number_of_challenges)
+        challenges = checkpoint.stage(
+            "challenges",
+            lambda: suite.chat_json(
+                [challenges_prompt],
+                generate_challenges_schema(number_of_challenges),
+                suite.iteration_sample_index(iteration),
+                role=routing.CHALLENGE_GENERATION,
+            ),
+        )
+        logging.info(f"Challenges: {challenges}")
+        duplicate_challenges = []
+        challenge_index = get_context().challenge_index
+        if challenge_index is not None:
+            # Near-duplicates of earlier challenges are dropped before they cost any rankings, solutions or evaluations.
+            unique_challenges = checkpoint.stage(
+                "unique_challenges",
+                lambda: dict(
+                    zip(("challenges", "duplicates"), challenge_index.filter(challenges, number_of_tasks))
+                ),
+            )
+            # Indexed only after the stage is stored, so that a resumed run doesn't find the challenges duplicating
+            # themselves. Adding is idempotent.
+            for challenge in challenges:
+                challenge_index.add(challenge["description"])
+            challenges = unique_challenges["challenges"]
+            duplicate_challenges = unique_challenges["duplicates"]
+            logging.info(f"Dropped {len(duplicate_challenges)} near-duplicate challenges")
+        challenge_ids = list(map(lambda challenge: challenge["id"], challenges))
+
+        if suite.ranking_mode() == tournament.TOURNAMENT:
+            challenges_by_id = {challenge["id"]: challenge for challenge in challenges}
+            challenge_tournament = suite.rank_by_tournament(
+                checkpoint,
+                "challenge_tournament",
+                challenge_ids,
+                lambda first, second: compare_challenges(challenges_by_id[first], challenges_by_id[second]),
+                concurrency,
+            )
+            return {
+                "challenges": challenges,
+                "duplicate_challenges": duplicate_challenges,
+                "challenge_tournament": challenge_tournament,
+                "best_challenges": [
+                    challenges_by_id[ranked["id"]] for ranked in challenge_tournament["ranking"][:number_of_tasks]
+                ],
+            }
+
+        def ranked_challenge_ids(ranking):
+            return [challenge["id"] for challenge in ranking]
+
+        # A single best challenge is often given as an object instead of a list, which the parsing repairs.
+        best_n_challenge_ids_candidates, best_challenge_ranking = suite.rank_by_judges(
+            checkpoint,
+            ("challenge_rankings", "best_challenge_ranking"),
+            evaluate_challenges(challenges, challenge_ids, number_of_tasks),
+            evaluate_challenges_schema(challenge_ids, number_of_tasks),
+            self.number_of_challenge_rankings,
+            ranked_challenge_ids,
+            challenge_ids,
+            lambda judgements: evaluate_challenge_rankings(
+                challenges,
+                [
+                    {"id": id, "best_n_challenge_ids_candidate": best_n_challenge_ids_candidate}
+                    for id, best_n_challenge_ids_candidate in enumerate(judgements)
+                ],
+                range(len(judgements)),
+            ),
+            evaluate_challenge_rankings_schema,
+            ("best_challenge_ranking_id", "best_challenge_ranking_rationale"),
+            concurrency,
+        )
+        logging.info(f"Best n challenge ids candidates: {best_n_challenge_ids_candidates}")
+        # We now have the best evaluation function ranking: Let's use it!
+        logging.info(f"Best challenge ranking: {best_challenge_ranking}")
+        best_challenge_ranking_id = best_challenge_ranking["best_challenge_ranking_id"]
+
+        logging.info(f"Best best_challenge_ranking_id: {best_challenge_ranking_id}")
+        best_n_challenge_ids = best_n_challenge_ids_candidates[best_challenge_ranking_id]
+        logging.info(f"Best n challenges: {best_n_challenge_ids}")
+
+        best_n_challenges = [
+            next(
+                (
+                    challenge
+                    for challenge in challenges
+                    if challenge["id"] == selected_challenge["id"]
+                ),
+                None,
+            )
+            for selected_challenge in best_n_challenge_ids
+        ]
+        logging.info(f"Best n challenges: {best_n_challenges}")
+        return {
+            "challenges": challenges,
+            "duplicate_challenges": duplicate_challenges,
+            "challenge_rankings": best_n_challenge_ids_candidates,
+            "best_challenge_ranking": best_challenge_ranking,
+            "best_challenges": best_n_challenges,
+        }
+
+    def process_task(self, challenge: dict, checkpoint: Checkpoint, concurrency: int) -> dict:
+        """Generates and ranks evaluation functions and solutions for the challenge, and returns the trajectory."""
+        # For each challenge we want to create a set of evaluation functions, and choose the best one.
+        number_of_solutions = get_context().config.number_of_solutions
+
+        evaluation_function_prompt = generate_evaluation_function(challenge)
+        evaluation_functions = checkpoint.stage(
+            "evaluation_functions",
+            lambda: suite.chat_n(
+                [evaluation_function_prompt],
+                self.number_of_evaluation_functions,
+                concurrency,
+                role=routing.EVALUATION_FUNCTION_GENERATION,
+            ),
+        )
+        logging.info(f"Evaluation_functions: {evaluation_functions}")
+
+        def ranked_evaluation_function_ids(ranking):
+            return [ranking["best_evaluation_function_id"]]
+
+        # Given with their ids both to the judges and to the judge of the judges, whose rankings cite them by id.
+        evaluation_functions_with_ids = [
+            {"id": id, "evaluation_function": evaluation_function}
+            for id, evaluation_function in enumerate(evaluation_functions)
+        ]
+        evaluation_function_rankings, best_evaluation_function_ranking = suite.rank_by_judges(
+            checkpoint,
+            ("evaluation_function_rankings", "best_evaluation_function_ranking"),
+            evaluate_evaluation_functions(
+                challenge, evaluation_functions_with_ids, range(len(evaluation_functions))
+            ),
+            evaluate_evaluation_functions_schema(range(len(evaluation_functions))),
+            self.number_of_evaluation_rankings,
+            ranked_evaluation_function_ids,
+            range(len(evaluation_functions)),
+            lambda judgements: evaluate_evaluation_function_ranking(
+                challenge,
+                evaluation_functions_with_ids,
+                [
+                    {"id": id, "evaluation_function_ranking": evaluation_function_ranking}
+                    for id, evaluation_function_ranking in enumerate(judgements)
+                ],
+                range(len(judgements)),
+            ),
+            evaluate_evaluation_function_ranking_schema,
+            ("best_ranking_id", "rationale"),
+            concurrency,
+        )
+        # We now have the best evaluation function ranking: Let's use it!
+        logging.info(f"Best evaluation function ranking: {best_evaluation_function_ranking}")
+        best_evaluation_function_id = best_evaluation_function_ranking["best_ranking_id"]
+
+        logging.info(f"Best evaluation function id: {best_evaluation_function_id}")
+        best_evaluation_function = evaluation_functions[best_evaluation_function_id]
+        logging.info(f"Best evaluation function: {best_evaluation_function}")
+
+        # We now have the best evaluation function for this challenge: Let's use it!
+
+        # Then we generate solutions, using the best evaluation function.
+        solution_prompt = generate_solutions(challenge, best_evaluation_function)
+        # Outputs already computed while sampling the solutions adaptively, by solution.
+        solution_outputs = []
+
+        def sample_solutions():
+            if not get_context().config.adaptive_sampling:
+                return suite.chat_n(
+                    [solution_prompt], number_of_solutions, concurrency, role=routing.SOLUTION_GENERATION
+                )
+            sampled = []
+            while len(sampled) < number_of_solutions:
+                batch = suite.chat_n(
+                    [solution_prompt],
+                    min(adaptive.SOLUTIONS_PER_ROUND, number_of_solutions - len(sampled)),
+                    concurrency,
+                    first_sample_index=len(sampled),
+                    role=routing.SOLUTION_GENERATION,
+                )
+                sampled += batch
+                solution_outputs.extend(_run_evaluations(evaluation_functions, batch, by_solution=True))
+                if any(adaptive.runs_cleanly(outputs) for outputs in solution_outputs):
+                    logging.info(f"Stopped sampling solutions after {len(sampled)}, one of them runs cleanly")
+                    break
+            return sampled
+
+        solutions = checkpoint.stage("solutions", sample_solutions)
+        logging.info(f"Solutions: {solutions}")
+
+        # We run every evaluation function against every solution, indexed [evaluation function][solution].
+        evaluation_function_outputs = checkpoint.stage(
+            "evaluation_function_outputs",
+            lambda: (
+                [list(outputs) for outputs in zip(*solution_outputs)]
+                if solution_outputs
+                else _run_evaluations(evaluation_functions, solutions)
+            ),
+        )
+        solutions_with_evaluation_function_outputs = [
+            {"id": id, "solution": solution, "evaluation_function_output": _prompt_output(output)}
+            for id, (solution, output) in enumerate(
+                zip(solutions, evaluation_function_outputs[best_evaluation_function_id])
+            )
+        ]
+
+        if suite.ranking_mode() == tournament.TOURNAMENT:
+            solution_tournament = suite.rank_by_tournament(
+                checkpoint,
+                "solution_tournament",
+                range(len(solutions)),
+                lambda first, second: compare_solutions(
+                    challenge,
+                    best_evaluation_function,
+                    solutions_with_evaluation_function_outputs[first],
+                    solutions_with_evaluation_function_outputs[second],
+                ),
+                concurrency,
+            )
+            best_solution_id = solution_tournament["ranking"][0]["id"]
+            solution_rankings = {"solution_tournament": solution_tournament}
+        else:
+            best_solution_id, solution_rankings = self._rank_solutions_by_judges(
+                challenge, best_evaluation_function, solutions_with_evaluation_function_outputs, checkpoint, concurrency
+            )
+        logging.info(f"Best_solution_id: {best_solution_id}")
+        best_solution = solutions[best_solution_id]
+        logging.info(f"Best_solution: {best_solution}")
+
+        evaluation_function_outputs_for_the_best_solution = [
+            {"id": id, "evaluation_function": evaluation_function, "output": _prompt_output(outputs[best_solution_id])}
+            for id, (evaluation_function, outputs) in enumerate(zip(evaluation_functions, evaluation_function_outputs))
+        ]
+        ranking_evaluation_functions_prompt = rank_evaluation_functions_by_outputs(
+            challenge,
+            best_solution,
+            evaluation_function_outputs_for_the_best_solution,
+            range(len(evaluation_functions)),
+        )
+        ranking_of_evaluation_functions = checkpoint.stage(
+            "ranking_of_evaluation_functions",
+            lambda: suite.chat_json(
+                [ranking_evaluation_functions_prompt],
+                rank_evaluation_functions_by_outputs_schema(range(len(evaluation_functions))),
+                role=routing.RANKING,
+            ),
+        )
+        logging.info(f"Eanking_of_evaluation_functions: {ranking_of_evaluation_functions}")
+
+        return {
+            "challenge": challenge,
+            "evaluation_functions": evaluation_functions,
+            "evaluation_function_rankings": evaluation_function_rankings,
+            "best_evaluation_function_ranking": best_evaluation_function_ranking,
+            "best_evaluation_function": best_evaluation_function,
+            "solutions": solutions,
+            "evaluation_function_outputs": evaluation_function_outputs,
+            **solution_rankings,
+            "best_solution": best_solution,
+            "ranking_of_evaluation_functions": ranking_of_evaluation_functions,
+        }
+
+    def _rank_solutions_by_judges(
+        self,
+        challenge,
+        evaluation_function: str,
+        solutions_with_evaluation_function_outputs,
+        checkpoint: Checkpoint,
+        concurrency: int,
+    ):
+        """Ranks all the solutions in one prompt by several judges, and then the judges.
+
+        Returns the id of the best solution, and the rankings for the trajectory.
+        """
+        def ranked_solution_ids(evaluation):
+            return [evaluation["sample_solution_id"]]
+
+        solution_ids = range(len(solutions_with_evaluation_function_outputs))
+        # Then we rank solution rankings.
+        # TODO: The bot actually tends to rank the solutions, not the rankings here. Tune the prompt.
+        solution_evaluations, ranking_of_solution_evaluations = suite.rank_by_judges(
+            checkpoint,
+            ("solution_evaluations", "ranking_of_solution_evaluations"),
+            evaluate_solutions(
+                challenge, evaluation_function, solutions_with_evaluation_function_outputs, solution_ids
+            ),
+            evaluate_solutions_schema(solution_ids),
+            self.number_of_solution_rankings,
+            ranked_solution_ids,
+            solution_ids,
+            lambda judgements: evaluate_solution_ranking(
+                challenge,
+                evaluation_function,
+                solutions_with_evaluation_function_outputs,
+                [
+                    {"id": id, "solution_evaluation": solution_evaluation}
+                    for id, solution_evaluation in enumerate(judgements)
+                ],
+                range(len(judgements)),
+            ),
+            evaluate_solution_ranking_schema,
+            ("ranking_id", "rationale"),
+            concurrency,
+        )
+
+        logging.info(f"Ranking_of_solution_evaluations: {ranking_of_solution_evaluations}")
+
+        best_solution_ranking_id = ranking_of_solution_evaluations["ranking_id"]
+        logging.info(f"Best_solution_ranking_id: {best_solution_ranking_id}")
+        best_solution_ranking = solution_evaluations[best_solution_ranking_id]
+        logging.info(f"Best_solution_ranking: {best_solution_ranking}")
+        # We now have the best solution ranking: Let's use that!
+
+        return best_solution_ranking["sample_solution_id"], {
+            "solution_evaluations": solution_evaluations,
+            "ranking_of_solution_evaluations": ranking_of_solution_evaluations,
+        }
+
+    def preference_pairs(self, trajectory: dict) -> Iterator[Tuple[str, str, str, str]]:
+        """Pairs of evaluation functions and of solutions, and of challenges if there's a challenge selection.
+
+        The batch driver includes the challenge selection of the iteration in each trajectory.
+        """
+        if "challenge_selection" in trajectory:
+            yield from self._challenge_pairs(trajectory["challenge_selection"])
+        yield from self._evaluation_function_pairs(trajectory)
+        yield from self._solution_pairs(trajectory)
+
+    @staticmethod
+    def _challenge_pairs(selection: dict) -> Iterator[Tuple[str, str, str, str]]:
+        challenges = {challenge["id"]: challenge for challenge in selection["challenges"]}
+        if "challenge_tournament" in selection:
+            pairs = dpo.tournament_pairs(selection["challenge_tournament"]["ranking"])
+        else:
+            best_ranking = selection["challenge_rankings"][
+                selection["best_challenge_ranking"]["best_challenge_ranking_id"]
+            ]
+            pairs = dpo.ranking_pairs([challenge["id"] for challenge in best_ranking], list(challenges))
+        # The challenges are generated many in one response, so each is paired as the response to a prompt for one.
+        prompt = generate_challenges(1)
+        for better, worse in pairs:
+            yield "challenge", prompt, compact_json([challenges[better]]), compact_json([challenges[worse]])
+
+    @staticmethod
+    def _evaluation_function_pairs(trajectory: dict) -> Iterator[Tuple[str, str, str, str]]:
+        evaluation_functions = trajectory["evaluation_functions"]
+        best_ranking = trajectory["evaluation_function_rankings"][
+            trajectory["best_evaluation_function_ranking"]["best_ranking_id"]
+        ]
+        prompt = generate_evaluation_function(trajectory["challenge"])
+        for better, worse in dpo.ranking_pairs(
+            [best_ranking["best_evaluation_function_id"]], range(len(evaluation_functions))
+        ):
+            yield "evaluation_function", prompt, evaluation_functions[better], evaluation_functions[worse]
+
+    @staticmethod
+    def _solution_pairs(trajectory: dict) -> Iterator[Tuple[str, str, str, str]]:
+        solutions = trajectory["solutions"]
+        if "solution_tournament" in trajectory:
+            pairs = dpo.tournament_pairs(trajectory["solution_tournament"]["ranking"])
+        else:
+            best_evaluation = trajectory["solution_evaluations"][
+                trajectory["ranking_of_solution_evaluations"]["ranking_id"]
+            ]
+            pairs = dpo.ranking_pairs([best_evaluation["sample_solution_id"]], range(len(solutions)))
+        prompt = generate_solutions(trajectory["challenge"], trajectory["best_evaluation_function"])
+        for better, worse in pairs:
+            yield "solution", prompt, solutions[better], solutions[worse]
@@ -0,0 +1,235 @@
+"""Configuration, and the lazily constructed client and shared state built from it."""
+
+import contextlib
+import json
+import os
+import threading
+import weakref
+from dataclasses import dataclass, fields
+from typing import Optional
+
+from . import cache
+from . import clients
+from . import dedup
+from . import metrics
+from . import rate_limit
+from . import wikipedia
+
+DEFAULT_CONFIG_PATH = "apikey.json"
+
+# Environment variables override the configuration file, and are overridden by explicit arguments.
+ENVIRONMENT_VARIABLES = {
+    "apikey": "OPENAI_API_KEY",
+    "org": "OPENAI_ORG_ID",
+    "model": "RSIS_MODEL",
+}
+CONFIG_PATH_VARIABLE = "RSIS_CONFIG"
+
+
+@dataclass
+class Config:
+    apikey: Optional[str] = None
+    org: Optional[str] = None
+    model: str = "gpt-3.5-turbo"
+    # Optional models by role in routing.ROLES, a model or a panel of models taking turns, instead of model. For example
+    # {"solution_generation": "gpt-4o-mini", "ranking": ["gpt-4o-mini", "gpt-4o"], "meta_ranking": "gpt-4o"}
+    models: Optional[dict] = None
+    temperature: float = 0.2
+    # The family of tasks the pipeline runs, one of task_family.TASK_FAMILIES.
+    task_family: str = "coding"
+    max_attempts: int = 5
+    # Backend requests in flight at the same time across all the stages and challenges running concurrently.
+    # None for no limit besides the rate limits.
+    max_concurrent_requests: Optional[int] = 16
+    # How many times a response which isn't valid JSON for its schema is sampled again before giving up.
+    max_parse_attempts: int = 3
+    # "judges" ranks all the candidates in one prompt, "tournament" by pairwise comparisons for large candidate pools.
+    ranking_mode: str = "judges"
+    # Rounds of the tournaments, by default enough for the number of candidates.
+    tournament_rounds: Optional[int] = None
+    # The candidate pools of the coding pipeline: challenges generated per iteration, and solutions per challenge.
+    # Larger pools are best ranked in the tournament ranking mode.
+    number_of_challenges: int = 10
+    number_of_solutions: int = 5
+    # Samples more judges only while they disagree, skips ranking the judges when they agree, and stops sampling
+    # solutions when one runs cleanly with every evaluation function.
+    adaptive_sampling: bool = False
+    # How the best judge is chosen: "llm" asks an LLM, "local" aggregates the rankings without a call, and "escalate"
+    # aggregates them and asks an LLM only if the judges agree with their consensus less than escalation_agreement.
+    meta_ranking: str = "llm"
+    escalation_agreement: float = 0.5
+    requests_per_minute: float = 60
+    tokens_per_minute: float = 90000
+    # Optional, for the connection pool of the API client, for example: {"max_connections": 32, "keepalive_expiry": 30, "timeout": 60}
+    http: Optional[dict] = None
+    # Optional, for example: {"path": "responses.sqlite", "mode": "read-through", "max_age_seconds": 604800}
+    cache: Optional[dict] = None
+    # Optional, for filtering out challenges similar to earlier ones, for example: {"path": "challenges.sqlite", "threshold": 0.5}
+    dedup: Optional[dict] = None
+    # Optional, a local multistream dump for the trivia task family, for example:
+    # {"dump": "enwiki-latest-pages-articles-multistream.xml.bz2", "index": "enwiki-latest-pages-articles-multistream-index.txt.bz2"}
+    wikipedia: Optional[dict] = None
+    # One of backends.BACKENDS, for example "stub" for offline runs, with its keyword options.
+    backend: str = "openai"
+    backend_options: Optional[dict] = None
+    # Dollars per thousand tokens by model for cost accounting, for example {"gpt-3.5-turbo": {"prompt": 0.0005, "completion": 0.0015}}
+    prices: Optional[dict] = None
+
+
+def load_config(path: Optional[str] = None, **overrides) -> Config:
+    """Loads the configuration from the file, the environment and the explicit overrides, in increasing priority.
+
+    Without an explicit path, the path is taken from the RSIS_CONFIG environment variable, and then apikey.json in
+    the working directory is used if it exists.
+    """
+    values = {}
+    path = path or os.environ.get(CONFIG_PATH_VARIABLE)
+    if path is not None or os.path.exists(DEFAULT_CONFIG_PATH):
+        with open(path or DEFAULT_CONFIG_PATH, "r") as config_file:
+            values.update(json.load(config_file))
+    values.update(
+        {key: os.environ[variable] for key, variable in ENVIRONMENT_VARIABLES.items() if variable in os.environ}
+    )
+    values.update({key: value for key, value in overrides.items() if value is not None})
+    known = {field.name for field in fields(Config)}
+    unknown = set(values) - known
+    if unknown:
+        raise ValueError(f"Unknown configuration keys: {sorted(unknown)}")
+    return Config(**values)
+
+
+class Context:
+    """Holds the shared state built from a configuration. Everything is constructed on first use.
+
+    The state is safe to share between threads. A process forked from one using the context builds its own state
+    again on first use, instead of sharing the connections, the locks and the databases of the parent.
+    """
+
+    def __init__(self, config: Config, backend=None):
+        """An explicitly given backend is used instead of the one named in the configuration."""
+        self.config = config
+        self._explicit_backend = backend
+        self._reset()
+        _contexts.add(self)
+
+    def _reset(self):
+        self.lock = threading.Lock()
+        self._client = None
+        self._rate_limiter = None
+        self._response_cache = None
+        self._challenge_index = None
+        self._wikipedia = None
+        self._backend = self._explicit_backend
+        self._metrics = None
+        self._request_slots = None
+
+    @property
+    def client(self):
+        with self.lock:
+            if self._client is None:
+                self._client = clients.openai_client(self.config)
+            return self._client
+
+    @property
+    def backend(self):
+        # Not under the lock, because building the OpenAI backend takes the client.
+        if self._backend is None:
+            from .backends import BACKENDS
+
+            if self.config.backend not in BACKENDS:
+                raise ValueError(f"Unknown backend {self.config.backend}, expected one of {sorted(BACKENDS)}.")
+            backend = BACKENDS[self.config.backend](self, **(self.config.backend_options or {}))
+            with self.lock:
+                if self._backend is None:
+                    self._backend = backend
+        return self._backend
+
+    @property
+    def metrics(self) -> metrics.MetricsCollector:
+        with self.lock:
+            if self._metrics is None:
+                self._metrics = metrics.MetricsCollector(self.config.prices)
+            return self._metrics
+
+    @property
+    def rate_limiter(self) -> rate_limit.RateLimiter:
+        with self.lock:
+            if self._rate_limiter is None:
+                self._rate_limiter = rate_limit.RateLimiter(
+                    requests_per_minute=self.config.requests_per_minute,
+                    tokens_per_minute=self.config.tokens_per_minute,
+                )
+            return self._rate_limiter
+
+    @property
+    def request_slots(self):
+        """Held while a backend request is in flight, for the global budget of concurrent requests."""
+        with self.lock:
+            if self._request_slots is None:
+                limit = self.config.max_concurrent_requests
+                if limit is not None and limit < 1:
+                    raise ValueError(f"The maximum of concurrent requests must be at least 1, got {limit}.")
+                self._request_slots = (
+                    contextlib.nullcontext() if limit is None else threading.BoundedSemaphore(limit)
+                )
+            return self._request_slots
+
+    @property
+    def response_cache(self) -> Optional[cache.ResponseCache]:
+        with self.lock:
+            if self._response_cache is None and self.config.cache is not None:
+                self._response_cache = cache.ResponseCache(**self.config.cache)
+            return self._response_cache
+
+    @property
+    def challenge_index(self) -> Optional[dedup.ChallengeIndex]:
+        with self.lock:
+            if self._challenge_index is None and self.config.dedup is not None:
+                self._challenge_index = dedup.ChallengeIndex(**self.config.dedup)
+            return self._challenge_index
+
+    @property
+    def wikipedia(self) -> Optional[wikipedia.WikipediaDump]:
+        with self.lock:
+            if self._wikipedia is None and self.config.wikipedia is not None:
+                self._wikipedia = wikipedia.WikipediaDump(**self.config.wikipedia)
+            return self._wikipedia
+
+
+_context = None
+_context_lock = threading.Lock()
+# Every live context, for building their state again in forked processes.
+_contexts = weakref.WeakSet()
+
+
+def _after_fork():
+    global _context_lock
+    _context_lock = threading.Lock()
+    for context in list(_contexts):
+        context._reset()
+
+
+if hasattr(os, "register_at_fork"):
+    os.register_at_fork(after_in_child=_after_fork)
+
+
+def configure(path: Optional[str] = None, **overrides) -> Context:
+    """Replaces the process-wide context with one built from the given configuration."""
+    return set_context(Context(load_config(path, **overrides)))
+
+
+def set_context(context: Context) -> Context:
+    """Replaces the process-wide context."""
+    global _context
+    with _context_lock:
+        _context = context
+    return context
+
+
+def get_context() -> Context:
+    """Returns the process-wide context, loading the default configuration on first use."""
+    global _context
+    with _context_lock:
+        if _context is None:
+            _context = Context(load_config())
+        return _context
@@ -0,0 +1,176 @@
+"""Persistent near-duplicate detection for generated challenges, by MinHash signatures and locality-sensitive hashing."""
+
+import hashlib
+import random
+import re
+import sqlite3
+import threading
+from array import array
+from typing import Iterable, List, Optional, Set, Tuple
+
+# The universal hash permutations of the shingle hashes are computed modulo a Mersenne prime, and truncated to 32 bits.
+MERSENNE_PRIME = (1 << 61) - 1
+MAX_HASH = (1 << 32) - 1
+
+
+def shingles(text: str, size: int = 5) -> Set[str]:
+    """The overlapping character n-grams of the text, ignoring case, punctuation and whitespace differences."""
+    normalized = " ".join(re.sub(r"[^\w\s]", " ", text.lower()).split())
+    if len(normalized) <= size:
+        return {normalized}
+    return {normalized[start:start + size] for start in range(len(normalized) - size + 1)}
+
+
+def _permutations(number_of_permutations: int) -> List[Tuple[int, int]]:
+    # Fixed, so that the signatures stay comparable with the ones stored earlier.
+    rng = random.Random(0)
+    return [
+        (rng.randrange(1, MERSENNE_PRIME), rng.randrange(0, MERSENNE_PRIME)) for _ in range(number_of_permutations)
+    ]
+
+
+def minhash(shingle_set: Iterable[str], permutations: List[Tuple[int, int]]) -> List[int]:
+    """The MinHash signature: the smallest hash of the shingles under each of the hash permutations."""
+    hashes = [
+        int.from_bytes(hashlib.blake2b(shingle.encode("utf-8"), digest_size=8).digest(), "big")
+        for shingle in shingle_set
+    ]
+    return [min(((a * value + b) % MERSENNE_PRIME) & MAX_HASH for value in hashes) for a, b in permutations]
+
+
+def similarity(first: List[int], second: List[int]) -> float:
+    """Estimates the Jaccard similarity of the shingle sets from their signatures."""
+    return sum(a == b for a, b in zip(first, second)) / len(first)
+
+
+class ChallengeIndex:
+    """An SQLite backed similarity index over every challenge description ever added, safe to share between threads.
+
+    The signatures are split into bands, and challenges sharing a band are compared by the estimated Jaccard
+    similarity of their shingles. With 32 bands of 4 rows, a pair with a similarity of 0.5 becomes a candidate with
+    a probability of about 0.87, and a pair with a similarity of 0.2 with a probability of about 0.05.
+    Without a path, the index is kept in memory.
+    """
+
+    def __init__(
+        self,
+        path: Optional[str] = None,
+        threshold: float = 0.5,
+        bands: int = 32,
+        rows_per_band: int = 4,
+        shingle_size: int = 5,
+    ):
+        self.threshold = threshold
+        self.bands = bands
+        self.rows_per_band = rows_per_band
+        self.shingle_size = shingle_size
+        self.permutations = _permutations(bands * rows_per_band)
+        self.lock = threading.Lock()
+        self.connection = sqlite3.connect(path or ":memory:", check_same_thread=False, isolation_level=None)
+        self.connection.execute("PRAGMA journal_mode=WAL")
+        self.connection.execute(
+            """\
+CREATE TABLE IF NOT EXISTS challenges (
+    key TEXT PRIMARY KEY,
+    description TEXT NOT NULL,
+    signature BLOB NOT NULL
+)"""
+        )
+        self.connection.execute(
+            """\
+CREATE TABLE IF NOT EXISTS buckets (
+    band INTEGER NOT NULL,
+    bucket BLOB NOT NULL,
+    key TEXT NOT NULL,
+    PRIMARY KEY (band, bucket, key)
+)"""
+        )
+
+    def signature(self, description: str) -> List[int]:
+        return minhash(shingles(description, self.shingle_size), self.permutations)
+
+    def _buckets(self, signature: List[int]) -> List[bytes]:
+        return [
+            hashlib.blake2b(
+                array("Q", signature[band * self.rows_per_band:(band + 1) * self.rows_per_band]).tobytes(),
+                digest_size=8,
+            ).digest()
+            for band in range(self.bands)
+        ]
+
+    def near_duplicates(self, description: str) -> List[Tuple[str, float]]:
+        """Returns the indexed descriptions at least `threshold` similar to the description, the most similar first."""
+        signature = self.signature(description)
+        with self.lock:
+            keys = {
+                key
+                for band, bucket in enumerate(self._buckets(signature))
+                for (key,) in self.connection.execute(
+                    "SELECT key FROM buckets WHERE band = ? AND bucket = ?", (band, bucket)
+                )
+            }
+            candidates = [
+                self.connection.execute(
+                    "SELECT description, signature FROM challenges WHERE key = ?", (key,)
+                ).fetchone()
+                for key in keys
+            ]
+        matches = [
+            (candidate_description, similarity(signature, array("Q", candidate_signature).tolist()))
+            for candidate_description, candidate_signature in candidates
+        ]
+        return sorted(
+            [match for match in matches if match[1] >= self.threshold], key=lambda match: -match[1]
+        )
+
+    def add(self, description: str):
+        """Indexes the description. Adding the same description again does nothing."""
+        key = hashlib.sha256(description.encode("utf-8")).hexdigest()
+        signature = self.signature(description)
+        with self.lock:
+            self.connection.execute("BEGIN")
+            try:
+                inserted = self.connection.execute(
+                    "INSERT OR IGNORE INTO challenges (key, description, signature) VALUES (?, ?, ?)",
+                    (key, description, array("Q", signature).tobytes()),
+                ).rowcount
+                if inserted:
+                    self.connection.executemany(
+                        "INSERT OR IGNORE INTO buckets (band, bucket, key) VALUES (?, ?, ?)",
+                        [(band, bucket, key) for band, bucket in enumerate(self._buckets(signature))],
+                    )
+                self.connection.execute("COMMIT")
+            except BaseException:
+                self.connection.execute("ROLLBACK")
+                raise
+
+    def filter(self, challenges: List[dict], minimum: int = 0) -> Tuple[List[dict], List[dict]]:
+        """Splits the challenges into new ones, and near-duplicates of indexed ones or of earlier ones in the list.
+
+        The duplicates are returned with the description they duplicate and the similarity. Nothing is added to the
+        index, so that the result can be checkpointed before `add` is called for the new challenges. If there are
+        fewer than `minimum` new challenges, the least similar duplicates are kept too.
+        """
+        batch = ChallengeIndex(None, self.threshold, self.bands, self.rows_per_band, self.shingle_size)
+        matches = []
+        for challenge in challenges:
+            found = self.near_duplicates(challenge["description"]) + batch.near_duplicates(challenge["description"])
+            matches.append(max(found, key=lambda match: match[1], default=None))
+            batch.add(challenge["description"])
+        batch.close()
+        duplicate_indices = sorted(
+            (index for index, match in enumerate(matches) if match is not None), key=lambda index: matches[index][1]
+        )
+        shortfall = max(0, minimum - (len(challenges) - len(duplicate_indices)))
+        dropped = set(duplicate_indices[shortfall:])
+        return (
+            [challenge for index, challenge in enumerate(challenges) if index not in dropped],
+            [
+                {**challenges[index], "duplicate_of": matches[index][0], "similarity": matches[index][1]}
+                for index in sorted(dropped)
+            ],
+        )
+
+    def close(self):
+        with self.lock:
+            self.connection.close()
@@ -0,0 +1,126 @@
+"""Export of chosen and rejected preference pairs from the rankings of the trajectories, for DPO fine-tuning."""
+
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+from typing import Hashable, Iterable, Iterator, List, Optional, Sequence, Tuple
+
+from . import writer
+from .task_family import get_task_family
+
+# Prefixes the prompts of open-ended tasks, so that the trained model knows superhuman performance is wanted.
+UNLEASHED_PREFIX = "UNLEASHED: "
+
+
+def ranking_pairs(
+    ranked_ids: Sequence[Hashable], candidate_ids: Sequence[Hashable]
+) -> Iterator[Tuple[Hashable, Hashable]]:
+    """The (better, worse) pairs implied by a ranking of some of the candidates, from the best down.
+
+    Each ranked candidate is preferred over the ones ranked after it and over all the candidates left unranked.
+    """
+    ranked = list(dict.fromkeys(candidate_id for candidate_id in ranked_ids if candidate_id in candidate_ids))
+    unranked = [candidate_id for candidate_id in candidate_ids if candidate_id not in ranked]
+    for index, better in enumerate(ranked):
+        for worse in ranked[index + 1:] + unranked:
+            yield better, worse
+
+
+def tournament_pairs(ranking: List[dict]) -> Iterator[Tuple[Hashable, Hashable]]:
+    """The (better, worse) pairs of a tournament ranking, leaving out candidates of equal strength."""
+    for index, better in enumerate(ranking):
+        for worse in ranking[index + 1:]:
+            if better["strength"] > worse["strength"]:
+                yield better["id"], worse["id"]
+
+
+def preference_pairs(trajectory: dict, unleashed: bool = False) -> Iterator[dict]:
+    """The chosen and rejected responses to the same prompt, for every pair of candidates the rankings order.
+
+    The pairs are given by the task family of the trajectory, coding by default. Identical responses are left out.
+    """
+    family = get_task_family(trajectory.get("task_family", "coding"))
+    for kind, prompt, chosen, rejected in family.preference_pairs(trajectory):
+        if chosen == rejected:
+            continue
+        yield {
+            "task": kind,
+            "prompt": UNLEASHED_PREFIX + prompt if unleashed else prompt,
+            "chosen": chosen,
+            "rejected": rejected,
+        }
+
+
+class SeenPairs:
+    """The digests of the pairs exported so far, kept in SQLite so that the memory use stays bounded.
+
+    Shared between threads. With a path, the digests persist, so that a resumed export skips the pairs it has
+    already written.
+    """
+
+    def __init__(self, path: Optional[str] = None):
+        self.lock = threading.Lock()
+        self.connection = sqlite3.connect(path or ":memory:", check_same_thread=False, isolation_level=None)
+        self.connection.execute("PRAGMA journal_mode=WAL")
+        self.connection.execute("CREATE TABLE IF NOT EXISTS pairs (digest BLOB PRIMARY KEY) WITHOUT ROWID")
+
+    @staticmethod
+    def digest(pair: dict) -> bytes:
+        return hashlib.blake2b(
+            json.dumps([pair["prompt"], pair["chosen"], pair["rejected"]], ensure_ascii=False).encode("utf-8"),
+            digest_size=16,
+        ).digest()
+
+    def add(self, pair: dict) -> bool:
+        """Records the pair, returning whether it's new."""
+        with self.lock:
+            return self.connection.execute(
+                "INSERT OR IGNORE INTO pairs (digest) VALUES (?)", (self.digest(pair),)
+            ).rowcount > 0
+
+    def close(self):
+        with self.lock:
+            self.connection.close()
+
+
+class PreferencePairExporter:
+    """Streams the new preference pairs of each trajectory to JSONL shards `<prefix>-00000.jsonl[.gz]` in a directory.
+
+    The digests of the written pairs are kept next to the shards in `<prefix>-seen.sqlite`.
+    """
+
+    def __init__(
+        self,
+        directory: str,
+        prefix: str = "dpo",
+        unleashed: bool = False,
+        max_shard_bytes: int = writer.DEFAULT_MAX_SHARD_BYTES,
+        compress: bool = False,
+    ):
+        self.unleashed = unleashed
+        self.writer = writer.ShardedJsonlWriter(directory, prefix, max_shard_bytes, compress)
+        self.seen = SeenPairs(os.path.join(directory, f"{prefix}-seen.sqlite"))
+
+    def export(self, trajectory: dict) -> int:
+        """Writes the pairs of the trajectory not written before, and returns how many were written."""
+        written = 0
+        for pair in preference_pairs(trajectory, self.unleashed):
+            if self.seen.add(pair):
+                self.writer.write(pair)
+                written += 1
+        return written
+
+    def export_all(self, trajectories: Iterable[dict]) -> int:
+        return sum(self.export(trajectory) for trajectory in trajectories)
+
+    def close(self):
+        self.writer.close()
+        self.seen.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
@@ -0,0 +1,39 @@
+"""Asyncio execution engine for running independent calls concurrently."""
+
+import asyncio
+import contextvars
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, List, Sequence, TypeVar
+
+T = TypeVar("T")
+
+# The default number of calls in flight at the same time.
+DEFAULT_CONCURRENCY = 8
+
+
+async def gather(
+    calls: Sequence[Callable[[], T]], concurrency: int = DEFAULT_CONCURRENCY
+) -> List[T]:
+    """Runs blocking calls in worker threads, at most `concurrency` at a time.
+
+    The results are returned in the order of the calls, regardless of the order of completion.
+    The calls see the context variables of the caller, for example the current pipeline stage.
+    """
+    if concurrency < 1:
+        raise ValueError(f"Concurrency must be at least 1, got {concurrency}.")
+    loop = asyncio.get_running_loop()
+    semaphore = asyncio.Semaphore(concurrency)
+    with ThreadPoolExecutor(max_workers=min(concurrency, max(len(calls), 1))) as executor:
+
+        async def run(call):
+            async with semaphore:
+                return await loop.run_in_executor(executor, contextvars.copy_context().run, call)
+
+        return list(await asyncio.gather(*(run(call) for call in calls)))
+
+
+def run_all(
+    calls: Sequence[Callable[[], T]], concurrency: int = DEFAULT_CONCURRENCY
+) -> List[T]:
+    """Synchronous entrypoint for `gather`, for callers not running an event loop."""
+    return asyncio.run(gather(calls, concurrency))
@@ -0,0 +1,20 @@
+"""Exceptions raised by the suite."""
+
+
+class ChatError(Exception):
+    """A chat completion could not be produced.
+
+    This is recoverable: the caller can retry later, skip the work item or resume from a checkpoint.
+    """
+
+    def __init__(self, message: str, retryable: bool = False):
+        super().__init__(message)
+        self.retryable = retryable
+
+
+class TransientError(Exception):
+    """A temporary backend failure which is worth retrying, for example a simulated one."""
+
+
+class InvalidResponseError(ChatError):
+    """A response could not be parsed as JSON conforming to the expected schema, even when requested again."""
@@ -0,0 +1,104 @@
+"""Per-call instrumentation of chat completions: tokens, latency, retries and cost by pipeline stage."""
+
+import json
+import threading
+from collections import defaultdict
+from dataclasses import asdict, dataclass
+from typing import Dict, List, Optional
+
+from .checkpoint import current_stage
+
+
+@dataclass
+class CallRecord:
+    # The full name of the pipeline stage, for example "iteration-0/challenge-1/solution_evaluations".
+    stage: Optional[str]
+    model: str
+    prompt_tokens: int
+    completion_tokens: int
+    # From the first attempt to the result, including the retries and the waits for the rate limiter.
+    latency_seconds: float
+    retries: int
+    cached: bool
+    succeeded: bool
+
+
+def stage_kind(stage: Optional[str]) -> str:
+    """The stage without its scope, so that the same stage of different challenges is aggregated together."""
+    return "unattributed" if stage is None else stage.rsplit("/", 1)[-1]
+
+
+class MetricsCollector:
+    """Collects a record of every chat() call. Safe to share between threads.
+
+    Prices are given per model as dollars per thousand prompt and completion tokens, for example
+    {"gpt-3.5-turbo": {"prompt": 0.0005, "completion": 0.0015}}.
+    """
+
+    def __init__(self, prices: Optional[Dict[str, Dict[str, float]]] = None):
+        self.prices = prices or {}
+        self.records: List[CallRecord] = []
+        self.lock = threading.Lock()
+
+    def record(self, **fields):
+        """Records a call, attributing it to the pipeline stage being computed if it's not given."""
+        fields.setdefault("stage", current_stage.get())
+        with self.lock:
+            self.records.append(CallRecord(**fields))
+
+    def cost(self, record: CallRecord) -> Optional[float]:
+        price = self.prices.get(record.model)
+        if price is None:
+            return None
+        if record.cached:
+            return 0.0
+        return (record.prompt_tokens * price["prompt"] + record.completion_tokens * price["completion"]) / 1000
+
+    def summary(self) -> Dict[str, dict]:
+        """Totals by stage kind, ordered by total tokens from the most expensive stage down."""
+        with self.lock:
+            records = list(self.records)
+        by_stage = defaultdict(list)
+        for record in records:
+            by_stage[stage_kind(record.stage)].append(record)
+        summary = {}
+        for stage, stage_records in by_stage.items():
+            costs = [self.cost(record) for record in stage_records]
+            summary[stage] = {
+                "calls": len(stage_records),
+                "cached_calls": sum(record.cached for record in stage_records),
+                "failed_calls": sum(not record.succeeded for record in stage_records),
+                "retries": sum(record.retries for record in stage_records),
+                "prompt_tokens": sum(record.prompt_tokens for record in stage_records),
+                "completion_tokens": sum(record.completion_tokens for record in stage_records),
+                "latency_seconds": sum(record.latency_seconds for record in stage_records),
+                "max_latency_seconds": max(record.latency_seconds for record in stage_records),
+                "cost": None if None in costs else sum(costs),
+            }
+        return dict(
+            sorted(
+                summary.items(),
+                key=lambda item: -(item[1]["prompt_tokens"] + item[1]["completion_tokens"]),
+            )
+        )
+
+    def summary_table(self) -> str:
+        lines = [
+            f"{'stage':<36} {'calls':>6} {'cached':>6} {'retries':>7} {'prompt tok':>10} {'compl tok':>10} "
+            f"{'latency s':>10} {'cost $':>8}"
+        ]
+        for stage, totals in self.summary().items():
+            cost = "-" if totals["cost"] is None else f"{totals['cost']:.4f}"
+            lines.append(
+                f"{stage:<36} {totals['calls']:>6} {totals['cached_calls']:>6} {totals['retries']:>7} "
+                f"{totals['prompt_tokens']:>10} {totals['completion_tokens']:>10} "
+                f"{totals['latency_seconds']:>10.2f} {cost:>8}"
+            )
+        return "\n".join(lines)
+
+    def write(self, path: str):
+        """Writes the summary and every call record as JSON."""
+        with self.lock:
+            records = [asdict(record) for record in self.records]
+        with open(path, "w", encoding="utf-8") as metrics_file:
+            json.dump({"summary": self.summary(), "calls": records}, metrics_file, indent=2)
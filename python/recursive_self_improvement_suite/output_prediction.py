@@ -0,0 +1,174 @@
+"""Predicting what a Python program outputs: a task family scored by running the programs, without LLM judges."""
+
+import difflib
+import logging
+import threading
+from typing import Iterator, List, Tuple
+
+from . import dpo
+from . import recursive_self_improvement_suite as suite
+from . import routing
+from . import sandbox
+from .checkpoint import Checkpoint
+from .prompts import JSON_SCHEMA_DRAFT
+from .serialization import compact_json
+from .task_family import TaskFamily
+
+# The programs are meant to be small, so they get much tighter limits than the evaluation functions.
+PROGRAM_LIMITS = sandbox.Limits(wall_time_seconds=5, cpu_time_seconds=2, memory_bytes=256 * 1024 * 1024)
+
+
+def generate_program():
+    return """\
+Please write a short, self-contained Python program whose output is hard to predict without carefully tracing
+its execution, for example by string manipulation, arithmetic, data structures, closures, generators or scoping.
+The program must print its output, be deterministic, read no input, use no files or network and finish in a second.
+Use only the standard library. Answer just by giving the Python code with Markdown notation.
+"""
+
+
+def predict_output_schema() -> dict:
+    return {
+        "$schema": JSON_SCHEMA_DRAFT,
+        "type": "object",
+        "properties": {
+            "reasoning": {"type": "string"},
+            "output": {"type": "string"},
+        },
+        "required": ["reasoning", "output"],
+        "additionalProperties": False,
+    }
+
+
+def predict_output(program: str):
+    # The program comes first, so that the prompts for its predictions share the prefix.
+    return f"""\
+Here is a Python program:
+<program>
+{program}
+</program>
+Above is a Python program. Please predict exactly what it prints, tracing its execution step by step.
+Produce the reasoning and the exact output in a valid JSON object without Markdown notation.
+Your output must conform exactly to the following JSON Schema:
+<JSON-Schema>
+{compact_json(predict_output_schema())}
+</JSON-Schema>
+"""
+
+
+def normalize_output(output: str) -> str:
+    """Ignores trailing whitespace on each line and blank lines at the ends, which aren't visible in the output."""
+    return "\n".join(line.rstrip() for line in output.strip("\n").splitlines()).strip("\n")
+
+
+def score_predictions(predictions: List[str], expected_output: str) -> List[dict]:
+    """Scores the predictions of the same output by exact match, and by similarity for partial credit.
+
+    The expected output is the second sequence of a single matcher, so that its analysis is shared by all the
+    predictions, and exact matches skip the comparison altogether.
+    """
+    expected = normalize_output(expected_output)
+    matcher = difflib.SequenceMatcher(None, autojunk=False)
+    matcher.set_seq2(expected)
+    scores = []
+    for prediction in predictions:
+        predicted = normalize_output(prediction)
+        if predicted == expected:
+            scores.append({"exact": True, "similarity": 1.0})
+            continue
+        matcher.set_seq1(predicted)
+        scores.append({"exact": False, "similarity": matcher.ratio()})
+    return scores
+
+
+class OutputPredictionTaskFamily(TaskFamily):
+    """Programs generated by an LLM, whose output the LLM then predicts, scored against actually running them."""
+
+    name = "output_prediction"
+    task_name = "program"
+    number_of_programs = 10
+    number_of_predictions = 5
+
+    def __init__(self):
+        # The pool is made on first use, since exporting the preference pairs of a trajectory runs no programs.
+        self._sandbox_pool = None
+        self._sandbox_pool_lock = threading.Lock()
+
+    @property
+    def sandbox_pool(self) -> sandbox.SandboxPool:
+        with self._sandbox_pool_lock:
+            if self._sandbox_pool is None:
+                self._sandbox_pool = sandbox.SandboxPool(PROGRAM_LIMITS)
+            return self._sandbox_pool
+
+    def close(self):
+        with self._sandbox_pool_lock:
+            if self._sandbox_pool is not None:
+                self._sandbox_pool.close()
+                self._sandbox_pool = None
+
+    def select_tasks(self, checkpoint: Checkpoint, concurrency: int, number_of_tasks: int, iteration: int = 0) -> dict:
+        """Generates programs and runs them, keeping the ones which run cleanly and print something."""
+        programs = checkpoint.stage(
+            "programs",
+            lambda: [
+                sandbox.extract_code(response)
+                for response in suite.chat_n(
+                    [generate_program()],
+                    self.number_of_programs,
+                    concurrency,
+                    first_sample_index=suite.iteration_sample_index(iteration),
+                    role=routing.CHALLENGE_GENERATION,
+                )
+            ],
+        )
+        program_outputs = checkpoint.stage(
+            "program_outputs", lambda: [result.to_dict() for result in self.sandbox_pool.run_all(programs)]
+        )
+        runnable = [
+            {"id": id, "program": program, "output": output["stdout"]}
+            for id, (program, output) in enumerate(zip(programs, program_outputs))
+            if output["returncode"] == 0 and not output["stderr"].strip() and output["stdout"].strip()
+        ]
+        # The same program may be sampled more than once, but one of each is enough.
+        unique = []
+        for program in runnable:
+            if all(program["program"] != kept["program"] for kept in unique):
+                unique.append(program)
+        logging.info(f"{len(unique)} of the {len(programs)} programs run cleanly and are distinct")
+        return {"programs": programs, "program_outputs": program_outputs, "best_programs": unique[:number_of_tasks]}
+
+    def process_task(self, task: dict, checkpoint: Checkpoint, concurrency: int) -> dict:
+        """Samples predictions of the output of the program, and scores them without an LLM judge."""
+        predictions = checkpoint.stage(
+            "predictions",
+            lambda: suite.chat_n_json(
+                [predict_output(task["program"])],
+                predict_output_schema(),
+                self.number_of_predictions,
+                concurrency,
+                role=routing.SOLUTION_GENERATION,
+            ),
+        )
+        scores = score_predictions([prediction["output"] for prediction in predictions], task["output"])
+        best_prediction = max(range(len(predictions)), key=lambda id: scores[id]["similarity"], default=None)
+        return {
+            "program": task,
+            "predictions": predictions,
+            "prediction_scores": scores,
+            "best_prediction": best_prediction,
+        }
+
+    def preference_pairs(self, trajectory: dict) -> Iterator[Tuple[str, str, str, str]]:
+        """Pairs of predictions, the more similar to the actual output chosen over the less similar."""
+        predictions = trajectory["predictions"]
+        ranking = sorted(
+            (
+                {"id": id, "strength": score["similarity"]}
+                for id, score in enumerate(trajectory["prediction_scores"])
+            ),
+            key=lambda ranked: -ranked["strength"],
+        )
+        prompt = predict_output(trajectory["program"]["program"])
+        for better, worse in dpo.tournament_pairs(ranking):
+            yield "output_prediction", prompt, compact_json(predictions[better]), compact_json(predictions[worse])
@@ -0,0 +1,107 @@
+"""Tolerant extraction of JSON values from model responses, and validation against the prompt schemas."""
+
+import json
+import re
+from typing import Any, List
+
+from .errors import InvalidResponseError
+
+FENCE_PATTERN = re.compile(r"```[A-Za-z0-9_-]*[ \t]*\n(.*?)```", re.DOTALL)
+
+_decoder = json.JSONDecoder()
+
+
+def strip_fences(text: str) -> str:
+    """Returns the content of the first Markdown code block, or the text as it is if there's none."""
+    match = FENCE_PATTERN.search(text)
+    return text if match is None else match.group(1)
+
+
+def find_json(text: str) -> Any:
+    """Returns the first balanced JSON object or array in the text, skipping any prose around it."""
+    for start, character in enumerate(text):
+        if character in "{[":
+            try:
+                return _decoder.raw_decode(text, start)[0]
+            except json.JSONDecodeError:
+                continue
+    raise InvalidResponseError(f"No JSON value in the response: {text[:200]!r}")
+
+
+def coerce(value: Any, schema: dict) -> Any:
+    """Repairs the usual near misses of the models to fit the schema.
+
+    A single object is wrapped in a list where an array is expected, an object wrapping the expected array in its
+    only field is unwrapped, and numbers and numeric strings are converted where the other one is expected.
+    """
+    schema_type = schema.get("type")
+    if schema_type == "array":
+        if isinstance(value, dict):
+            wrapped = list(value.values())
+            value = wrapped[0] if len(wrapped) == 1 and isinstance(wrapped[0], list) else [value]
+        if isinstance(value, list):
+            return [coerce(item, schema.get("items", {})) for item in value]
+    elif schema_type == "object":
+        if isinstance(value, list) and len(value) == 1:
+            value = value[0]
+        if isinstance(value, dict):
+            properties = schema.get("properties", {})
+            return {
+                key: coerce(field_value, properties[key]) if key in properties else field_value
+                for key, field_value in value.items()
+            }
+    elif schema_type == "string" and isinstance(value, (int, float)) and not isinstance(value, bool):
+        return str(value)
+    elif schema_type == "integer" and isinstance(value, str) and re.fullmatch(r"-?\d+", value.strip()):
+        return int(value)
+    return value
+
+
+_TYPES = {
+    "object": dict,
+    "array": list,
+    "string": str,
+    "integer": int,
+    "number": (int, float),
+    "boolean": bool,
+}
+
+
+def validate(value: Any, schema: dict, path: str = "$") -> List[str]:
+    """Returns the violations of the subset of JSON Schema used in the prompts, or an empty list if there are none."""
+    if "enum" in schema and value not in schema["enum"]:
+        return [f"{path}: {value!r} is not one of {schema['enum']}"]
+    schema_type = schema.get("type")
+    if schema_type is not None:
+        # Booleans are integers in Python but not in JSON.
+        if not isinstance(value, _TYPES[schema_type]) or (isinstance(value, bool) and schema_type != "boolean"):
+            return [f"{path}: expected {schema_type}, got {type(value).__name__}"]
+    errors = []
+    if isinstance(value, dict):
+        properties = schema.get("properties", {})
+        errors += [f"{path}: missing {key!r}" for key in schema.get("required", []) if key not in value]
+        for key, field_value in value.items():
+            if key in properties:
+                errors += validate(field_value, properties[key], f"{path}.{key}")
+            elif schema.get("additionalProperties") is False:
+                errors.append(f"{path}: unexpected {key!r}")
+    if isinstance(value, list):
+        if len(value) < schema.get("minItems", 0):
+            errors.append(f"{path}: expected at least {schema['minItems']} items, got {len(value)}")
+        if "maxItems" in schema and len(value) > schema["maxItems"]:
+            errors.append(f"{path}: expected at most {schema['maxItems']} items, got {len(value)}")
+        for index, item in enumerate(value):
+            errors += validate(item, schema.get("items", {}), f"{path}[{index}]")
+    return errors
+
+
+def parse_json(text: str, schema: dict) -> Any:
+    """Extracts the JSON value from a response, repairs it to fit the schema and validates it.
+
+    Raises InvalidResponseError if there's no JSON value in the response, or if it doesn't conform to the schema.
+    """
+    value = coerce(find_json(strip_fences(text)), schema)
+    errors = validate(value, schema)
+    if errors:
+        raise InvalidResponseError(f"The response doesn't conform to the schema: {'; '.join(errors[:5])}")
+    return value
@@ -0,0 +1,43 @@
+"""Building blocks shared by the prompts of the task families: sections of items, and JSON Schemas of the outputs."""
+
+from typing import List
+
+from .serialization import compact_json, render_items
+
+JSON_SCHEMA_DRAFT = "https://json-schema.org/draft/2020-12/schema"
+
+
+def object_schema(properties: dict, required: List[str]) -> dict:
+    return {
+        "$schema": JSON_SCHEMA_DRAFT,
+        "type": "object",
+        "properties": properties,
+        "required": required,
+        "additionalProperties": False,
+    }
+
+
+def section(tag: str, items, item_tag: str) -> str:
+    return f"<{tag}>\n{render_items(items, item_tag)}\n</{tag}>\n"
+
+
+def output_schema(schema: dict) -> str:
+    """The instruction of a prompt to produce an output conforming to the schema."""
+    return f"""\
+Your output must conform exactly to the following JSON Schema:
+<JSON-Schema>
+{compact_json(schema)}
+</JSON-Schema>
+"""
+
+
+def compare_schema(candidate_ids: List) -> dict:
+    """The schema of a pairwise comparison, choosing the better of the candidates, for the tournaments."""
+    id_type = "integer" if all(isinstance(candidate_id, int) for candidate_id in candidate_ids) else "string"
+    return object_schema(
+        {
+            "rationale": {"type": "string"},
+            "better_id": {"type": id_type, "enum": list(candidate_ids)},
+        },
+        ["rationale", "better_id"],
+    )
@@ -0,0 +1,121 @@
+"""Shared rate limiting and retry scheduling for chat completion calls."""
+
+import random
+import threading
+import time
+from typing import Optional
+
+from .errors import TransientError
+
+# Rough characters per token ratio for English text and code, used to estimate the cost of a request before sending it.
+CHARACTERS_PER_TOKEN = 4
+# Expected completion length used in estimates, settled against the actual usage after the call.
+EXPECTED_COMPLETION_TOKENS = 512
+
+
+class TokenBucket:
+    """A token bucket which allows borrowing, so that callers reserve capacity in arrival order.
+
+    The level may go negative, in which case the caller needs to wait until it has refilled back to zero.
+    """
+
+    def __init__(self, capacity: float, refill_per_second: float):
+        self.capacity = capacity
+        self.refill_per_second = refill_per_second
+        self.level = capacity
+        self.updated = time.monotonic()
+
+    def _refill(self, now: float):
+        self.level = min(self.capacity, self.level + (now - self.updated) * self.refill_per_second)
+        self.updated = now
+
+    def reserve(self, amount: float, now: float) -> float:
+        """Takes `amount` from the bucket and returns the number of seconds to wait before using it."""
+        self._refill(now)
+        self.level -= amount
+        return max(0.0, -self.level / self.refill_per_second)
+
+    def adjust(self, amount: float, now: float):
+        """Returns (positive) or takes (negative) capacity after the actual cost is known."""
+        self._refill(now)
+        self.level = min(self.capacity, self.level + amount)
+
+
+class RateLimiter:
+    """Tracks both requests per minute and tokens per minute, shared by all the workers of a process."""
+
+    def __init__(self, requests_per_minute: float = 60, tokens_per_minute: float = 90000):
+        self.requests = TokenBucket(requests_per_minute, requests_per_minute / 60)
+        self.tokens = TokenBucket(tokens_per_minute, tokens_per_minute / 60)
+        self.paused_until = 0.0
+        self.lock = threading.Lock()
+
+    def acquire(self, tokens: int):
+        """Blocks until a request of the estimated size `tokens` may be sent."""
+        with self.lock:
+            now = time.monotonic()
+            wait = max(
+                self.requests.reserve(1, now),
+                self.tokens.reserve(tokens, now),
+                self.paused_until - now,
+            )
+        if wait > 0:
+            time.sleep(wait)
+
+    def settle(self, estimated_tokens: int, actual_tokens: int):
+        """Corrects the token bucket with the actual usage reported by the API."""
+        with self.lock:
+            self.tokens.adjust(estimated_tokens - actual_tokens, time.monotonic())
+
+    def pause(self, seconds: float):
+        """Holds back every worker, for example when the API tells us to retry after some time."""
+        with self.lock:
+            self.paused_until = max(self.paused_until, time.monotonic() + seconds)
+
+
+def estimate_tokens(session, completions: int = 1) -> int:
+    """Estimates the total tokens of a request sampling the given number of completions from the length of its messages."""
+    prompt_characters = sum(len(message["content"]) for message in session)
+    return prompt_characters // CHARACTERS_PER_TOKEN + completions * EXPECTED_COMPLETION_TOKENS
+
+
+def backoff_delay(attempt: int, base: float = 1.0, cap: float = 60.0, rng: random.Random = random) -> float:
+    """Exponential backoff with full jitter for the given zero-based retry attempt."""
+    return rng.uniform(0, min(cap, base * 2 ** attempt))
+
+
+def retry_after(error: Exception) -> Optional[float]:
+    """Returns the delay in seconds requested by the API in the response headers, if any."""
+    response = getattr(error, "response", None)
+    if response is None:
+        return None
+    headers = response.headers
+    try:
+        if "retry-after-ms" in headers:
+            return float(headers["retry-after-ms"]) / 1000
+        if "retry-after" in headers:
+            return float(headers["retry-after"])
+    except ValueError:
+        # The header can also be an HTTP date, in which case we fall back to the backoff schedule.
+        pass
+    return None
+
+
+def is_rate_limit(error: Exception) -> bool:
+    import openai
+
+    # Running out of quota is reported as a rate limit, but waiting doesn't help with it.
+    return isinstance(error, openai.RateLimitError) and getattr(error, "code", None) != "insufficient_quota"
+
+
+def is_retryable(error: Exception) -> bool:
+    import openai
+
+    # Errors which are worth retrying after a backoff. Everything else is a problem with the request itself.
+    transient_errors = (
+        openai.APIConnectionError,
+        openai.APITimeoutError,
+        openai.InternalServerError,
+        openai.ConflictError,
+    )
+    return is_rate_limit(error) or isinstance(error, transient_errors + (TransientError,))
@@ -1,216 +1,473 @@
 """Main module."""
 
-import json
 import logging
-from openai import OpenAI
 import time
+import zlib
+from typing import Callable, Hashable, List, Optional, Tuple
 
-from . import coding
+from . import adaptive
+from . import aggregation
+from . import cache
+from . import engine
+from . import parsing
+from . import rate_limit
+from . import routing
+from . import scheduler
+from . import tournament
+from .checkpoint import Checkpoint
+from .config import get_context
+from .errors import ChatError, InvalidResponseError
+from .prompts import compare_schema
+from .task_family import TaskFamily, get_task_family
 
-with open("apikey.json", "r") as apikey_file:
-    config = json.load(apikey_file)
-    client = OpenAI(
-        api_key=config["apikey"],
-        organization=config["org"],
-    )
-    model = config["model"]
 
-logging.basicConfig(level=logging.DEBUG)
+# Samples requested again for invalid responses get indices this far apart, so they never collide with the others.
+RESAMPLE_STRIDE = 1000
+# The samples of each iteration start this far apart, so that neither they nor their resamples collide with the
+# samples of other iterations, for fewer than RESAMPLE_STRIDE samples and parse attempts per prompt.
+ITERATION_STRIDE = RESAMPLE_STRIDE * RESAMPLE_STRIDE
 
 
-def chat(messages):
-    session = (
-        [
-            {
-                "role": "system",
-                "content": """\
+def iteration_sample_index(iteration: int) -> int:
+    """The first sample index of the iteration, for the prompts which are the same in every iteration."""
+    return iteration * ITERATION_STRIDE
+
+
+SYSTEM_PROMPT = """\
 You are a component in a system of training exercises. You answer concisely without pleasantries.
 You will produce either JSON responses without Markdown notation, or Python code in Markdown blocks.
-""",
-            },
-        ]
-        + list(
-            map(
-                lambda message: {
-                    "role": "user",
-                    "content": message,
-                },
-                messages,
+"""
+
+
+def _session(messages):
+    # The system prompt comes first and never changes, so that it's a part of the prefix shared by every request.
+    return [{"role": "system", "content": SYSTEM_PROMPT}] + [
+        {"role": "user", "content": message} for message in messages
+    ]
+
+
+def _cached(session, model: str, sample_index: int) -> Optional[str]:
+    """Returns the cached completion of the sample, if any."""
+    context = get_context()
+    config = context.config
+    if context.response_cache is None:
+        return None
+    start = time.monotonic()
+    cached = context.response_cache.get(cache.cache_key(model, session, config.temperature, sample_index))
+    if cached is not None:
+        logging.debug(f"Cache hit for request: {session}")
+        context.metrics.record(
+            model=model,
+            prompt_tokens=0,
+            completion_tokens=0,
+            latency_seconds=time.monotonic() - start,
+            retries=0,
+            cached=True,
+            succeeded=True,
+        )
+    return cached
+
+
+def _request(session, model: str, sample_indices: List[int]) -> List[str]:
+    """Samples the completions in a single backend request, retrying transient failures, and caches each of them."""
+    context = get_context()
+    config = context.config
+    response_cache = context.response_cache
+    rate_limiter = context.rate_limiter
+    # Outside the retries, so that a configuration error isn't reported as a failed call.
+    backend = context.backend
+    start = time.monotonic()
+    estimated_tokens = rate_limit.estimate_tokens(session, len(sample_indices))
+    attempt = 0
+    try:
+        for attempt in range(config.max_attempts):
+            rate_limiter.acquire(estimated_tokens)
+            try:
+                with context.request_slots:
+                    completions = backend.complete_n(session, model, config.temperature, sample_indices)
+            except Exception as e:
+                if not rate_limit.is_retryable(e):
+                    raise ChatError(f"Calling the {config.backend} backend failed: {e}") from e
+                if attempt + 1 == config.max_attempts:
+                    logging.warning(f"The last attempt {attempt + 1}/{config.max_attempts} failed: {e}")
+                    break
+                delay = rate_limit.retry_after(e)
+                if delay is None:
+                    delay = rate_limit.backoff_delay(attempt)
+                if rate_limit.is_rate_limit(e):
+                    # Everyone is over the limit, not just this worker.
+                    rate_limiter.pause(delay)
+                logging.warning(
+                    f"Retrying in {delay:.1f}s after attempt {attempt + 1}/{config.max_attempts} failed: {e}"
+                )
+                time.sleep(delay)
+                continue
+            logging.debug(f"Request: {session}, completions: {completions}")
+            total_tokens = [completion.total_tokens for completion in completions]
+            if None not in total_tokens:
+                rate_limiter.settle(estimated_tokens, sum(total_tokens))
+            contents = [completion.content for completion in completions]
+            if response_cache is not None:
+                for sample_index, content in zip(sample_indices, contents):
+                    response_cache.put(
+                        cache.cache_key(model, session, config.temperature, sample_index), content
+                    )
+            context.metrics.record(
+                model=model,
+                prompt_tokens=sum(completion.prompt_tokens or 0 for completion in completions),
+                completion_tokens=sum(completion.completion_tokens or 0 for completion in completions),
+                latency_seconds=time.monotonic() - start,
+                retries=attempt,
+                cached=False,
+                succeeded=True,
             )
+            return contents
+        raise ChatError(f"Failed calling the {config.backend} backend even with repeated trials!", retryable=True)
+    except ChatError:
+        context.metrics.record(
+            model=model,
+            prompt_tokens=0,
+            completion_tokens=0,
+            latency_seconds=time.monotonic() - start,
+            retries=attempt,
+            cached=False,
+            succeeded=False,
         )
-    )
-    trials = 0
-    while trials < 5:
+        raise
+
+
+def _chat(messages, model: str, sample_index: int):
+    session = _session(messages)
+    cached = _cached(session, model, sample_index)
+    if cached is not None:
+        return cached
+    return _request(session, model, [sample_index])[0]
+
+
+def chat(messages, sample_index: int = 0, role: Optional[str] = None):
+    """Returns a completion for the given user messages, from the model of the role.
+
+    Repeated samples for the same messages are told apart by `sample_index`, so that each of them is cached separately.
+    """
+    return _chat(messages, routing.model_for(get_context().config, role, sample_index), sample_index)
+
+
+def chat_n(
+    messages,
+    n: int,
+    concurrency: int = engine.DEFAULT_CONCURRENCY,
+    first_sample_index: int = 0,
+    role: Optional[str] = None,
+):
+    """Samples `n` independent completions for the same messages, in a deterministic order.
+
+    The samples which aren't cached are requested together, as few requests as the backend allows, which are run
+    concurrently. With a panel of models for the role, the samples take turns between the models, and the requests
+    to all of them are run concurrently. More samples can be added later by starting from a `first_sample_index`
+    after the earlier ones.
+    """
+    context = get_context()
+    session = _session(messages)
+    sample_indices = range(first_sample_index, first_sample_index + n)
+    models = {sample_index: routing.model_for(context.config, role, sample_index) for sample_index in sample_indices}
+    completions = [_cached(session, models[sample_index], sample_index) for sample_index in sample_indices]
+    missing_by_model = {}
+    for sample_index, completion in zip(sample_indices, completions):
+        if completion is None:
+            missing_by_model.setdefault(models[sample_index], []).append(sample_index)
+    samples_per_request = max(1, context.backend.max_samples_per_request)
+    requests = [
+        (model, missing[start:start + samples_per_request])
+        for model, missing in missing_by_model.items()
+        for start in range(0, len(missing), samples_per_request)
+    ]
+    if requests:
+        results = engine.run_all(
+            [
+                lambda model=model, sample_indices=sample_indices: _request(session, model, sample_indices)
+                for model, sample_indices in requests
+            ],
+            concurrency,
+        )
+        for (_, sample_indices), contents in zip(requests, results):
+            for sample_index, content in zip(sample_indices, contents):
+                completions[sample_index - first_sample_index] = content
+    return completions
+
+
+def _parse_or_resample(messages, schema: dict, model: str, sample_index: int, response: str):
+    parse_attempt = 0
+    while True:
         try:
-            completion = client.chat.completions.create(
-                model=model, messages=session, temperature=0.2
+            return parsing.parse_json(response, schema)
+        except InvalidResponseError as e:
+            parse_attempt += 1
+            if parse_attempt >= get_context().config.max_parse_attempts:
+                raise
+            logging.warning(f"Sampling again after an invalid response to sample {sample_index}: {e}")
+            # A new sample index, because the invalid response is cached under the old one. The same model, so
+            # that every model of a panel keeps its share of the samples.
+            response = _chat(messages, model, sample_index + parse_attempt * RESAMPLE_STRIDE)
+
+
+def chat_json(messages, schema: dict, sample_index: int = 0, role: Optional[str] = None):
+    """Returns a completion parsed as JSON conforming to the schema, sampling again if the response isn't.
+
+    Raises InvalidResponseError if no valid response is produced in `max_parse_attempts` samples.
+    """
+    model = routing.model_for(get_context().config, role, sample_index)
+    return _parse_or_resample(messages, schema, model, sample_index, _chat(messages, model, sample_index))
+
+
+def chat_n_json(
+    messages,
+    schema: dict,
+    n: int,
+    concurrency: int = engine.DEFAULT_CONCURRENCY,
+    first_sample_index: int = 0,
+    role: Optional[str] = None,
+):
+    """Samples `n` completions parsed as JSON conforming to the schema. Only the invalid ones are sampled again."""
+    config = get_context().config
+    responses = chat_n(messages, n, concurrency, first_sample_index, role)
+    return engine.run_all(
+        [
+            lambda sample_index=sample_index, response=response: _parse_or_resample(
+                messages, schema, routing.model_for(config, role, sample_index), sample_index, response
+            )
+            for sample_index, response in enumerate(responses, first_sample_index)
+        ],
+        concurrency,
+    )
+
+
+def _selection(ranked):
+    # Judges agree when they select the same candidates, in whatever order.
+    return lambda judgement: frozenset(ranked(judgement))
+
+
+def top_choice(ranked):
+    """Judges agree when they rank the same candidate the best, for judges who rank all the candidates."""
+    return lambda judgement: ranked(judgement)[0]
+
+
+def _sample_judges(prompt: str, schema: dict, number_of_judges: int, choice, concurrency: int):
+    """Samples judgements of the prompt.
+
+    With adaptive sampling, only a few judges are sampled at first, and more only if no majority of them agree on
+    `choice(judgement)`.
+    """
+    if not get_context().config.adaptive_sampling:
+        return chat_n_json([prompt], schema, number_of_judges, concurrency, role=routing.RANKING)
+    judgements = chat_n_json([prompt], schema, adaptive.INITIAL_JUDGES, concurrency, role=routing.RANKING)
+    if adaptive.majority(judgements, choice) is None:
+        logging.info(f"The {len(judgements)} judges disagree, sampling more of them")
+        judgements += chat_n_json(
+            [prompt],
+            schema,
+            adaptive.MAX_JUDGES - len(judgements),
+            concurrency,
+            first_sample_index=len(judgements),
+            role=routing.RANKING,
+        )
+    return judgements
+
+
+def _rank_judges(judgements, ranked, choice, candidate_ids, id_key: str, rationale_key: str, ask):
+    """Chooses the best judge, in the schema of the meta-ranking prompts.
+
+    By default `ask` calls an LLM to judge the judges. With adaptive sampling no call is made if the judges have a
+    majority. With the local meta-ranking the rankings are aggregated without a call, and with the escalating one
+    an LLM is only asked if the judges disagree with their consensus.
+    """
+    config = get_context().config
+    if config.adaptive_sampling:
+        agreed = adaptive.agreement_ranking(judgements, choice, id_key, rationale_key)
+        if agreed is not None:
+            return agreed
+    if config.meta_ranking not in aggregation.META_RANKING_MODES:
+        raise ValueError(
+            f"Unknown meta-ranking {config.meta_ranking}, expected one of {aggregation.META_RANKING_MODES}."
+        )
+    if config.meta_ranking == aggregation.LLM:
+        return ask()
+    aggregated = aggregation.aggregate(judgements, ranked, list(candidate_ids))
+    if config.meta_ranking == aggregation.ESCALATE and aggregated["agreement"] < config.escalation_agreement:
+        logging.info(f"Asking for a meta-ranking, the judges agree only by {aggregated['agreement']:.2f}")
+        return {**ask(), "aggregation": aggregated}
+    return {
+        id_key: aggregated["best_judge"],
+        rationale_key: (
+            f"Aggregated locally. This judge agrees most with the others, and the judges agree with their "
+            f"consensus by a mean Kendall tau of {aggregated['agreement']:.2f}."
+        ),
+        "aggregation": aggregated,
+    }
+
+
+def ranking_mode() -> str:
+    """The configured ranking mode, one of tournament.RANKING_MODES."""
+    mode = get_context().config.ranking_mode
+    if mode not in tournament.RANKING_MODES:
+        raise ValueError(f"Unknown ranking mode {mode}, expected one of {tournament.RANKING_MODES}.")
+    return mode
+
+
+def rank_by_judges(
+    checkpoint: Checkpoint,
+    stages: Tuple[str, str],
+    prompt: str,
+    schema: dict,
+    number_of_judges: int,
+    ranked: Callable[[dict], list],
+    candidate_ids,
+    meta_prompt: Callable[[list], str],
+    meta_schema: Callable[[range], dict],
+    keys: Tuple[str, str],
+    concurrency: int = engine.DEFAULT_CONCURRENCY,
+    choice: Optional[Callable[[dict], Hashable]] = None,
+):
+    """Samples judges ranking the candidates in one prompt, and chooses the best judge, as two checkpointed stages.
+
+    `ranked(judgement)` gives the candidate ids a judge ranked, from the best down. `meta_prompt(judgements)` and
+    `meta_schema(judge_ids)` ask an LLM to choose the best judge, whose id and rationale are under `keys`, when the
+    meta-ranking calls for it. With adaptive sampling, the judges agree when they make the same `choice(judgement)`,
+    by default when they select the same candidates in whatever order. Judges who rank all the candidates always
+    select the same ones, so their choice should be for example the `top_choice`. Returns the judgements and the
+    meta-ranking.
+    """
+    choice = choice if choice is not None else _selection(ranked)
+    judgements = checkpoint.stage(
+        stages[0], lambda: _sample_judges(prompt, schema, number_of_judges, choice, concurrency)
+    )
+    meta_ranking = checkpoint.stage(
+        stages[1],
+        lambda: _rank_judges(
+            judgements,
+            ranked,
+            choice,
+            candidate_ids,
+            *keys,
+            lambda: chat_json(
+                [meta_prompt(judgements)], meta_schema(range(len(judgements))), role=routing.META_RANKING
+            ),
+        ),
+    )
+    return judgements, meta_ranking
+
+
+def rank_by_tournament(
+    checkpoint: Checkpoint,
+    stage: str,
+    candidate_ids,
+    comparison_prompt: Callable[[Hashable, Hashable], str],
+    concurrency: int = engine.DEFAULT_CONCURRENCY,
+    comparison_schema: Callable[[list], dict] = compare_schema,
+):
+    """Ranks the candidates by a tournament of pairwise comparisons, as a checkpointed stage.
+
+    The comparisons are prompted by `comparison_prompt(first, second)`, and answered in `comparison_schema([first,
+    second])`, which gives the id of the better candidate under "better_id" and the reason under "rationale".
+    """
+    return checkpoint.stage(
+        stage, lambda: _tournament(candidate_ids, comparison_prompt, comparison_schema, concurrency)
+    )
+
+
+def _tournament(candidate_ids, comparison_prompt, comparison_schema, concurrency: int):
+
+    panel_size = len(routing.panel(get_context().config, routing.RANKING))
+
+    def compare(first, second):
+        prompt = comparison_prompt(first, second)
+        # With a panel of judges, the comparisons are spread between the models by the prompt, deterministically.
+        sample_index = zlib.crc32(prompt.encode("utf-8")) % panel_size
+        comparison = chat_json([prompt], comparison_schema([first, second]), sample_index, routing.RANKING)
+        return {"winner": comparison["better_id"], "rationale": comparison["rationale"]}
+
+    return tournament.run_tournament(candidate_ids, compare, get_context().config.tournament_rounds, concurrency)
+
+
+def _task_family(family: Optional[TaskFamily]) -> TaskFamily:
+    return family if family is not None else get_task_family(get_context().config.task_family)
+
+
+def iteration_graph(
+    checkpoint: Checkpoint,
+    concurrency: int = engine.DEFAULT_CONCURRENCY,
+    number_of_tasks: int = 2,
+    family: Optional[TaskFamily] = None,
+    iteration: int = 0,
+) -> List[scheduler.Node]:
+    """The steps of an iteration of the task family: selecting the tasks, and then processing each of them.
+
+    The family is config.task_family by default. The stages within a task depend on each other in sequence, but the
+    tasks don't depend on each other, so that the stages of one overlap with those of the others when the graph is run.
+    """
+    family = _task_family(family)
+
+    def task_node(index):
+        def compute(results):
+            best_tasks = results["selection"][family.best_tasks_key]
+            if index >= len(best_tasks):
+                return None
+            return family.process_task(
+                best_tasks[index], checkpoint.scope(f"{family.task_name}-{index}"), concurrency
             )
-            logging.debug(f"Request: {session}, completion: {completion}")
-            return completion.choices[0].message.content
-        except Exception as e:
-            print(e)
-            time.sleep(10)
-            trials = trials + 1
-            # Open AI rate limit of one request per second, 60 / minute.
-            time.sleep(2)
-    print("Failed calling OpenAI API even with repeated trials!")
-    exit(1)
-
-
-def coding_improvement_iteration():
+
+        return scheduler.Node(f"{family.task_name}-{index}", compute, ("selection",))
+
+    return [
+        scheduler.Node(
+            "selection", lambda results: family.select_tasks(checkpoint, concurrency, number_of_tasks, iteration)
+        ),
+        *(task_node(index) for index in range(number_of_tasks)),
+    ]
+
+
+def run_iteration(
+    checkpoint: Checkpoint,
+    concurrency: int = engine.DEFAULT_CONCURRENCY,
+    number_of_tasks: int = 2,
+    family: Optional[TaskFamily] = None,
+    iteration: int = 0,
+) -> List[dict]:
+    """Runs the steps of an iteration as soon as they are ready, and returns the trajectories of the tasks.
+
+    The backend requests of all the tasks share the global budget of config.max_concurrent_requests.
+    """
+    family = _task_family(family)
+    results = scheduler.run_graph(
+        iteration_graph(checkpoint, concurrency, number_of_tasks, family, iteration), workers=number_of_tasks + 1
+    )
+    trajectories = [results[f"{family.task_name}-{index}"] for index in range(number_of_tasks)]
+    return [trajectory for trajectory in trajectories if trajectory is not None]
+
+
+def coding_improvement_iteration(
+    concurrency: int = engine.DEFAULT_CONCURRENCY, checkpoint_directory: Optional[str] = None
+):
+    """Runs one iteration. With a checkpoint directory, a rerun resumes after the last completed stage."""
     # TODO: Just generate one complete iteration from one challenge, and output this as a Dot language diagram
     #       for graphing it with GraphViz to demonstrate one iteration for the documentation.
 
     # We generate challenges, evaluation functions and solutions. Multiple response candidates.
     # Then we rank challenges, evaluation functions and solutions. Multiple ranking candidates.
     # Then we rank rankings of challeges, evaluation functions and solutions. Single rankings of rankings only.
-    
+
     # We will typically choose the best challenge, evaluation function and solution in this order.
     # In order to do that, we need to produce multiple rankings for each, and then select the best ranking for each.
     # Only after selecting the best ranking, we can use that to select the best challenge, the best evaluation function and the best solution.
 
-    # TODO: If you put 1 here, the bot will not generate a list. Handle this case as well with permissive JSON list parsing.
-    number_of_best_challenges = 2
-    number_of_challenge_rankings = 3
-    
-    challenges_prompt = coding.generate_challenges()
-    challenges = json.loads(chat([challenges_prompt]))
-    logging.info(f"Challenges: {challenges}")
-    challenge_ids = list(map(lambda challenge: challenge["id"], challenges))
-
-    evaluate_challenges_prompt = coding.evaluate_challenges(
-        challenges, challenge_ids, number_of_best_challenges
-    )
-    best_n_challenge_ids_candidates = [json.loads(chat([evaluate_challenges_prompt])) for _ in range (number_of_challenge_rankings)]
-    logging.info(f"Best n challenge ids candidates: {best_n_challenge_ids_candidates}")
-
-    
-    evaluate_challenge_rankings = coding.evaluate_challenge_rankings(
-        challenges,
-        [
-            {"id": id, "best_n_challenge_ids_candidate": best_n_challenge_ids_candidate}
-            for id, best_n_challenge_ids_candidate in enumerate(best_n_challenge_ids_candidates)
-        ],
-        range(number_of_challenge_rankings))
-    best_challenge_ranking = json.loads(chat([evaluate_challenge_rankings]))
-    # We now have the best evaluation function ranking: Let's use it!
-    logging.info(f"Best challenge ranking: {best_challenge_ranking}")
-    best_challenge_ranking_id = best_challenge_ranking["best_challenge_ranking_id"]
-
-    logging.info(f"Best best_challenge_ranking_id: {best_challenge_ranking_id}")
-    best_n_challenge_ids = best_n_challenge_ids_candidates[best_challenge_ranking_id]
-    logging.info(f"Best n challenges: {best_n_challenge_ids}")
-    
-    
-
-    best_n_challenges = [
-        next(
-            (
-                challenge
-                for challenge in challenges
-                if challenge["id"] == selected_challenge["id"]
-            ),
-            None,
-        )
-        for selected_challenge in best_n_challenge_ids
-    ]
-    logging.info(f"Best n challenges: {best_n_challenges}")
-
-    # We now have the best n challenges: Let's use those!
-
-    for challenge in best_n_challenges:
-        # For each challenge we want to create a set of evaluation functions, and choose the best one.
-        number_of_solutions = 5
-        number_of_evaluation_functions = 5
-        number_of_solution_rankings = 2
-        number_of_evaluation_rankings = 2
-        
-        evaluation_function_prompt = coding.generate_evaluation_function(challenge)
-        evaluation_functions = [
-            chat([evaluation_function_prompt])
-            for _ in range(number_of_evaluation_functions)
-        ]
-        logging.info(f"Evaluation_functions: {evaluation_functions}")
-
-        evaluate_evaluation_functions_prompt = coding.evaluate_evaluation_functions(
-            challenge["description"],
-            [
-                {"id": id, "evaluation_function": evaluation_function}
-                for id, evaluation_function in enumerate(evaluation_functions)
-            ],
-            range(len(evaluation_functions)),
-        ) 
-        evaluation_function_rankings = [json.loads(
-            chat([evaluate_evaluation_functions_prompt])
-        ) for _ in range(number_of_evaluation_rankings)]
-        
-        evaluate_evaluation_function_rankings = coding.evaluate_evaluation_function_ranking(
-            challenge, evaluation_functions,
-            [
-                {"id": id, "evaluation_function_ranking": evaluation_function_ranking}
-                for id, evaluation_function_ranking in enumerate(evaluation_function_rankings)
-            ],
-            range(number_of_evaluation_rankings))
-        best_evaluation_function_ranking = json.loads(chat([evaluate_evaluation_function_rankings]))
-        # We now have the best evaluation function ranking: Let's use it!
-        logging.info(f"Best evaluation function ranking: {best_evaluation_function_ranking}")
-        best_evaluation_function_id = best_evaluation_function_ranking["best_ranking_id"]
-
-        logging.info(f"Best evaluation function id: {best_evaluation_function_id}")
-        best_evaluation_function = evaluation_functions[best_evaluation_function_id]
-        logging.info(f"Best evaluation function: {best_evaluation_function}")
-        
-        # We now have the best evaluation function for this challenge: Let's use it!
-
-        # Then we generate solutions, using the best evaluation function.
-        solution_prompt = coding.generate_solutions(challenge, best_evaluation_function)
-        solutions = [chat([solution_prompt]) for _ in range(number_of_solutions)]
-        logging.info(f"Solutions: {solutions}")
-
-        # TODO: Run the evaluation functions and add their outputs to the solutions.
-        solutions_with_evaluation_function_outputs = solutions
-
-        evaluate_solutions_prompt = coding.evaluate_solutions(
-            challenge, best_evaluation_function, solutions_with_evaluation_function_outputs, range(number_of_solutions)
-        )
-        solution_evaluations = [json.loads(chat([evaluate_solutions_prompt])) for _ in range(number_of_solution_rankings)]
-
-        # Then we rank solution rankings.
-        ranking_evaluations_prompt = coding.evaluate_solution_ranking(
-            challenge, best_evaluation_function, solutions_with_evaluation_function_outputs,
-            [
-                {"id": id, "solution_evaluation": solution_evaluation}
-                for id, solution_evaluation in enumerate(solution_evaluations)
-            ],
-            range(number_of_solution_rankings))
-        # TODO: The bot actually tends to rank the solutions, not the rankings here. Tune the prompt.
-        ranking_of_solution_evaluations = json.loads(chat([ranking_evaluations_prompt]))
-        
-        logging.info(f"Ranking_of_solution_evaluations: {ranking_of_solution_evaluations}")
-
-        best_solution_ranking_id = ranking_of_solution_evaluations["ranking_id"]
-        logging.info(f"Best_solution_ranking_id: {best_solution_ranking_id}")
-        best_solution_ranking = solution_evaluations[best_solution_ranking_id]
-        logging.info(f"Best_solution_ranking: {best_solution_ranking}")
-        # We now have the best solution ranking: Let's use that!
-
-        best_solution_id = best_solution_ranking["sample_solution_id"]
-        logging.info(f"Best_solution_id: {best_solution_id}")
-        best_solution = solutions[best_solution_id]
-        logging.info(f"Best_solution: {best_solution}")
-        
-        # TODO: Actually run all the evaluation functions for the best solution here.
-        evaluation_function_outputs_for_the_best_solution = solution_evaluations
-        ranking_evaluation_functions_prompt = coding.evaluate_evaluation_function_ranking(
-            challenge, best_solution, evaluation_function_outputs_for_the_best_solution, solution_evaluations)
-        ranking_of_evaluation_functions = chat([ranking_evaluation_functions_prompt])
-        logging.info(f"Eanking_of_evaluation_functions: {ranking_of_evaluation_functions}")
-        
+    # We now have the best n challenges: Let's use those! They are processed concurrently.
+    trajectories = run_iteration(Checkpoint(checkpoint_directory), concurrency, family=get_task_family("coding"))
 
     # TODO: This is just one prototype iteration. Ultimately, after tuning prompts and all, we aim to collect
     #       the good trajectories and fine-tune the model with those. This will make the model better at the tasks and
     #       also in evaluation of the tasks over each iteration.
+    return trajectories
 
 
 if __name__ == "__main__":
+    logging.basicConfig(level=logging.DEBUG)
     coding_improvement_iteration()
@@ -0,0 +1,30 @@
+"""Routing of the calls of each pipeline role to its own model, or to a panel of models."""
+
+from typing import List, Optional
+
+# The roles the calls of the pipeline play.
+CHALLENGE_GENERATION = "challenge_generation"
+EVALUATION_FUNCTION_GENERATION = "evaluation_function_generation"
+SOLUTION_GENERATION = "solution_generation"
+RANKING = "ranking"
+META_RANKING = "meta_ranking"
+ROLES = (CHALLENGE_GENERATION, EVALUATION_FUNCTION_GENERATION, SOLUTION_GENERATION, RANKING, META_RANKING)
+
+
+def panel(config, role: Optional[str]) -> List[str]:
+    """The models of the role by config.models, a single model or a list of them, or else config.model."""
+    models = config.models or {}
+    unknown = set(models) - set(ROLES)
+    if unknown:
+        raise ValueError(f"Unknown roles {sorted(unknown)} in the models, expected some of {ROLES}.")
+    role_models = models.get(role, config.model) if role is not None else config.model
+    role_models = [role_models] if isinstance(role_models, str) else list(role_models)
+    if not role_models:
+        raise ValueError(f"No models for the role {role}.")
+    return role_models
+
+
+def model_for(config, role: Optional[str], sample_index: int) -> str:
+    """The model of the sample: the samples of a prompt take turns between the models of the panel."""
+    models = panel(config, role)
+    return models[sample_index % len(models)]
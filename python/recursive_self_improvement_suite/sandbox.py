@@ -0,0 +1,236 @@
+"""Sandboxed execution of generated programs, like evaluation functions against candidate solutions."""
+
+import hashlib
+import os
+import re
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import asdict, dataclass
+from typing import List, Optional
+
+# Captured output beyond this is cut, so that a chatty solution doesn't blow up the ranking prompts.
+MAX_OUTPUT_CHARACTERS = 4000
+# Output beyond this is read and dropped as it is produced, so that it never piles up in memory. Enough bytes for
+# MAX_OUTPUT_CHARACTERS of any UTF-8 text.
+MAX_OUTPUT_BYTES = 4 * MAX_OUTPUT_CHARACTERS
+READ_BYTES = 64 * 1024
+# The evaluation runs of all the challenges in flight at once, one per available core.
+MAX_CONCURRENT_EVALUATIONS = os.cpu_count() or 1
+
+CODE_BLOCK_PATTERN = re.compile(r"```[ \t]*(?:python|py|python3)?[ \t]*\n(.*?)```", re.DOTALL | re.IGNORECASE)
+
+
+@dataclass
+class Limits:
+    wall_time_seconds: float = 30
+    cpu_time_seconds: int = 20
+    memory_bytes: int = 1024 * 1024 * 1024
+
+
+@dataclass
+class ExecutionResult:
+    returncode: Optional[int]
+    stdout: str
+    stderr: str
+    duration_seconds: float
+    timed_out: bool
+
+    def to_dict(self):
+        return asdict(self)
+
+
+def extract_code(markdown: str) -> str:
+    """Returns the code in the Markdown code blocks of a response, or the whole response if it has none."""
+    blocks = CODE_BLOCK_PATTERN.findall(markdown)
+    if not blocks:
+        return markdown
+    return "\n\n".join(block.strip("\n") for block in blocks)
+
+
+def _truncate(output: str, dropped_bytes: int = 0) -> str:
+    if dropped_bytes:
+        kept = output[:MAX_OUTPUT_CHARACTERS]
+        return kept + f"\n... [{len(output) - len(kept)} characters and {dropped_bytes} more bytes truncated]"
+    if len(output) <= MAX_OUTPUT_CHARACTERS:
+        return output
+    return output[:MAX_OUTPUT_CHARACTERS] + f"\n... [{len(output) - MAX_OUTPUT_CHARACTERS} characters truncated]"
+
+
+class _BoundedReader(threading.Thread):
+    """Reads a stream of a program to its end, keeping only its first MAX_OUTPUT_BYTES."""
+
+    def __init__(self, stream):
+        super().__init__(daemon=True)
+        self.stream = stream
+        self.kept = bytearray()
+        self.dropped_bytes = 0
+
+    def run(self):
+        with self.stream:
+            for chunk in iter(lambda: self.stream.read(READ_BYTES), b""):
+                room = MAX_OUTPUT_BYTES - len(self.kept)
+                self.kept += chunk[:room]
+                self.dropped_bytes += max(0, len(chunk) - room)
+
+    def output(self) -> str:
+        self.join()
+        return _truncate(self.kept.decode("utf-8", errors="replace"), self.dropped_bytes)
+
+
+# Limits the resources of the interpreter it runs in, and then runs the program as the main module. The limits are
+# set by the child itself, because a preexec_fn isn't safe to run in the threads which launch the programs.
+BOOTSTRAP = """\
+import runpy
+import sys
+
+try:
+    import resource
+except ImportError:
+    # Not available on Windows, where the runs are only limited by the wall time.
+    resource = None
+cpu_time_seconds, memory_bytes, path = int(sys.argv[1]), int(sys.argv[2]), sys.argv[3]
+if resource is not None:
+    resource.setrlimit(resource.RLIMIT_CPU, (cpu_time_seconds, cpu_time_seconds))
+    resource.setrlimit(resource.RLIMIT_AS, (memory_bytes, memory_bytes))
+    resource.setrlimit(resource.RLIMIT_CORE, (0, 0))
+sys.argv = [path]
+del cpu_time_seconds, memory_bytes, path, resource
+runpy.run_path(sys.argv[0], run_name="__main__")
+"""
+
+
+def run_python(code: str, limits: Limits = Limits()) -> ExecutionResult:
+    """Runs the code in an isolated interpreter in a scratch directory with CPU, memory and wall time limits."""
+    with tempfile.TemporaryDirectory(prefix="sandbox-") as directory:
+        path = os.path.join(directory, "program.py")
+        with open(path, "w", encoding="utf-8") as program_file:
+            program_file.write(code)
+        start = time.monotonic()
+        process = subprocess.Popen(
+            [sys.executable, "-I", "-c", BOOTSTRAP, str(limits.cpu_time_seconds), str(limits.memory_bytes), path],
+            cwd=directory,
+            stdin=subprocess.DEVNULL,
+            stdout=subprocess.PIPE,
+            stderr=subprocess.PIPE,
+            env={"PATH": os.environ.get("PATH", ""), "PYTHONHASHSEED": "0"},
+            start_new_session=True,
+        )
+        stdout, stderr = _BoundedReader(process.stdout), _BoundedReader(process.stderr)
+        stdout.start()
+        stderr.start()
+        try:
+            # The readers finish as soon as the program exits, while waiting on the process itself polls.
+            deadline = start + limits.wall_time_seconds
+            for reader in (stdout, stderr):
+                reader.join(max(0, deadline - time.monotonic()))
+            process.wait(timeout=max(0, deadline - time.monotonic()))
+            timed_out = False
+        except subprocess.TimeoutExpired:
+            if os.name == "posix":
+                # Also takes down anything the program has spawned.
+                os.killpg(process.pid, 9)
+            else:  # pragma: no cover
+                process.kill()
+            process.wait()
+            timed_out = True
+        duration = time.monotonic() - start
+        stdout, stderr = stdout.output(), stderr.output()
+    return ExecutionResult(
+        returncode=None if timed_out else process.returncode,
+        stdout=stdout,
+        stderr=stderr,
+        duration_seconds=duration,
+        timed_out=timed_out,
+    )
+
+
+def evaluation_program(evaluation_function: str, solution: str) -> str:
+    """Combines a solution with an evaluation function so that the evaluation function can call the solution."""
+    return f"{extract_code(solution)}\n\n\n{extract_code(evaluation_function)}\n"
+
+
+_evaluation_executor = None
+_evaluation_executor_lock = threading.Lock()
+
+
+def _shared_evaluation_executor() -> ThreadPoolExecutor:
+    global _evaluation_executor
+    with _evaluation_executor_lock:
+        if _evaluation_executor is None:
+            _evaluation_executor = ThreadPoolExecutor(max_workers=MAX_CONCURRENT_EVALUATIONS)
+        return _evaluation_executor
+
+
+def run_evaluations(
+    evaluation_functions: List[str],
+    solutions: List[str],
+    limits: Limits = Limits(),
+) -> List[List[ExecutionResult]]:
+    """Runs every evaluation function against every solution, and returns the results indexed [evaluation][solution].
+
+    Each run is a separate process. The runs are launched by a pool of threads shared by all the callers, which each
+    wait on their own child process, so that the challenges processed concurrently together run at most
+    MAX_CONCURRENT_EVALUATIONS programs at a time.
+    """
+    if not solutions:
+        return [[] for _ in evaluation_functions]
+    pairs = [(evaluation_function, solution) for evaluation_function in evaluation_functions for solution in solutions]
+    results = list(
+        _shared_evaluation_executor().map(lambda pair: run_python(evaluation_program(*pair), limits), pairs)
+    )
+    return [results[index:index + len(solutions)] for index in range(0, len(results), len(solutions))]
+
+
+class SandboxPool:
+    """Runs programs in isolated interpreters from a pool of threads kept for reuse, memoizing the results.
+
+    Each run is still a separate process with the limits. The results are memoized by the hash of the code, for the
+    `max_memoized` most recently run programs, so that a program run before isn't run again. Shared between threads.
+    """
+
+    def __init__(self, limits: Limits = Limits(), workers: Optional[int] = None, max_memoized: int = 4096):
+        self.limits = limits
+        self.max_memoized = max_memoized
+        self.executor = ThreadPoolExecutor(max_workers=workers or os.cpu_count() or 1)
+        self.memoized = OrderedDict()
+        self.lock = threading.Lock()
+
+    @staticmethod
+    def key(code: str) -> str:
+        return hashlib.sha256(code.encode("utf-8")).hexdigest()
+
+    def _memoized(self, key: str) -> Optional[ExecutionResult]:
+        with self.lock:
+            result = self.memoized.get(key)
+            if result is not None:
+                self.memoized.move_to_end(key)
+            return result
+
+    def _memoize(self, key: str, result: ExecutionResult):
+        with self.lock:
+            self.memoized[key] = result
+            self.memoized.move_to_end(key)
+            while len(self.memoized) > self.max_memoized:
+                self.memoized.popitem(last=False)
+
+    def run_all(self, programs: List[str]) -> List[ExecutionResult]:
+        """Runs the programs concurrently, each distinct program not run before once, in the order of the programs."""
+        keys = [self.key(code) for code in programs]
+        results = {key: self._memoized(key) for key in keys}
+        missing = {key: code for key, code in zip(keys, programs) if results[key] is None}
+        runs = self.executor.map(lambda code: run_python(code, self.limits), missing.values())
+        for key, result in zip(missing, runs):
+            self._memoize(key, result)
+            results[key] = result
+        return [results[key] for key in keys]
+
+    def run(self, code: str) -> ExecutionResult:
+        return self.run_all([code])[0]
+
+    def close(self):
+        self.executor.shutdown()
@@ -0,0 +1,69 @@
+"""Running a graph of dependent steps, each as soon as the steps it depends on have completed."""
+
+import contextvars
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from dataclasses import dataclass
+from typing import Any, Callable, Dict, List, Sequence
+
+
+@dataclass
+class Node:
+    name: str
+    # Called with the results of the dependencies by name.
+    compute: Callable[[Dict[str, Any]], Any]
+    dependencies: Sequence[str] = ()
+
+
+def _check(nodes: List[Node]):
+    names = {node.name for node in nodes}
+    if len(names) != len(nodes):
+        raise ValueError("The node names are not unique.")
+    for node in nodes:
+        unknown = set(node.dependencies) - names
+        if unknown:
+            raise ValueError(f"Node {node.name} depends on unknown nodes {sorted(unknown)}.")
+    # Kahn's algorithm: if some nodes are never freed of their dependencies, they are in a cycle.
+    remaining = {node.name: set(node.dependencies) for node in nodes}
+    while remaining:
+        ready = [name for name, dependencies in remaining.items() if not dependencies]
+        if not ready:
+            raise ValueError(f"The nodes {sorted(remaining)} have cyclic dependencies.")
+        for name in ready:
+            del remaining[name]
+        for dependencies in remaining.values():
+            dependencies.difference_update(ready)
+
+
+def run_graph(nodes: List[Node], workers: int) -> Dict[str, Any]:
+    """Runs every node once its dependencies have completed, at most `workers` at a time, and returns the results.
+
+    The nodes see the context variables of the caller. If a node fails, no more nodes are started, and the first
+    error is raised once the nodes already running have finished.
+    """
+    if workers < 1:
+        raise ValueError(f"Workers must be at least 1, got {workers}.")
+    _check(nodes)
+    results = {}
+    waiting = list(nodes)
+    running = {}
+    error = None
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        while waiting or running:
+            if error is None:
+                for node in [node for node in waiting if all(name in results for name in node.dependencies)]:
+                    waiting.remove(node)
+                    dependency_results = {name: results[name] for name in node.dependencies}
+                    future = executor.submit(contextvars.copy_context().run, node.compute, dependency_results)
+                    running[future] = node
+            elif not running:
+                break
+            done, _ = wait(running, return_when=FIRST_COMPLETED)
+            for future in done:
+                node = running.pop(future)
+                try:
+                    results[node.name] = future.result()
+                except Exception as e:
+                    error = error or e
+    if error is not None:
+        raise error
+    return results
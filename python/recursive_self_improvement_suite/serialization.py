@@ -0,0 +1,87 @@
+"""Compact, deterministic serialization of prompt payloads, and prompt size measurement."""
+
+import json
+from typing import Any
+
+from .rate_limit import CHARACTERS_PER_TOKEN
+
+# Strings longer than this, or with line breaks, are given as blocks instead of inline.
+INLINE_STRING_LENGTH = 80
+FLOAT_DIGITS = 3
+
+try:
+    import tiktoken
+except ImportError:
+    # Optional: without it, token counts are estimated from the length of the text.
+    tiktoken = None
+
+
+def compact_json(value: Any) -> str:
+    """JSON without whitespace, with the keys sorted so that the same value always serializes the same way."""
+    return json.dumps(value, separators=(",", ":"), ensure_ascii=False, sort_keys=True)
+
+
+def _scalar(value: Any) -> str:
+    if isinstance(value, str):
+        return value
+    if isinstance(value, float):
+        return str(round(value, FLOAT_DIGITS))
+    return compact_json(value)
+
+
+def render(value: Any, tag: str) -> str:
+    """Renders a value as tagged plain text.
+
+    Code and other long strings stay as they are instead of being escaped into one line, objects become nested tags
+    with their id as an attribute, short fields become "key: value" lines, and empty fields are left out. An object
+    whose only field is named like its tag, like {"id": 0, "evaluation_function": code}, is given as the field alone.
+    """
+    if isinstance(value, dict):
+        attribute = f' id="{value["id"]}"' if "id" in value else ""
+        fields = {
+            key: field_value
+            for key, field_value in value.items()
+            if key != "id" and field_value not in ("", None, [], {})
+        }
+        if list(fields) == [tag.replace("-", "_")] and isinstance(fields[tag.replace("-", "_")], str):
+            return f"<{tag}{attribute}>\n{fields[tag.replace('-', '_')].strip()}\n</{tag}>"
+        return "\n".join(
+            [f"<{tag}{attribute}>"] + [render(field_value, key) for key, field_value in fields.items()] + [f"</{tag}>"]
+        )
+    if isinstance(value, (list, tuple, range)):
+        if all(not isinstance(item, (dict, list, tuple)) for item in value):
+            return f"{tag}: {compact_json(list(value))}"
+        return "\n".join([f"<{tag}>"] + [render(item, "item") for item in value] + [f"</{tag}>"])
+    text = _scalar(value)
+    if "\n" in text or len(text) > INLINE_STRING_LENGTH:
+        return f"<{tag}>\n{text.strip()}\n</{tag}>"
+    return f"{tag}: {text}"
+
+
+def render_items(items, tag: str) -> str:
+    """Renders the items of a list one after another, each in its own tag. Strings are given as they are."""
+    if isinstance(items, str):
+        return items
+    return "\n".join(render(item, tag) for item in items)
+
+
+def render_text(value: Any) -> str:
+    """Renders a single payload like a challenge, which may be a plain string or an object."""
+    if isinstance(value, str):
+        return value
+    if isinstance(value, dict) and set(value) <= {"id", "domain", "description"}:
+        # The usual challenge object: the description is the content, the rest is context.
+        header = ", ".join(f"{key}: {value[key]}" for key in ("id", "domain") if key in value)
+        return f"{header}\n{value.get('description', '')}".strip()
+    return render_items(value, "item") if isinstance(value, list) else render(value, "item")
+
+
+def count_tokens(text: str, model: str = "gpt-3.5-turbo") -> int:
+    """Counts the tokens of the text with tiktoken if it's installed, or estimates them from the length."""
+    if tiktoken is None:
+        return len(text) // CHARACTERS_PER_TOKEN
+    try:
+        encoding = tiktoken.encoding_for_model(model)
+    except KeyError:
+        encoding = tiktoken.get_encoding("cl100k_base")
+    return len(encoding.encode(text))
@@ -0,0 +1,101 @@
+"""Families of tasks as plugins, run by the shared pipeline."""
+
+import threading
+from typing import Callable, Dict, Iterator, Tuple
+
+from .checkpoint import Checkpoint
+
+
+class TaskFamily:
+    """The hooks of a family of tasks, like coding challenges.
+
+    The shared pipeline calls `select_tasks` once per iteration, and then `process_task` for each of the best tasks
+    concurrently, with the checkpoints, the request budget and the trajectory output shared by all families. The
+    hooks generate, rank and meta-rank their candidates with the chat functions and the ranking steps of the suite,
+    which do the caching, the retries, the rate limiting and the routing to models.
+    """
+
+    # The name of the family in config.task_family.
+    name = None
+    # What a task is called in the checkpoint scopes, like "challenge-0", and in the keys of the trajectories.
+    task_name = "task"
+
+    @property
+    def best_tasks_key(self) -> str:
+        return f"best_{self.task_name}s"
+
+    def select_tasks(self, checkpoint: Checkpoint, concurrency: int, number_of_tasks: int, iteration: int = 0) -> dict:
+        """Generates the tasks of an iteration and ranks them, returning the best tasks under `best_tasks_key`.
+
+        The samples generating the tasks start from the `iteration_sample_index` of the suite, so that every iteration
+        gets new tasks instead of the cached ones, or the resamples, of the earlier iterations.
+        """
+        raise NotImplementedError
+
+    def process_task(self, task: dict, checkpoint: Checkpoint, concurrency: int) -> dict:
+        """Generates and ranks the responses to a task, and returns the trajectory."""
+        raise NotImplementedError
+
+    def preference_pairs(self, trajectory: dict) -> Iterator[Tuple[str, str, str, str]]:
+        """The (kind, prompt, chosen, rejected) responses to a prompt, which the rankings of a trajectory order."""
+        return iter(())
+
+    def close(self):
+        """Releases the resources of the family, like worker pools. The family may still be used afterwards."""
+
+
+def _coding() -> TaskFamily:
+    # Imported here, because the family imports the pipeline which imports this module.
+    from .coding import CodingTaskFamily
+
+    return CodingTaskFamily()
+
+
+def _output_prediction() -> TaskFamily:
+    from .output_prediction import OutputPredictionTaskFamily
+
+    return OutputPredictionTaskFamily()
+
+
+def _trivia() -> TaskFamily:
+    from .trivia import TriviaTaskFamily
+
+    return TriviaTaskFamily()
+
+
+# Task family factories by name.
+TASK_FAMILIES: Dict[str, Callable[[], TaskFamily]] = {
+    "coding": _coding,
+    "output_prediction": _output_prediction,
+    "trivia": _trivia,
+}
+
+
+# The task families made by the factories, by name, shared by everyone who gets them by name.
+_instances: Dict[str, TaskFamily] = {}
+_instances_lock = threading.Lock()
+
+
+def register_task_family(name: str, factory: Callable[[], TaskFamily]):
+    """Makes a task family available by name in the configuration."""
+    with _instances_lock:
+        TASK_FAMILIES[name] = factory
+        _instances.pop(name, None)
+
+
+def get_task_family(name: str) -> TaskFamily:
+    """The task family of the name, made once, so that its resources are shared instead of made per call."""
+    with _instances_lock:
+        if name not in TASK_FAMILIES:
+            raise ValueError(f"Unknown task family {name}, expected one of {sorted(TASK_FAMILIES)}.")
+        if name not in _instances:
+            _instances[name] = TASK_FAMILIES[name]()
+        return _instances[name]
+
+
+def close_task_families():
+    """Releases the resources of the task families made so far."""
+    with _instances_lock:
+        families = list(_instances.values())
+    for family in families:
+        family.close()
@@ -0,0 +1,132 @@
+"""Scalable ranking of large candidate pools by Swiss tournaments of pairwise comparisons."""
+
+import math
+from collections import defaultdict
+from typing import Callable, Dict, Hashable, List, Optional, Sequence, Tuple
+
+from . import engine
+
+# Ranking all the candidates in a single prompt by several judges, or in a tournament of pairwise comparisons.
+JUDGES = "judges"
+TOURNAMENT = "tournament"
+RANKING_MODES = (JUDGES, TOURNAMENT)
+
+
+def default_rounds(number_of_candidates: int) -> int:
+    """Enough rounds of a Swiss tournament to separate the best candidates from the rest."""
+    return max(1, math.ceil(math.log2(max(number_of_candidates, 2))) + 1)
+
+
+def swiss_pairings(
+    candidate_ids: Sequence[Hashable], comparisons: List[dict]
+) -> List[Tuple[Hashable, Hashable]]:
+    """Pairs the candidates with similar scores so far, avoiding rematches where possible.
+
+    With an odd number of candidates, the lowest scoring one of those who have sat out the fewest rounds sits
+    this round out.
+    """
+    scores = defaultdict(float)
+    games = defaultdict(int)
+    played = set()
+    for comparison in comparisons:
+        played.add(frozenset((comparison["first"], comparison["second"])))
+        games[comparison["first"]] += 1
+        games[comparison["second"]] += 1
+        if comparison["winner"] is None:
+            scores[comparison["first"]] += 0.5
+            scores[comparison["second"]] += 0.5
+        else:
+            scores[comparison["winner"]] += 1
+    order = {candidate_id: index for index, candidate_id in enumerate(candidate_ids)}
+    unpaired = sorted(candidate_ids, key=lambda candidate_id: (-scores[candidate_id], order[candidate_id]))
+    if len(unpaired) % 2 == 1:
+        unpaired.remove(max(reversed(unpaired), key=lambda candidate_id: games[candidate_id]))
+    pairings = []
+    while len(unpaired) > 1:
+        first = unpaired.pop(0)
+        opponent = next(
+            (candidate_id for candidate_id in unpaired if frozenset((first, candidate_id)) not in played),
+            unpaired[0],
+        )
+        unpaired.remove(opponent)
+        pairings.append((first, opponent))
+    return pairings
+
+
+def bradley_terry(
+    candidate_ids: Sequence[Hashable], comparisons: List[dict], iterations: int = 200, tolerance: float = 1e-9
+) -> Dict[Hashable, float]:
+    """Estimates the strengths of the candidates from the comparisons with the Bradley-Terry model.
+
+    Uses the minorization-maximization updates, with every candidate also drawing against a virtual opponent of
+    strength 1, so that candidates without wins or without losses still get finite strengths. A tie counts as half
+    a win for both. The strengths are normalized to a geometric mean of 1.
+    """
+    wins = defaultdict(float)
+    games = defaultdict(float)
+    for comparison in comparisons:
+        first, second = comparison["first"], comparison["second"]
+        games[(first, second)] += 1
+        games[(second, first)] += 1
+        if comparison["winner"] is None:
+            wins[first] += 0.5
+            wins[second] += 0.5
+        else:
+            wins[comparison["winner"]] += 1
+    opponents = defaultdict(list)
+    for first, second in games:
+        opponents[first].append(second)
+    strengths = {candidate_id: 1.0 for candidate_id in candidate_ids}
+    for _ in range(iterations):
+        updated = {}
+        for candidate_id in candidate_ids:
+            denominator = 1 / (strengths[candidate_id] + 1) + sum(
+                games[(candidate_id, opponent)] / (strengths[candidate_id] + strengths[opponent])
+                for opponent in opponents[candidate_id]
+            )
+            updated[candidate_id] = (wins[candidate_id] + 0.5) / denominator
+        scale = math.exp(sum(math.log(strength) for strength in updated.values()) / len(updated))
+        updated = {candidate_id: strength / scale for candidate_id, strength in updated.items()}
+        converged = max(abs(updated[candidate_id] - strengths[candidate_id]) for candidate_id in candidate_ids)
+        strengths = updated
+        if converged < tolerance:
+            break
+    return strengths
+
+
+def run_tournament(
+    candidate_ids: Sequence[Hashable],
+    compare: Callable[[Hashable, Hashable], dict],
+    rounds: Optional[int] = None,
+    concurrency: int = engine.DEFAULT_CONCURRENCY,
+) -> dict:
+    """Ranks the candidates by a Swiss tournament, running the comparisons of each round concurrently.
+
+    `compare(first, second)` returns a dict with the id of the better candidate as "winner", or None for a tie,
+    and any other fields to keep, like a rationale. The presentation order alternates between the pairs, so that
+    a preference for the first or the second position evens out.
+    Returns the comparisons, and the ranking from the strongest candidate down with the Bradley-Terry strengths.
+    """
+    candidate_ids = list(candidate_ids)
+    rounds = default_rounds(len(candidate_ids)) if rounds is None else rounds
+    comparisons = []
+    for round_index in range(rounds):
+        pairings = [
+            pair if (round_index + pair_index) % 2 == 0 else pair[::-1]
+            for pair_index, pair in enumerate(swiss_pairings(candidate_ids, comparisons))
+        ]
+        if not pairings:
+            break
+        results = engine.run_all(
+            [lambda first=first, second=second: compare(first, second) for first, second in pairings], concurrency
+        )
+        comparisons += [
+            {"round": round_index, "first": first, "second": second, **result}
+            for (first, second), result in zip(pairings, results)
+        ]
+    strengths = bradley_terry(candidate_ids, comparisons)
+    ranking = sorted(candidate_ids, key=lambda candidate_id: -strengths[candidate_id])
+    return {
+        "comparisons": comparisons,
+        "ranking": [{"id": candidate_id, "strength": strengths[candidate_id]} for candidate_id in ranking],
+    }
@@ -0,0 +1,272 @@
+"""Trivia questions conditioned by random pages of a local Wikipedia dump, and answers to them, ranked by judges."""
+
+import logging
+import random
+from typing import Iterator, List, Tuple
+
+from . import dpo
+from . import engine
+from . import recursive_self_improvement_suite as suite
+from . import routing
+from .checkpoint import Checkpoint
+from .config import get_context
+from .prompts import JSON_SCHEMA_DRAFT, object_schema, output_schema, section
+from .serialization import compact_json
+from .task_family import TaskFamily
+from .wikipedia import plain_text
+
+
+def _page_prefix(page: dict) -> str:
+    """The beginning shared by the prompts about a page."""
+    return f"""\
+Here is a page of Wikipedia:
+<page>
+Title: {page["title"]}
+{page["text"]}
+</page>
+"""
+
+
+def generate_question_schema() -> dict:
+    return object_schema({"question": {"type": "string"}, "answer": {"type": "string"}}, ["question", "answer"])
+
+
+def generate_question(page: dict):
+    return _page_prefix(page) + """\
+Above is a page of Wikipedia. Please write a challenging trivia question about a fact on the page, which a
+knowledgeable person could answer without seeing the page, and give its short, unambiguous answer.
+Produce the question and the answer in a valid JSON object without Markdown notation.
+""" + output_schema(generate_question_schema())
+
+
+def answer_question_schema() -> dict:
+    return object_schema({"answer": {"type": "string"}}, ["answer"])
+
+
+def answer_question(question: str):
+    return f"""\
+Here is a trivia question:
+<question>
+{question}
+</question>
+Above is a trivia question. Please answer it as precisely and briefly as you can.
+Produce the answer in a valid JSON object without Markdown notation.
+""" + output_schema(answer_question_schema())
+
+
+def rank_schema(ids: List[int]) -> dict:
+    return {
+        "$schema": JSON_SCHEMA_DRAFT,
+        "type": "array",
+        "minItems": len(ids),
+        "maxItems": len(ids),
+        "items": object_schema(
+            {"rationale": {"type": "string"}, "id": {"type": "integer", "enum": list(ids)}}, ["id", "rationale"]
+        ),
+        "description": "Your answer is an array of all the items ranked from the best to the worst. Each item in the array has both a rationale for its relative ranking and the id of the item.",
+    }
+
+
+def rank_questions(page: dict, questions: List[dict], question_ids: List[int]):
+    return (
+        _page_prefix(page)
+        + section("questions", questions, "question")
+        + """\
+Above are a page of Wikipedia and trivia questions about it, with their answers.
+Please rank the questions by how interesting, unambiguous and correctly answered by the page they are, and by how
+much knowledge they take to answer without seeing the page.
+Produce the ranking in plain JSON without Markdown notation.
+"""
+        + output_schema(rank_schema(question_ids))
+    )
+
+
+def _answers_prefix(question: dict, answers: List[dict]) -> str:
+    # The page is the ground truth the answers are judged against, and it's the part shared by the prompts.
+    return (
+        _page_prefix(question["page"])
+        + f"""\
+Here is a trivia question about the page, with its reference answer:
+<question>
+{compact_json({"question": question["question"], "answer": question["answer"]})}
+</question>
+"""
+        + section("answers", answers, "answer")
+    )
+
+
+def rank_answers(question: dict, answers: List[dict], answer_ids: List[int]):
+    return (
+        _answers_prefix(question, answers)
+        + """\
+Above are a page of Wikipedia, a trivia question about it and candidate answers to the question.
+Please rank the answers by their correctness according to the page, and then by their precision and brevity.
+Produce the ranking in plain JSON without Markdown notation.
+"""
+        + output_schema(rank_schema(answer_ids))
+    )
+
+
+def rank_rankings_schema(ranking_ids: List[int]) -> dict:
+    return object_schema(
+        {"rationale": {"type": "string"}, "ranking_id": {"type": "integer", "enum": list(ranking_ids)}},
+        ["rationale", "ranking_id"],
+    )
+
+
+def rank_rankings(prefix: str, rankings: List, ranking_ids: List[int]):
+    return (
+        prefix
+        + section("rankings", rankings, "ranking")
+        + """\
+Each ranking above is from a different judge. Your task is to select the best ranking, to judge the judges.
+Please provide a rationale and choose the best ranking id.
+Produce the rationale and the ranking id in plain JSON without Markdown notation.
+"""
+        + output_schema(rank_rankings_schema(ranking_ids))
+    )
+
+
+def _ranked_ids(ranking: List[dict]) -> List[int]:
+    return [item["id"] for item in ranking]
+
+
+def _best_ranking(rankings: List[List[dict]], best_ranking: dict) -> List[int]:
+    return _ranked_ids(rankings[best_ranking["ranking_id"]])
+
+
+class TriviaTaskFamily(TaskFamily):
+    """Questions about random Wikipedia pages, which the LLM answers without the page, judged against the page.
+
+    The pages are read from the local dump of config.wikipedia, so that no network is needed.
+    """
+
+    name = "trivia"
+    task_name = "question"
+    number_of_questions = 4
+    number_of_answers = 5
+    number_of_judges = 2
+    max_page_characters = 4000
+
+    def random_pages(self, number_of_pages: int, rng: random.Random) -> List[dict]:
+        dump = get_context().wikipedia
+        if dump is None:
+            raise ValueError("The trivia task family needs a Wikipedia dump in config.wikipedia.")
+        pages = [dump.random_page(rng) for _ in range(number_of_pages)]
+        return [
+            {"page_id": page.page_id, "title": page.title, "text": plain_text(page.text, self.max_page_characters)}
+            for page in pages
+        ]
+
+    def select_tasks(self, checkpoint: Checkpoint, concurrency: int, number_of_tasks: int, iteration: int = 0) -> dict:
+        """Samples a random page for each task, and the best of the questions generated about each page."""
+        pages = checkpoint.stage("pages", lambda: self.random_pages(number_of_tasks, random.Random()))
+        best_questions = engine.run_all(
+            [
+                lambda id=id, page=page: self._select_question(
+                    id, page, checkpoint.scope(f"page-{id}"), concurrency, iteration
+                )
+                for id, page in enumerate(pages)
+            ],
+            concurrency,
+        )
+        logging.info(f"Best questions: {[question['question'] for question in best_questions]}")
+        return {"pages": pages, "best_questions": best_questions}
+
+    def _select_question(self, id: int, page: dict, checkpoint: Checkpoint, concurrency: int, iteration: int) -> dict:
+        questions = checkpoint.stage(
+            "questions",
+            lambda: suite.chat_n_json(
+                [generate_question(page)],
+                generate_question_schema(),
+                self.number_of_questions,
+                concurrency,
+                # A page drawn again in a later iteration gets new questions.
+                first_sample_index=suite.iteration_sample_index(iteration),
+                role=routing.CHALLENGE_GENERATION,
+            ),
+        )
+        question_ids = list(range(len(questions)))
+        question_rankings, best_question_ranking = suite.rank_by_judges(
+            checkpoint,
+            ("question_rankings", "best_question_ranking"),
+            rank_questions(page, questions, question_ids),
+            rank_schema(question_ids),
+            self.number_of_judges,
+            _ranked_ids,
+            question_ids,
+            lambda judgements: rank_rankings(
+                _page_prefix(page) + section("questions", questions, "question"),
+                judgements,
+                list(range(len(judgements))),
+            ),
+            rank_rankings_schema,
+            ("ranking_id", "rationale"),
+            concurrency,
+            suite.top_choice(_ranked_ids),
+        )
+        best = _best_ranking(question_rankings, best_question_ranking)[0]
+        return {
+            "id": id,
+            "page": page,
+            "question": questions[best]["question"],
+            "answer": questions[best]["answer"],
+            "questions": questions,
+            "question_rankings": question_rankings,
+            "best_question_ranking": best_question_ranking,
+        }
+
+    def process_task(self, task: dict, checkpoint: Checkpoint, concurrency: int) -> dict:
+        """Samples answers to the question without the page, and ranks them by judges who see the page."""
+        answers = checkpoint.stage(
+            "answers",
+            lambda: suite.chat_n_json(
+                [answer_question(task["question"])],
+                answer_question_schema(),
+                self.number_of_answers,
+                concurrency,
+                role=routing.SOLUTION_GENERATION,
+            ),
+        )
+        answer_ids = list(range(len(answers)))
+        answer_rankings, best_answer_ranking = suite.rank_by_judges(
+            checkpoint,
+            ("answer_rankings", "best_answer_ranking"),
+            rank_answers(task, answers, answer_ids),
+            rank_schema(answer_ids),
+            self.number_of_judges,
+            _ranked_ids,
+            answer_ids,
+            lambda judgements: rank_rankings(
+                _answers_prefix(task, answers),
+                judgements,
+                list(range(len(judgements))),
+            ),
+            rank_rankings_schema,
+            ("ranking_id", "rationale"),
+            concurrency,
+            suite.top_choice(_ranked_ids),
+        )
+        return {
+            "question": task,
+            "answers": answers,
+            "answer_rankings": answer_rankings,
+            "best_answer_ranking": best_answer_ranking,
+            "best_answer": _best_ranking(answer_rankings, best_answer_ranking)[0],
+        }
+
+    def preference_pairs(self, trajectory: dict) -> Iterator[Tuple[str, str, str, str]]:
+        """Pairs of questions about the page, and of answers to the best question, by the best rankings."""
+        question = trajectory["question"]
+        questions = question["questions"]
+        prompt = generate_question(question["page"])
+        for better, worse in dpo.ranking_pairs(
+            _best_ranking(question["question_rankings"], question["best_question_ranking"]), range(len(questions))
+        ):
+            yield "trivia_question", prompt, compact_json(questions[better]), compact_json(questions[worse])
+        answers = trajectory["answers"]
+        prompt = answer_question(question["question"])
+        for better, worse in dpo.ranking_pairs(
+            _best_ranking(trajectory["answer_rankings"], trajectory["best_answer_ranking"]), range(len(answers))
+        ):
+            yield "trivia_answer", prompt, compact_json(answers[better]), compact_json(answers[worse])
@@ -0,0 +1,163 @@
+"""Random access to the articles of a local Wikipedia multistream dump, without loading it into memory."""
+
+import bz2
+import mmap
+import os
+import random
+import re
+import struct
+import sys
+import xml.etree.ElementTree as ElementTree
+from array import array
+from dataclasses import dataclass
+from typing import Iterator, Optional, Tuple
+
+# A record of the offset index: the offset of the bz2 stream with the page in the dump, and the id of the page.
+RECORD = struct.Struct("<QQ")
+# Compressed bytes read from the dump, and decompressed bytes produced, at a time.
+READ_BYTES = 64 * 1024
+DECOMPRESSED_BYTES = 256 * 1024
+PAGE_ID_PATTERN = re.compile(rb"<id>(\d+)</id>")
+
+
+@dataclass
+class WikipediaPage:
+    page_id: int
+    title: str
+    namespace: int
+    redirect: bool
+    text: str
+
+    @property
+    def is_article(self) -> bool:
+        return self.namespace == 0 and not self.redirect
+
+
+def build_offset_index(index_path: str, offsets_path: str):
+    """Converts the `offset:page_id:title` lines of a multistream index into fixed size binary records.
+
+    The index is streamed, so that building the records of millions of pages takes little memory.
+    """
+    temporary_path = f"{offsets_path}.tmp"
+    with bz2.open(index_path, "rt", encoding="utf-8") as index_file, open(temporary_path, "wb") as offsets_file:
+        records = array("Q")
+        for line in index_file:
+            offset, page_id, _ = line.split(":", 2)
+            records.extend((int(offset), int(page_id)))
+            if len(records) >= 2 * 65536:
+                _write_records(offsets_file, records)
+                records = array("Q")
+        _write_records(offsets_file, records)
+    os.replace(temporary_path, offsets_path)
+
+
+def _write_records(offsets_file, records: array):
+    # The array is in the native byte order, the records are little endian.
+    if sys.byteorder == "big":
+        records.byteswap()
+    offsets_file.write(records.tobytes())
+
+
+class WikipediaDump:
+    """A multistream dump, `pages-articles-multistream.xml.bz2`, with its `multistream-index.txt.bz2`.
+
+    Both the dump and a binary offset index built from the index file on first use are memory-mapped, so any number
+    of workers can share them through the page cache. A page is found in constant time by its position in the
+    index, and decompressed from its stream of about a hundred pages only as far as the page.
+    """
+
+    def __init__(self, dump: str, index: str, offsets: Optional[str] = None, max_attempts: int = 100):
+        """The offset index is kept at `offsets`, by default next to the index file."""
+        offsets = offsets or f"{index}.offsets"
+        if not os.path.exists(offsets) or os.path.getmtime(offsets) < os.path.getmtime(index):
+            build_offset_index(index, offsets)
+        self.max_attempts = max_attempts
+        with open(dump, "rb") as dump_file:
+            self.dump = mmap.mmap(dump_file.fileno(), 0, access=mmap.ACCESS_READ)
+        with open(offsets, "rb") as offsets_file:
+            self.offsets = mmap.mmap(offsets_file.fileno(), 0, access=mmap.ACCESS_READ)
+        self.number_of_pages = len(self.offsets) // RECORD.size
+
+    def __len__(self) -> int:
+        return self.number_of_pages
+
+    def record(self, position: int) -> Tuple[int, int]:
+        """The stream offset and the page id of the page at the position in the index."""
+        return RECORD.unpack_from(self.offsets, position * RECORD.size)
+
+    def _stream_pages(self, offset: int) -> Iterator[bytes]:
+        # Decompresses the stream a bounded chunk at a time, yielding each page as soon as it is complete.
+        decompressor = bz2.BZ2Decompressor()
+        position = offset
+        buffer = b""
+        while not decompressor.eof:
+            chunk = b""
+            if decompressor.needs_input:
+                chunk = self.dump[position:position + READ_BYTES]
+                if not chunk:
+                    return
+                position += len(chunk)
+            buffer += decompressor.decompress(chunk, DECOMPRESSED_BYTES)
+            while True:
+                end = buffer.find(b"</page>")
+                if end < 0:
+                    break
+                end += len(b"</page>")
+                yield buffer[buffer.find(b"<page>"):end]
+                buffer = buffer[end:]
+
+    def page(self, position: int) -> WikipediaPage:
+        """The page at the position in the index."""
+        offset, page_id = self.record(position)
+        for page_xml in self._stream_pages(offset):
+            # The first id of a page is its own, the ones after it are of the revision and the contributor.
+            match = PAGE_ID_PATTERN.search(page_xml)
+            if match is not None and int(match.group(1)) == page_id:
+                return _parse_page(page_xml)
+        raise KeyError(f"Page {page_id} is not in the stream at {offset}.")
+
+    def random_page(self, rng: random.Random) -> WikipediaPage:
+        """A uniformly random article, skipping the redirects and the pages of the other namespaces."""
+        for _ in range(self.max_attempts):
+            page = self.page(rng.randrange(self.number_of_pages))
+            if page.is_article:
+                return page
+        raise ValueError(f"No article found in {self.max_attempts} random pages.")
+
+    def close(self):
+        self.dump.close()
+        self.offsets.close()
+
+
+def _parse_page(page_xml: bytes) -> WikipediaPage:
+    page = ElementTree.fromstring(page_xml)
+    return WikipediaPage(
+        page_id=int(page.findtext("id")),
+        title=page.findtext("title"),
+        namespace=int(page.findtext("ns", "0")),
+        redirect=page.find("redirect") is not None,
+        text=page.findtext("revision/text", ""),
+    )
+
+
+WIKITEXT_PATTERNS = [
+    (re.compile(r"<!--.*?-->", re.DOTALL), ""),
+    (re.compile(r"<ref[^>/]*/>|<ref[^>]*>.*?</ref>", re.DOTALL), ""),
+    # Templates, from the innermost out.
+    (re.compile(r"\{\{[^{}]*\}\}"), ""),
+    (re.compile(r"\[\[(?:File|Image|Category):[^\[\]]*(?:\[\[[^\]]*\]\][^\[\]]*)*\]\]", re.IGNORECASE), ""),
+    (re.compile(r"\[\[[^\]|]*\|([^\]]*)\]\]"), r"\1"),
+    (re.compile(r"\[\[([^\]]*)\]\]"), r"\1"),
+    (re.compile(r"'{2,}"), ""),
+    (re.compile(r"\n{3,}"), "\n\n"),
+]
+
+
+def plain_text(wikitext: str, max_characters: int = 4000) -> str:
+    """Roughly strips the wiki markup, like references and templates, and cuts the text to a prompt friendly length."""
+    text = wikitext
+    for pattern, replacement in WIKITEXT_PATTERNS:
+        previous = None
+        while previous != text:
+            previous, text = text, pattern.sub(replacement, text)
+    return text.strip()[:max_characters]
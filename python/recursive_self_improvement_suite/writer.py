@@ -0,0 +1,78 @@
+"""Streaming JSONL output in size-rotated shards."""
+
+import glob
+import gzip
+import json
+import os
+import re
+import threading
+
+# The default shard size limit, in bytes of uncompressed JSONL.
+DEFAULT_MAX_SHARD_BYTES = 256 * 1024 * 1024
+
+
+class ShardedJsonlWriter:
+    """Appends records as JSON lines to shards named `<prefix>-00000.jsonl[.gz]` in a directory.
+
+    Every record is flushed as soon as it is written, so that a crash loses at most the record being written.
+    A new shard is started when the current one exceeds `max_shard_bytes` of uncompressed JSONL. Numbering
+    continues after the existing shards, so that a resumed run never overwrites earlier output.
+    """
+
+    def __init__(
+        self,
+        directory: str,
+        prefix: str = "trajectories",
+        max_shard_bytes: int = DEFAULT_MAX_SHARD_BYTES,
+        compress: bool = False,
+    ):
+        self.directory = directory
+        self.prefix = prefix
+        self.max_shard_bytes = max_shard_bytes
+        self.compress = compress
+        self.lock = threading.Lock()
+        os.makedirs(directory, exist_ok=True)
+        self.shard_index = self._next_shard_index()
+        self.shard = None
+        self.shard_bytes = 0
+
+    def _next_shard_index(self) -> int:
+        pattern = re.compile(re.escape(self.prefix) + r"-(\d+)\.jsonl(\.gz)?$")
+        indices = [
+            int(match.group(1))
+            for match in (pattern.search(path) for path in glob.glob(os.path.join(self.directory, "*")))
+            if match
+        ]
+        return max(indices, default=-1) + 1
+
+    def _open_shard(self):
+        extension = ".jsonl.gz" if self.compress else ".jsonl"
+        path = os.path.join(self.directory, f"{self.prefix}-{self.shard_index:05d}{extension}")
+        self.shard_index += 1
+        self.shard_bytes = 0
+        return gzip.open(path, "ab") if self.compress else open(path, "ab")
+
+    def write(self, record):
+        line = (json.dumps(record, ensure_ascii=False, separators=(",", ":")) + "\n").encode("utf-8")
+        with self.lock:
+            if self.shard is not None and self.shard_bytes + len(line) > self.max_shard_bytes:
+                self.shard.close()
+                self.shard = None
+            if self.shard is None:
+                self.shard = self._open_shard()
+            self.shard.write(line)
+            # For gzip this is a sync flush, so everything written so far can be decompressed.
+            self.shard.flush()
+            self.shard_bytes += len(line)
+
+    def close(self):
+        with self.lock:
+            if self.shard is not None:
+                self.shard.close()
+                self.shard = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
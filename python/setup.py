@@ -6,6 +6,8 @@ from setuptools import setup, find_packages
 
 requirements = [
     "Click>=7.0",
+    "httpx>=0.23",
+    "numpy>=1.17",
     "openai>=1.6",
 ]
 
@@ -0,0 +1,28 @@
+"""Fixtures shared by the tests."""
+
+import pytest
+
+from recursive_self_improvement_suite import config
+
+
+@pytest.fixture
+def configure():
+    """Sets the context of a configuration for the test, and restores the previous context afterwards.
+
+    The configuration is the offline stub backend without rate limits, with the given overrides. An explicitly given
+    backend instance is used instead of the configured one.
+    """
+    previous_context = config.get_context()
+
+    def configure(explicit_backend=None, **overrides):
+        values = {"backend": "stub", "requests_per_minute": 1e6, "tokens_per_minute": 1e9, **overrides}
+        return config.set_context(config.Context(config.Config(**values), backend=explicit_backend))
+
+    yield configure
+    config.set_context(previous_context)
+
+
+@pytest.fixture
+def stub_backend(configure):
+    """Configures the offline stub backend without rate limits."""
+    return configure()
@@ -0,0 +1,25 @@
+"""Tests for `recursive_self_improvement_suite.adaptive`."""
+
+from recursive_self_improvement_suite import adaptive
+
+
+def chosen(judgement):
+    return judgement["sample_solution_id"]
+
+
+def test_majority_needs_more_than_half_of_the_judges():
+    assert adaptive.majority([{"sample_solution_id": 1}, {"sample_solution_id": 1}], chosen) == 0
+    assert adaptive.majority([{"sample_solution_id": 1}, {"sample_solution_id": 2}], chosen) is None
+    judgements = [{"sample_solution_id": choice} for choice in [3, 1, 1, 2, 1]]
+    assert adaptive.majority(judgements, chosen) == 1
+    assert adaptive.agreement_ranking(judgements, chosen, "ranking_id", "rationale") == {
+        "ranking_id": 1,
+        "rationale": "3 of 5 judges agree, so the judges were not ranked.",
+    }
+
+
+def test_runs_cleanly():
+    clean = {"returncode": 0, "timed_out": False, "stderr": "", "stdout": "ok"}
+    assert adaptive.runs_cleanly([clean, clean])
+    assert not adaptive.runs_cleanly([clean, {**clean, "stderr": "Traceback"}])
+    assert not adaptive.runs_cleanly([])
@@ -0,0 +1,49 @@
+"""Tests for `recursive_self_improvement_suite.aggregation`."""
+
+import os
+import subprocess
+import sys
+
+import numpy as np
+import pytest
+
+from recursive_self_improvement_suite import aggregation
+
+
+def ranked_ids(ranking):
+    return [item["id"] for item in ranking]
+
+
+def test_partial_rankings_tie_the_rest():
+    scores = aggregation.score_matrix([[{"id": "b"}], [{"id": "c"}, {"id": "a"}]], ranked_ids, ["a", "b", "c", "d"])
+    assert scores.tolist() == [[1.0, 2.0], [3.0, 0.5], [1.0, 3.0], [1.0, 0.5]]
+
+
+def test_kendall_tau_between_columns():
+    scores = np.array([[3, 0, 3, 1], [2, 1, 2, 1], [1, 2, 1, 1], [0, 3, 0, 1]], dtype=float)
+    assert np.allclose(
+        aggregation.kendall_tau(scores),
+        [[1, -1, 1, 0], [-1, 1, -1, 0], [1, -1, 1, 0], [0, 0, 0, 0]],
+    )
+
+
+def test_aggregate_finds_the_consensus_and_the_most_representative_judge():
+    judgements = [
+        [{"id": "a"}, {"id": "b"}, {"id": "c"}],
+        [{"id": "a"}, {"id": "c"}, {"id": "b"}],
+        [{"id": "c"}, {"id": "b"}, {"id": "a"}],
+    ]
+    aggregated = aggregation.aggregate(judgements, ranked_ids, ["a", "b", "c"])
+    assert aggregated["consensus"] == ["a", "c", "b"]
+    assert aggregated["best_judge"] == 1
+    assert aggregated["judge_agreement"][1] == pytest.approx(1.0)
+    assert aggregated["judge_agreement"][2] < 0 < aggregated["agreement"]
+
+
+def test_importing_the_pipeline_does_not_load_numpy():
+    code = "import sys, recursive_self_improvement_suite.recursive_self_improvement_suite as suite\n"
+    code += "print('numpy' in sys.modules)"
+    # Run next to the package, so that it is found also when it isn't installed.
+    directory = os.path.dirname(os.path.dirname(aggregation.__file__))
+    result = subprocess.run([sys.executable, "-c", code], capture_output=True, text=True, check=True, cwd=directory)
+    assert result.stdout == "False\n"
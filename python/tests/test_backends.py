@@ -0,0 +1,48 @@
+"""Tests for `recursive_self_improvement_suite.backends`."""
+
+import json
+
+from recursive_self_improvement_suite import backends
+from recursive_self_improvement_suite import coding
+
+
+def complete(prompt, sample_index=0):
+    session = [{"role": "user", "content": prompt}]
+    return backends.StubBackend().complete(session, "model", 0.2, sample_index).content
+
+
+def test_stub_backend_is_deterministic_per_sample():
+    prompt = coding.evaluate_solutions("challenge", "evaluation function", "solutions", range(5))
+    assert complete(prompt, 0) == complete(prompt, 0)
+    assert {complete(prompt, index) for index in range(10)} != {complete(prompt, 0)}
+
+
+def test_stub_backend_conforms_to_prompt_schemas():
+    challenges = json.loads(complete(coding.generate_challenges(4)))
+    assert len(challenges) == 4
+    assert len({challenge["id"] for challenge in challenges}) == 4
+    challenge_ids = [challenge["id"] for challenge in challenges]
+    ranking = json.loads(complete(coding.evaluate_challenges(challenges, challenge_ids, 2)))
+    assert len(ranking) == 2
+    assert len({item["id"] for item in ranking}) == 2
+    assert {item["id"] for item in ranking} <= set(challenge_ids)
+    best = json.loads(complete(coding.evaluate_challenge_rankings(challenges, [], range(3))))
+    assert best["best_challenge_ranking_id"] in range(3)
+
+
+def test_stub_backend_produces_code_blocks():
+    assert complete(coding.generate_evaluation_function("challenge")).startswith("```python\n")
+    assert "def solution(" in complete(coding.generate_solutions("challenge", "evaluation function"))
+
+
+def test_stub_backend_samples_several_completions_in_one_request():
+    session = [{"role": "user", "content": coding.generate_evaluation_function("challenge")}]
+    stub = backends.StubBackend()
+    completions = stub.complete_n(session, "model", 0.2, [0, 3])
+    assert [completion.content for completion in completions] == [
+        stub.complete(session, "model", 0.2, 0).content,
+        stub.complete(session, "model", 0.2, 3).content,
+    ]
+    # The usage of the request is reported once.
+    assert completions[0].prompt_tokens > 0
+    assert completions[1].total_tokens == 0
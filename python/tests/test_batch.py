@@ -0,0 +1,126 @@
+"""Tests for `recursive_self_improvement_suite.batch`."""
+
+import json
+import threading
+import time
+
+import pytest
+from click.testing import CliRunner
+
+from recursive_self_improvement_suite import backends
+from recursive_self_improvement_suite import batch
+from recursive_self_improvement_suite import cli
+from recursive_self_improvement_suite import coding
+from recursive_self_improvement_suite import metrics
+from recursive_self_improvement_suite.checkpoint import current_stage
+from recursive_self_improvement_suite.errors import ChatError
+from recursive_self_improvement_suite.writer import ShardedJsonlWriter
+
+from .test_writer import read_records
+
+
+def test_run_batch_streams_every_challenge_with_bounded_workers(monkeypatch):
+    lock = threading.Lock()
+    in_flight = [0]
+    peak = [0]
+
+    def select_challenges(self, checkpoint, concurrency, number_of_best_challenges, iteration):
+        return {"best_challenges": [{"id": str(index)} for index in range(number_of_best_challenges)]}
+
+    def process_challenge(self, challenge, checkpoint, concurrency):
+        with lock:
+            in_flight[0] += 1
+            peak[0] = max(peak[0], in_flight[0])
+        time.sleep(0.01)
+        with lock:
+            in_flight[0] -= 1
+        if challenge["id"] == "2":
+            raise ChatError("Failing one challenge doesn't stop the batch.", retryable=True)
+        return {"challenge": challenge}
+
+    monkeypatch.setattr(coding.CodingTaskFamily, "select_tasks", select_challenges)
+    monkeypatch.setattr(coding.CodingTaskFamily, "process_task", process_challenge)
+    trajectories = list(batch.run_batch(iterations=3, challenges_per_iteration=4, max_in_flight=2))
+    assert sorted((t["iteration"], t["challenge"]["id"]) for t in trajectories) == [
+        (iteration, str(index)) for iteration in range(3) for index in (0, 1, 3)
+    ]
+    assert peak[0] <= 2
+
+
+class SampledChallengesBackend(backends.StubBackend):
+    """Tells the challenges of each sample apart, unlike the stub."""
+
+    def _content(self, session, sample_index):
+        content = super()._content(session, sample_index)
+        if metrics.stage_kind(current_stage.get()) != "challenges":
+            return content
+        return json.dumps(
+            [
+                {**challenge, "description": f"{challenge['description']} of sample {sample_index}"}
+                for challenge in json.loads(content)
+            ]
+        )
+
+
+def test_every_iteration_generates_new_challenges_with_a_cache(configure, tmp_path):
+    cache = {"path": str(tmp_path / "cache.sqlite")}
+    context = configure(SampledChallengesBackend(), cache=cache)
+    trajectories = list(batch.run_batch(iterations=3, challenges_per_iteration=1))
+    challenges = {
+        trajectory["iteration"]: json.dumps(trajectory["challenge_selection"]["challenges"], sort_keys=True)
+        for trajectory in trajectories
+    }
+    assert len(set(challenges.values())) == len(challenges) == 3
+    assert context.metrics.summary()["challenges"]["cached_calls"] == 0
+    # A rerun of the batch gets the same challenges of each iteration from the cache.
+    context = configure(SampledChallengesBackend(), cache=cache)
+    rerun = list(batch.run_batch(iterations=3, challenges_per_iteration=1))
+    assert {
+        trajectory["iteration"]: json.dumps(trajectory["challenge_selection"]["challenges"], sort_keys=True)
+        for trajectory in rerun
+    } == challenges
+    assert context.metrics.summary()["challenges"]["cached_calls"] == 3
+
+
+@pytest.mark.parametrize("stage", ["selection", "processing"])
+def test_unrecoverable_failures_stop_the_batch(monkeypatch, stage):
+    def select_challenges(self, checkpoint, concurrency, number_of_best_challenges, iteration):
+        if stage == "selection" and iteration == 1:
+            raise KeyError("challenges")
+        return {"best_challenges": [{"id": str(index)} for index in range(number_of_best_challenges)]}
+
+    def process_challenge(self, challenge, checkpoint, concurrency):
+        if stage == "processing":
+            raise ChatError("The API key was rejected.")
+        return {"challenge": challenge}
+
+    monkeypatch.setattr(coding.CodingTaskFamily, "select_tasks", select_challenges)
+    monkeypatch.setattr(coding.CodingTaskFamily, "process_task", process_challenge)
+    with pytest.raises(KeyError if stage == "selection" else ChatError):
+        list(batch.run_batch(iterations=3, challenges_per_iteration=2, max_in_flight=2))
+
+
+def test_run_exits_with_an_error_on_a_configuration_error(configure, tmp_path):
+    # The fixture restores the context the command replaces.
+    config_path = tmp_path / "config.json"
+    config_path.write_text(json.dumps({"backend": "nonexistent"}))
+    result = CliRunner().invoke(
+        cli.main, ["--config", str(config_path), "run", "--iterations", "2", "--output", str(tmp_path / "out")]
+    )
+    assert result.exit_code != 0
+    assert "Unknown backend nonexistent" in str(result.exception)
+
+
+def test_a_resumed_batch_writes_only_the_undelivered_trajectories(stub_backend, tmp_path):
+    checkpoints = str(tmp_path / "checkpoints")
+    output = str(tmp_path / "output")
+    trajectories = batch.run_batch(iterations=2, challenges_per_iteration=1, checkpoint_directory=checkpoints)
+    with ShardedJsonlWriter(output) as trajectory_writer:
+        trajectory_writer.write(next(trajectories))
+        # Interrupted after writing the first trajectory, and before writing the second.
+        next(trajectories)
+        trajectories.close()
+    with ShardedJsonlWriter(output) as trajectory_writer:
+        for trajectory in batch.run_batch(iterations=2, challenges_per_iteration=1, checkpoint_directory=checkpoints):
+            trajectory_writer.write(trajectory)
+    assert sorted(record["iteration"] for record in read_records(output)) == [0, 1]
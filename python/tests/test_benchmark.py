@@ -0,0 +1,27 @@
+"""Tests for `recursive_self_improvement_suite.benchmark`."""
+
+import json
+
+from recursive_self_improvement_suite import benchmark
+
+
+def test_percentile_interpolates():
+    assert benchmark.percentile([], 50) is None
+    assert benchmark.percentile([3, 1, 2], 50) == 2
+    assert benchmark.percentile([0, 10], 95) == 9.5
+
+
+def test_run_benchmark_records_stages_and_calls(tmp_path):
+    results = benchmark.run_benchmark(iterations=1, error_rate=0.1)
+    end_to_end = results["end_to_end"]
+    assert end_to_end["calls"] == sum(stage["calls"] for stage in results["stages"].values())
+    assert end_to_end["calls"] > end_to_end["failed_calls"]
+    # The five solutions of each of the two challenges are sampled in a single request.
+    assert results["stages"]["solutions"]["calls"] >= 2
+    assert end_to_end["samples"] > end_to_end["calls"] - end_to_end["failed_calls"]
+    assert results["stages"]["evaluation_function_outputs"]["calls"] == 0
+    path = tmp_path / "results.jsonl"
+    benchmark.record_results(results, str(path))
+    benchmark.record_results(results, str(path))
+    assert [json.loads(line) for line in path.read_text().splitlines()] == [results, results]
+    assert "iterations/min" in benchmark.format_results(results)
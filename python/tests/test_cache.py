@@ -0,0 +1,55 @@
+"""Tests for `recursive_self_improvement_suite.cache`."""
+
+import time
+
+import pytest
+
+from recursive_self_improvement_suite import cache
+
+
+def test_cache_key_depends_on_every_input():
+    session = [{"role": "user", "content": "Hello"}]
+    key = cache.cache_key("model", session, 0.2, 0)
+    assert key == cache.cache_key("model", [{"content": "Hello", "role": "user"}], 0.2, 0)
+    assert key != cache.cache_key("other-model", session, 0.2, 0)
+    assert key != cache.cache_key("model", session, 0.3, 0)
+    assert key != cache.cache_key("model", session, 0.2, 1)
+    assert key != cache.cache_key("model", [{"role": "user", "content": "Hello!"}], 0.2, 0)
+
+
+def test_read_through_survives_reopening(tmp_path):
+    path = str(tmp_path / "responses.sqlite")
+    response_cache = cache.ResponseCache(path)
+    response_cache.put("key", "response")
+    response_cache.close()
+    assert cache.ResponseCache(path).get("key") == "response"
+
+
+def test_write_only_never_reads(tmp_path):
+    response_cache = cache.ResponseCache(str(tmp_path / "responses.sqlite"), mode=cache.WRITE_ONLY)
+    response_cache.put("key", "response")
+    assert response_cache.get("key") is None
+    assert cache.ResponseCache(str(tmp_path / "responses.sqlite")).get("key") == "response"
+
+
+def test_evicts_least_recently_used_over_size_limit(tmp_path):
+    response_cache = cache.ResponseCache(str(tmp_path / "responses.sqlite"), max_bytes=20)
+    for key in ["a", "b", "c"]:
+        response_cache.put(key, "0123456789")
+        time.sleep(0.01)
+    response_cache.get("a")
+    response_cache.evict()
+    assert response_cache.get("a") is not None
+    assert response_cache.get("b") is None
+    assert response_cache.get("c") is not None
+
+
+def test_evicts_by_age(tmp_path):
+    response_cache = cache.ResponseCache(str(tmp_path / "responses.sqlite"), max_age_seconds=-1)
+    response_cache.put("key", "response")
+    assert response_cache.get("key") is None
+
+
+def test_rejects_unknown_mode(tmp_path):
+    with pytest.raises(ValueError):
+        cache.ResponseCache(str(tmp_path / "responses.sqlite"), mode="read-only")
@@ -0,0 +1,33 @@
+"""Tests for `recursive_self_improvement_suite.checkpoint`."""
+
+import pytest
+
+from recursive_self_improvement_suite.checkpoint import Checkpoint
+
+
+def test_completed_stages_are_not_recomputed(tmp_path):
+    calls = []
+
+    def compute():
+        calls.append(1)
+        return {"challenges": ["a", "b"]}
+
+    assert Checkpoint(str(tmp_path)).stage("challenges", compute) == {"challenges": ["a", "b"]}
+    assert Checkpoint(str(tmp_path)).stage("challenges", compute) == {"challenges": ["a", "b"]}
+    assert len(calls) == 1
+
+
+def test_failed_stage_is_recomputed_on_resume(tmp_path):
+    checkpoint = Checkpoint(str(tmp_path))
+    checkpoint.stage("first", lambda: 1)
+    with pytest.raises(ValueError):
+        checkpoint.scope("challenge-0").stage("second", lambda: int("not a number"))
+    resumed = Checkpoint(str(tmp_path))
+    assert resumed.stage("first", lambda: pytest.fail("Recomputed a completed stage")) == 1
+    assert resumed.scope("challenge-0").stage("second", lambda: 2) == 2
+
+
+def test_without_directory_nothing_is_persisted():
+    checkpoint = Checkpoint()
+    assert checkpoint.scope("challenge-0").stage("stage", lambda: 1) == 1
+    assert checkpoint.stage("stage", lambda: 2) == 2
@@ -0,0 +1,84 @@
+"""Tests for `recursive_self_improvement_suite.config`."""
+
+import json
+import os
+import subprocess
+import sys
+
+import pytest
+
+from recursive_self_improvement_suite import config
+
+
+def test_load_config_priority(tmp_path, monkeypatch):
+    path = tmp_path / "config.json"
+    path.write_text(json.dumps({"apikey": "file-key", "org": "file-org", "model": "file-model"}))
+    monkeypatch.setenv("RSIS_MODEL", "environment-model")
+    loaded = config.load_config(str(path), org="explicit-org")
+    assert (loaded.apikey, loaded.org, loaded.model) == ("file-key", "explicit-org", "environment-model")
+
+
+def test_load_config_without_file(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.delenv("RSIS_CONFIG", raising=False)
+    assert config.load_config().model == config.Config().model
+
+
+def test_load_config_rejects_unknown_keys(tmp_path):
+    path = tmp_path / "config.json"
+    path.write_text(json.dumps({"modle": "typo"}))
+    with pytest.raises(ValueError):
+        config.load_config(str(path))
+
+
+def test_context_builds_nothing_until_used():
+    context = config.Context(config.Config(apikey="key"))
+    assert context._client is None and context._rate_limiter is None
+    assert context.rate_limiter is context.rate_limiter
+    assert context.response_cache is None
+
+
+def test_import_has_no_side_effects(tmp_path):
+    code = (
+        "import logging, sys\n"
+        "import recursive_self_improvement_suite.recursive_self_improvement_suite\n"
+        "assert not logging.getLogger().handlers\n"
+        "assert 'openai' not in sys.modules\n"
+    )
+    # Run in an empty directory without apikey.json, in a fresh interpreter.
+    subprocess.run(
+        [sys.executable, "-c", code],
+        cwd=tmp_path,
+        check=True,
+        env={"PYTHONPATH": ":".join(sys.path)},
+    )
+
+
+def test_context_state_is_built_again_after_fork():
+    if not hasattr(os, "fork"):
+        pytest.skip("Forking is not supported.")
+    context = config.Context(config.Config(apikey="key"))
+    parent_client = context._client = object()
+    rate_limiter = context.rate_limiter
+    read, write = os.pipe()
+    pid = os.fork()
+    if pid == 0:
+        os.close(read)
+        rebuilt = context._client is None and context.rate_limiter is not rate_limiter
+        os.write(write, b"1" if rebuilt else b"0")
+        os._exit(0)
+    os.close(write)
+    with os.fdopen(read, "rb") as pipe:
+        assert pipe.read() == b"1"
+    os.waitpid(pid, 0)
+    assert context._client is parent_client and context.rate_limiter is rate_limiter
+
+
+def test_http_client_keeps_the_pooled_connections_alive():
+    pytest.importorskip("httpx")
+    from recursive_self_improvement_suite import clients
+
+    with clients.http_client(max_connections=4, timeout=5.0) as client:
+        pool = client._transport._pool
+        assert (pool._max_connections, pool._max_keepalive_connections) == (4, 4)
+        assert client.timeout.read == 5.0
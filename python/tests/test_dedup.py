@@ -0,0 +1,39 @@
+"""Tests for `recursive_self_improvement_suite.dedup`."""
+
+from recursive_self_improvement_suite.dedup import ChallengeIndex
+
+INVENTORY = "Write a supply chain inventory optimizer that decides reorder points for each warehouse given demand forecasts."
+REWORDED_INVENTORY = (
+    "Write a supply chain inventory optimiser, which decides the reorder points for every warehouse given demand forecasts!"
+)
+ANONYMIZER = "Implement a DICOM metadata anonymizer for medical imaging archives that removes patient identifiers."
+
+
+def test_near_duplicates_are_found_across_sessions(tmp_path):
+    path = str(tmp_path / "challenges.sqlite")
+    index = ChallengeIndex(path)
+    index.add(INVENTORY)
+    index.add(INVENTORY)
+    index.close()
+    reopened = ChallengeIndex(path)
+    assert [description for description, _ in reopened.near_duplicates(REWORDED_INVENTORY)] == [INVENTORY]
+    assert reopened.near_duplicates(ANONYMIZER) == []
+
+
+def test_filter_drops_duplicates_within_the_batch_and_keeps_the_minimum():
+    index = ChallengeIndex()
+    index.add(INVENTORY)
+    challenges = [
+        {"id": "a", "description": REWORDED_INVENTORY},
+        {"id": "b", "description": ANONYMIZER},
+        {"id": "c", "description": ANONYMIZER.upper()},
+    ]
+    unique, duplicates = index.filter(challenges)
+    assert unique == [challenges[1]]
+    assert [(duplicate["id"], duplicate["similarity"]) for duplicate in duplicates][1] == ("c", 1.0)
+    assert duplicates[0]["duplicate_of"] == INVENTORY
+    # Nothing was added by filtering.
+    assert index.near_duplicates(ANONYMIZER) == []
+    unique, duplicates = index.filter(challenges, minimum=2)
+    assert unique == challenges[:2]
+    assert [duplicate["id"] for duplicate in duplicates] == ["c"]
@@ -0,0 +1,71 @@
+"""Tests for `recursive_self_improvement_suite.dpo`."""
+
+import json
+
+import pytest
+
+from recursive_self_improvement_suite import batch
+from recursive_self_improvement_suite import dpo
+
+
+def test_ranking_pairs_prefer_the_ranked_over_the_later_and_the_unranked():
+    assert list(dpo.ranking_pairs(["b", "a"], ["a", "b", "c"])) == [("b", "a"), ("b", "c"), ("a", "c")]
+    # Unknown and repeated ids are ignored.
+    assert list(dpo.ranking_pairs([2, 2, 7], range(3))) == [(2, 0), (2, 1)]
+
+
+def test_tournament_pairs_leave_out_equal_strengths():
+    ranking = [{"id": 1, "strength": 2.0}, {"id": 0, "strength": 1.0}, {"id": 2, "strength": 1.0}]
+    assert list(dpo.tournament_pairs(ranking)) == [(1, 0), (1, 2)]
+
+
+def trajectory():
+    return {
+        "challenge_selection": {
+            "challenges": [{"id": "a", "description": "A"}, {"id": "b", "description": "B"}],
+            "challenge_rankings": [[{"id": "a"}], [{"id": "b"}]],
+            "best_challenge_ranking": {"best_challenge_ranking_id": 1},
+        },
+        "challenge": {"id": "b", "description": "B"},
+        "evaluation_functions": ["ef0", "ef1", "ef1"],
+        "evaluation_function_rankings": [{"best_evaluation_function_id": 1}],
+        "best_evaluation_function_ranking": {"best_ranking_id": 0},
+        "best_evaluation_function": "ef1",
+        "solutions": ["s0", "s1"],
+        "solution_tournament": {"ranking": [{"id": 1, "strength": 1.5}, {"id": 0, "strength": 0.5}]},
+    }
+
+
+def test_preference_pairs_from_the_chosen_rankings():
+    pairs = list(dpo.preference_pairs(trajectory(), unleashed=True))
+    assert [(pair["task"], pair["chosen"], pair["rejected"]) for pair in pairs] == [
+        ("challenge", '[{"description":"B","id":"b"}]', '[{"description":"A","id":"a"}]'),
+        # The identical evaluation functions are not paired.
+        ("evaluation_function", "ef1", "ef0"),
+        ("solution", "s1", "s0"),
+    ]
+    assert all(pair["prompt"].startswith("UNLEASHED: ") for pair in pairs)
+
+
+def test_exporter_writes_each_pair_once_across_runs(tmp_path):
+    with dpo.PreferencePairExporter(str(tmp_path)) as exporter:
+        assert exporter.export(trajectory()) == 3
+        assert exporter.export(trajectory()) == 0
+    with dpo.PreferencePairExporter(str(tmp_path)) as exporter:
+        assert exporter.export(trajectory()) == 0
+    lines = (tmp_path / "dpo-00000.jsonl").read_text().splitlines()
+    assert [json.loads(line)["task"] for line in lines] == ["challenge", "evaluation_function", "solution"]
+
+
+@pytest.mark.parametrize("ranking_mode", ["judges", "tournament"])
+def test_pairs_from_stub_batch(configure, ranking_mode, tmp_path):
+    configure(ranking_mode=ranking_mode)
+    trajectories = list(batch.run_batch(iterations=1, challenges_per_iteration=2))
+    with dpo.PreferencePairExporter(str(tmp_path)) as exporter:
+        written = exporter.export_all(trajectories)
+    pairs = [json.loads(line) for line in (tmp_path / "dpo-00000.jsonl").read_text().splitlines()]
+    assert written == len(pairs)
+    assert {pair["task"] for pair in pairs} == {"challenge", "evaluation_function", "solution"}
+    # Both challenges carry the same challenge selection, but its pairs are written once.
+    challenge_pairs = [(pair["chosen"], pair["rejected"]) for pair in pairs if pair["task"] == "challenge"]
+    assert len(challenge_pairs) == len(set(challenge_pairs))
@@ -0,0 +1,40 @@
+"""Tests for `recursive_self_improvement_suite.engine`."""
+
+import threading
+import time
+
+import pytest
+
+from recursive_self_improvement_suite import engine
+
+
+def test_run_all_keeps_call_order():
+    """Results come back in call order even when later calls finish first."""
+
+    def call(i):
+        return lambda: (time.sleep(0.05 * (5 - i)), i)[1]
+
+    assert engine.run_all([call(i) for i in range(5)], concurrency=5) == list(range(5))
+
+
+def test_run_all_respects_concurrency_limit():
+    """No more than `concurrency` calls run at the same time."""
+    lock = threading.Lock()
+    in_flight = [0]
+    peak = [0]
+
+    def call():
+        with lock:
+            in_flight[0] += 1
+            peak[0] = max(peak[0], in_flight[0])
+        time.sleep(0.02)
+        with lock:
+            in_flight[0] -= 1
+
+    engine.run_all([call for _ in range(10)], concurrency=3)
+    assert peak[0] <= 3
+
+
+def test_run_all_rejects_invalid_concurrency():
+    with pytest.raises(ValueError):
+        engine.run_all([lambda: None], concurrency=0)
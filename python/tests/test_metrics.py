@@ -0,0 +1,66 @@
+"""Tests for `recursive_self_improvement_suite.metrics`."""
+
+import json
+
+from recursive_self_improvement_suite.checkpoint import Checkpoint
+from recursive_self_improvement_suite.config import Config, Context
+from recursive_self_improvement_suite.metrics import MetricsCollector
+
+
+def record(collector, **fields):
+    values = {
+        "model": "model",
+        "prompt_tokens": 100,
+        "completion_tokens": 10,
+        "latency_seconds": 1.0,
+        "retries": 0,
+        "cached": False,
+        "succeeded": True,
+    }
+    values.update(fields)
+    collector.record(**values)
+
+
+def test_calls_are_attributed_to_the_stage_being_computed():
+    collector = MetricsCollector()
+    checkpoint = Checkpoint(name="iteration-0")
+    checkpoint.scope("challenge-0").stage("solutions", lambda: record(collector))
+    checkpoint.scope("challenge-1").stage("solutions", lambda: record(collector, retries=2))
+    checkpoint.stage("challenges", lambda: record(collector, prompt_tokens=1000))
+    record(collector)
+    assert collector.records[0].stage == "iteration-0/challenge-0/solutions"
+    summary = collector.summary()
+    assert list(summary) == ["challenges", "solutions", "unattributed"]
+    assert summary["solutions"]["calls"] == 2
+    assert summary["solutions"]["retries"] == 2
+    assert summary["solutions"]["cost"] is None
+
+
+def test_cost_accounting_and_export(tmp_path):
+    collector = MetricsCollector({"model": {"prompt": 1.0, "completion": 2.0}})
+    record(collector, stage="challenges")
+    record(collector, stage="challenges", cached=True)
+    assert collector.summary()["challenges"]["cost"] == 0.12
+    assert "challenges" in collector.summary_table()
+    path = tmp_path / "metrics.json"
+    collector.write(str(path))
+    exported = json.loads(path.read_text())
+    assert exported["summary"]["challenges"]["cached_calls"] == 1
+    assert len(exported["calls"]) == 2
+
+
+def test_context_keeps_metrics_across_calls():
+    context = Context(Config(backend="stub"))
+    context.backend
+    context.metrics.record(
+        stage=None,
+        model="model",
+        prompt_tokens=1,
+        completion_tokens=1,
+        latency_seconds=0.0,
+        retries=0,
+        cached=False,
+        succeeded=True,
+    )
+    context.backend
+    assert len(context.metrics.records) == 1
@@ -0,0 +1,61 @@
+"""Tests for `recursive_self_improvement_suite.output_prediction`."""
+
+import json
+
+import pytest
+
+from recursive_self_improvement_suite import backends
+from recursive_self_improvement_suite import dpo
+from recursive_self_improvement_suite import output_prediction
+from recursive_self_improvement_suite import recursive_self_improvement_suite as suite
+from recursive_self_improvement_suite import task_family
+from recursive_self_improvement_suite.checkpoint import Checkpoint
+
+
+def test_score_predictions_by_exact_match_and_similarity():
+    scores = output_prediction.score_predictions(["1\n2\n", "1  \n2\n\n", "1\n3\n", "2", ""], "1\n2")
+    assert [score["exact"] for score in scores] == [True, True, False, False, False]
+    assert scores[0]["similarity"] == scores[1]["similarity"] == 1.0
+    assert 0 == scores[4]["similarity"] < scores[3]["similarity"] < scores[2]["similarity"] < 1
+
+
+class ProgramBackend(backends.Backend):
+    """Writes programs printing the sample index, some of them broken, and predicts outputs off by the sample index."""
+
+    def complete(self, session, model, temperature, sample_index=0):
+        prompt = session[-1]["content"]
+        if "<program>" not in prompt:
+            program = "raise ValueError()" if sample_index % 3 == 0 else f"print({sample_index % 5})"
+            return backends.Completion(f"```python\n{program}\n```")
+        printed = int(prompt.split("print(")[1].split(")")[0])
+        return backends.Completion(json.dumps({"reasoning": "It prints.", "output": str(printed + sample_index)}))
+
+
+@pytest.fixture
+def program_backend(configure):
+    return configure(ProgramBackend())
+
+
+def test_iteration_scores_predictions_by_running_the_programs(program_backend):
+    family = task_family.get_task_family("output_prediction")
+    trajectories = suite.run_iteration(Checkpoint(), number_of_tasks=3, family=family)
+    # Every third program fails, and the later duplicates of print(2) are left out.
+    assert [trajectory["program"]["program"] for trajectory in trajectories] == ["print(1)", "print(2)", "print(4)"]
+    for trajectory in trajectories:
+        assert trajectory["best_prediction"] == 0
+        assert trajectory["prediction_scores"][0] == {"exact": True, "similarity": 1.0}
+        assert not any(score["exact"] for score in trajectory["prediction_scores"][1:])
+    pairs = list(dpo.preference_pairs({"task_family": "output_prediction", **trajectories[0]}))
+    assert {pair["chosen"] for pair in pairs} >= {'{"output":"1","reasoning":"It prints."}'}
+    assert all(pair["prompt"].startswith("Here is a Python program:\n<program>\nprint(1)") for pair in pairs)
+
+
+def test_the_family_is_shared_and_makes_its_sandbox_pool_on_first_use(program_backend):
+    family = task_family.get_task_family("output_prediction")
+    family.close()
+    [trajectory] = suite.run_iteration(Checkpoint(), number_of_tasks=1, family=family)
+    family.close()
+    # Exporting the pairs of a trajectory gets the same family, which runs no programs.
+    assert list(dpo.preference_pairs({"task_family": "output_prediction", **trajectory}))
+    assert task_family.get_task_family("output_prediction") is family
+    assert family._sandbox_pool is None
@@ -0,0 +1,33 @@
+"""Tests for `recursive_self_improvement_suite.parsing`."""
+
+import pytest
+
+from recursive_self_improvement_suite import coding
+from recursive_self_improvement_suite.errors import InvalidResponseError
+from recursive_self_improvement_suite.parsing import parse_json, validate
+
+
+def test_json_is_found_inside_fences_and_prose():
+    schema = coding.evaluate_solutions_schema(range(3))
+    response = 'Sure! Here you go:\n```json\n{"rationale": "Fast {and} correct.", "sample_solution_id": 2}\n```\nBye.'
+    assert parse_json(response, schema) == {"rationale": "Fast {and} correct.", "sample_solution_id": 2}
+    assert parse_json('The best is {"rationale": "r", "sample_solution_id": "1"}.', schema)["sample_solution_id"] == 1
+
+
+def test_single_object_is_coerced_into_a_list():
+    schema = coding.evaluate_challenges_schema(["a", "b"], 1)
+    assert parse_json('{"id": "b", "rationale": "r"}', schema) == [{"id": "b", "rationale": "r"}]
+    assert parse_json('{"best": [{"id": "a", "rationale": "r"}]}', schema) == [{"id": "a", "rationale": "r"}]
+
+
+def test_invalid_responses_are_rejected():
+    schema = coding.evaluate_challenges_schema(["a", "b"], 2)
+    with pytest.raises(InvalidResponseError):
+        parse_json("I can't rank these.", schema)
+    with pytest.raises(InvalidResponseError, match="at least 2 items"):
+        parse_json('[{"id": "a", "rationale": "r"}]', schema)
+    assert validate([{"id": "c", "rationale": "r", "extra": 1}, {"id": "a"}], schema) == [
+        "$[0].id: 'c' is not one of ['a', 'b']",
+        "$[0]: unexpected 'extra'",
+        "$[1]: missing 'rationale'",
+    ]
@@ -0,0 +1,19 @@
+"""Tests for `recursive_self_improvement_suite.prompts`."""
+
+import json
+
+from recursive_self_improvement_suite import prompts
+
+
+def test_output_schema_gives_the_schema_in_compact_json():
+    schema = prompts.object_schema({"answer": {"type": "string"}}, ["answer"])
+    instruction = prompts.output_schema(schema)
+    assert json.loads(instruction.split("<JSON-Schema>\n")[1].split("\n</JSON-Schema>")[0]) == schema
+    assert schema["$schema"] == prompts.JSON_SCHEMA_DRAFT
+    assert schema["additionalProperties"] is False
+
+
+def test_section_renders_each_item_in_its_tag():
+    assert prompts.section("answers", [{"answer": "Yes", "reasoning": "Known."}], "answer") == (
+        "<answers>\n<answer>\nanswer: Yes\nreasoning: Known.\n</answer>\n</answers>\n"
+    )
@@ -0,0 +1,38 @@
+"""Tests for `recursive_self_improvement_suite.rate_limit`."""
+
+import random
+from types import SimpleNamespace
+
+from recursive_self_improvement_suite import rate_limit
+
+
+def test_token_bucket_borrows_in_arrival_order():
+    bucket = rate_limit.TokenBucket(capacity=2, refill_per_second=1)
+    assert bucket.reserve(1, now=bucket.updated) == 0
+    assert bucket.reserve(1, now=bucket.updated) == 0
+    # The bucket is empty, so the next two callers wait one and two seconds.
+    assert bucket.reserve(1, now=bucket.updated) == 1
+    assert bucket.reserve(1, now=bucket.updated) == 2
+
+
+def test_token_bucket_adjust_is_capped_by_capacity():
+    bucket = rate_limit.TokenBucket(capacity=100, refill_per_second=1)
+    bucket.reserve(50, now=bucket.updated)
+    bucket.adjust(1000, now=bucket.updated)
+    assert bucket.level == 100
+
+
+def test_backoff_delay_grows_and_is_capped():
+    rng = random.Random(0)
+    for attempt in range(10):
+        assert 0 <= rate_limit.backoff_delay(attempt, base=1, cap=8, rng=rng) <= min(8, 2 ** attempt)
+
+
+def test_retry_after_reads_headers():
+    def error(headers):
+        return Exception() if headers is None else SimpleNamespace(response=SimpleNamespace(headers=headers))
+
+    assert rate_limit.retry_after(error({"retry-after-ms": "1500"})) == 1.5
+    assert rate_limit.retry_after(error({"retry-after": "3"})) == 3
+    assert rate_limit.retry_after(error({"retry-after": "Wed, 21 Oct 2015 07:28:00 GMT"})) is None
+    assert rate_limit.retry_after(error(None)) is None
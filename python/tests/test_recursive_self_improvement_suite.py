@@ -2,12 +2,22 @@
 
 """Tests for `recursive_self_improvement_suite` package."""
 
+import threading
+
 import pytest
 
 from click.testing import CliRunner
 
 from recursive_self_improvement_suite import recursive_self_improvement_suite
+from recursive_self_improvement_suite import adaptive
+from recursive_self_improvement_suite import backends
+from recursive_self_improvement_suite import benchmark
 from recursive_self_improvement_suite import cli
+from recursive_self_improvement_suite import coding
+from recursive_self_improvement_suite import engine
+from recursive_self_improvement_suite import metrics
+from recursive_self_improvement_suite.checkpoint import Checkpoint, current_stage
+from recursive_self_improvement_suite.errors import ChatError, InvalidResponseError
 
 
 @pytest.fixture
@@ -29,9 +39,273 @@ def test_content(response):
 def test_command_line_interface():
     """Test the CLI."""
     runner = CliRunner()
-    result = runner.invoke(cli.main)
-    assert result.exit_code == 0
-    assert "recursive_self_improvement_suite.cli.main" in result.output
     help_result = runner.invoke(cli.main, ["--help"])
     assert help_result.exit_code == 0
-    assert "--help  Show this message and exit." in help_result.output
+    assert "Show this message and exit." in help_result.output
+    assert "--config" in help_result.output
+    assert "run" in help_result.output
+    run_help_result = runner.invoke(cli.main, ["run", "--help"])
+    assert run_help_result.exit_code == 0
+    assert "--iterations" in run_help_result.output
+
+
+def test_coding_improvement_iteration_with_stub_backend(stub_backend, tmp_path):
+    trajectories = recursive_self_improvement_suite.coding_improvement_iteration(
+        checkpoint_directory=str(tmp_path)
+    )
+    assert len(trajectories) == 2
+    for trajectory in trajectories:
+        assert trajectory["best_solution"] in trajectory["solutions"]
+        assert trajectory["best_evaluation_function"] in trajectory["evaluation_functions"]
+        assert all(
+            output["returncode"] == 0 for outputs in trajectory["evaluation_function_outputs"] for output in outputs
+        )
+    # Everything is resumed from the checkpoints.
+    assert recursive_self_improvement_suite.coding_improvement_iteration(
+        checkpoint_directory=str(tmp_path)
+    ) == trajectories
+
+
+def test_challenges_are_processed_concurrently_within_the_request_budget(configure):
+    class ConcurrencyTrackingBackend(backends.StubBackend):
+        def __init__(self):
+            # One sample per request, so that the batches fan out to more requests than the budget.
+            super().__init__(latency=0.01, max_samples_per_request=1)
+            self.lock = threading.Lock()
+            self.in_flight = []
+            self.max_in_flight = 0
+            self.overlapping_challenges = False
+
+        def complete_n(self, session, model, temperature, sample_indices):
+            scope = current_stage.get().split("/")[0]
+            with self.lock:
+                self.in_flight.append(scope)
+                self.max_in_flight = max(self.max_in_flight, len(self.in_flight))
+                self.overlapping_challenges |= len({scope for scope in self.in_flight if "challenge" in scope}) > 1
+            try:
+                return super().complete_n(session, model, temperature, sample_indices)
+            finally:
+                with self.lock:
+                    self.in_flight.remove(scope)
+
+    backend = ConcurrencyTrackingBackend()
+    configure(backend, max_concurrent_requests=3)
+    trajectories = recursive_self_improvement_suite.coding_improvement_iteration()
+    assert len(trajectories) == 2
+    assert backend.max_in_flight == 3
+    assert backend.overlapping_challenges
+
+
+@pytest.mark.parametrize("ranking_mode", ["judges", "tournament"])
+def test_roles_are_routed_to_their_models(configure, ranking_mode):
+    recorder = benchmark.RecordingBackend(backends.StubBackend())
+    configure(
+        recorder,
+        model="default",
+        models={"solution_generation": "cheap", "ranking": ["judge-a", "judge-b"], "meta_ranking": "strong"},
+        ranking_mode=ranking_mode,
+    )
+    recursive_self_improvement_suite.coding_improvement_iteration()
+    models_by_stage = {}
+    for call in recorder.calls:
+        models_by_stage.setdefault(metrics.stage_kind(call["stage"]), set()).add(call["model"])
+    assert models_by_stage["challenges"] == {"default"}
+    assert models_by_stage["evaluation_functions"] == {"default"}
+    assert models_by_stage["solutions"] == {"cheap"}
+    # The judges are a panel of both models, whose requests are dispatched concurrently.
+    assert models_by_stage["evaluation_function_rankings" if ranking_mode == "judges" else "solution_tournament"] == {
+        "judge-a",
+        "judge-b",
+    }
+    if ranking_mode == "judges":
+        assert models_by_stage["best_evaluation_function_ranking"] == {"strong"}
+
+
+def test_chat_n_samples_in_few_requests_and_caches_each_sample(configure, tmp_path):
+    recorder = benchmark.RecordingBackend(backends.StubBackend(max_samples_per_request=4))
+    configure(recorder, cache={"path": str(tmp_path / "cache.sqlite")})
+    prompt = coding.generate_evaluation_function("challenge")
+    samples = recursive_self_improvement_suite.chat_n([prompt], 5)
+    assert [call["samples"] for call in recorder.calls] == [4, 1]
+    assert recursive_self_improvement_suite.chat([prompt], 3) == samples[3]
+    # Only the sample which isn't cached yet is requested.
+    assert recursive_self_improvement_suite.chat_n([prompt], 6)[:5] == samples
+    assert [call["samples"] for call in recorder.calls] == [4, 1, 1]
+
+
+def test_prompts_about_a_challenge_share_their_prefix():
+    challenge = {"id": "a", "domain": "logistics", "description": "Route the trucks."}
+    solutions = [{"id": 0, "solution": "def solution(): pass"}]
+    evaluate_solutions_prompt = coding.evaluate_solutions(challenge, "evaluation function", solutions, [0])
+    solutions_section = evaluate_solutions_prompt[: evaluate_solutions_prompt.index("Above")]
+    assert solutions_section.startswith(coding.generate_solutions(challenge, "evaluation function").split("I need")[0])
+    assert coding.evaluate_solution_ranking(challenge, "evaluation function", solutions, [], [0]).startswith(
+        solutions_section
+    )
+
+
+def test_prompts_about_the_evaluation_functions_share_the_prefix_of_the_challenge():
+    challenge = {"id": "a", "domain": "logistics", "description": "Route the trucks."}
+    evaluation_functions = [{"id": 0, "evaluation_function": "print(solution())"}]
+    prefix = coding._challenge_prefix(challenge)
+    assert coding.evaluate_evaluation_functions(challenge, evaluation_functions, [0]).startswith(prefix)
+    assert coding.evaluate_evaluation_function_ranking(challenge, evaluation_functions, [], [0]).startswith(prefix)
+    assert coding.generate_solutions(challenge, "print(solution())").startswith(prefix)
+    # The judge of the judges sees the ids of the evaluation functions the rankings cite.
+    ranking_prompt = coding.evaluate_evaluation_function_ranking(challenge, evaluation_functions, [], [0])
+    assert '<evaluation-function id="0">\nprint(solution())\n</evaluation-function>' in ranking_prompt
+
+
+class PromptRecordingBackend(backends.StubBackend):
+    """Records the prompts of the stub."""
+
+    def __init__(self):
+        super().__init__()
+        self.prompts = []
+
+    def _content(self, session, sample_index):
+        self.prompts.append(session[-1]["content"])
+        return super()._content(session, sample_index)
+
+
+def test_every_prompt_about_a_challenge_starts_with_its_prefix(configure):
+    backend = PromptRecordingBackend()
+    configure(backend)
+    challenge = {"id": "a", "domain": "logistics", "description": "Route the trucks."}
+    coding.CodingTaskFamily().process_task(challenge, Checkpoint(), engine.DEFAULT_CONCURRENCY)
+    assert backend.prompts
+    assert all(prompt.startswith(coding._challenge_prefix(challenge)) for prompt in backend.prompts)
+
+
+class SometimesInvalidBackend(backends.Backend):
+    """Answers the first samples with prose instead of JSON."""
+
+    def __init__(self, invalid_samples):
+        self.invalid_samples = invalid_samples
+        self.sample_indices = []
+
+    def complete(self, session, model, temperature, sample_index=0):
+        self.sample_indices.append(sample_index)
+        if sample_index in self.invalid_samples:
+            return backends.Completion("I would rather not.")
+        return backends.Completion(f'```json\n{{"rationale": "r", "sample_solution_id": {sample_index % 5}}}\n```')
+
+
+def test_only_invalid_responses_are_sampled_again(configure):
+    backend = SometimesInvalidBackend({1, 1001})
+    configure(backend)
+    schema = coding.evaluate_solutions_schema(range(5))
+    evaluations = recursive_self_improvement_suite.chat_n_json(["prompt"], schema, 3)
+    assert [evaluation["sample_solution_id"] for evaluation in evaluations] == [0, 2001 % 5, 2]
+    assert sorted(backend.sample_indices) == [0, 1, 2, 1001, 2001]
+    backend.invalid_samples = {0, 1000, 2000}
+    with pytest.raises(InvalidResponseError):
+        recursive_self_improvement_suite.chat_json(["prompt"], schema)
+
+
+def test_tournament_ranking_mode_with_stub_backend(configure):
+    configure(ranking_mode="tournament")
+    trajectories = recursive_self_improvement_suite.coding_improvement_iteration()
+    for trajectory in trajectories:
+        ranking = trajectory["solution_tournament"]["ranking"]
+        assert sorted(ranked["id"] for ranked in ranking) == list(range(len(trajectory["solutions"])))
+        assert trajectory["best_solution"] == trajectory["solutions"][ranking[0]["id"]]
+        assert "solution_evaluations" not in trajectory
+
+
+def test_repeated_challenges_are_not_ranked_again(configure, tmp_path):
+    configure(dedup={"path": str(tmp_path / "challenges.sqlite")})
+    first = coding.CodingTaskFamily().select_tasks(Checkpoint(), engine.DEFAULT_CONCURRENCY, 2)
+    # The stub generates the same challenges again.
+    second = coding.CodingTaskFamily().select_tasks(Checkpoint(), engine.DEFAULT_CONCURRENCY, 2)
+    # The stub descriptions only differ by a number, so only the minimum number of them is kept.
+    assert len(first["challenges"]) == len(second["challenges"]) == 2
+    assert all(duplicate["similarity"] < 1 for duplicate in first["duplicate_challenges"])
+    # The second time they are exact duplicates of the indexed ones.
+    assert all(duplicate["similarity"] == 1 for duplicate in second["duplicate_challenges"])
+
+
+def test_the_numbers_of_challenges_and_solutions_are_configured(configure):
+    configure(number_of_challenges=4, number_of_solutions=3)
+    family = coding.CodingTaskFamily()
+    selection = family.select_tasks(Checkpoint(), engine.DEFAULT_CONCURRENCY, 2)
+    assert len(selection["challenges"]) == 4
+    trajectory = family.process_task(selection["best_challenges"][0], Checkpoint(), engine.DEFAULT_CONCURRENCY)
+    assert len(trajectory["solutions"]) == 3
+
+
+def test_adaptive_sampling_stops_early(configure):
+    recorder = benchmark.RecordingBackend(backends.StubBackend())
+    configure(recorder, adaptive_sampling=True)
+    trajectory = coding.CodingTaskFamily().process_task(
+        {"id": "a", "description": "Route the trucks."}, Checkpoint(), engine.DEFAULT_CONCURRENCY
+    )
+    # The stub solutions run cleanly, so no more are sampled after the first round.
+    assert len(trajectory["solutions"]) == adaptive.SOLUTIONS_PER_ROUND
+    assert len(trajectory["evaluation_function_outputs"][0]) == adaptive.SOLUTIONS_PER_ROUND
+    for judgements, ranking, key in [
+        (trajectory["evaluation_function_rankings"], trajectory["best_evaluation_function_ranking"], "best_ranking_id"),
+        (trajectory["solution_evaluations"], trajectory["ranking_of_solution_evaluations"], "ranking_id"),
+    ]:
+        assert len(judgements) in (adaptive.INITIAL_JUDGES, adaptive.MAX_JUDGES)
+        assert ranking[key] < len(judgements)
+    stages = [call["stage"] for call in recorder.calls]
+    assert stages.count("solutions") == 1
+
+
+@pytest.mark.parametrize("meta_ranking", ["local", "escalate"])
+def test_local_meta_ranking(configure, meta_ranking):
+    recorder = benchmark.RecordingBackend(backends.StubBackend())
+    configure(recorder, meta_ranking=meta_ranking, escalation_agreement=1.1)
+    selection = coding.CodingTaskFamily().select_tasks(Checkpoint(), engine.DEFAULT_CONCURRENCY, 2)
+    aggregated = selection["best_challenge_ranking"]["aggregation"]
+    assert len(aggregated["judge_agreement"]) == len(selection["challenge_rankings"])
+    assert sorted(aggregated["consensus"]) == sorted(challenge["id"] for challenge in selection["challenges"])
+    # Escalated to an LLM, because the judges never agree by more than 1.
+    meta_calls = [call for call in recorder.calls if call["stage"] == "best_challenge_ranking"]
+    assert len(meta_calls) == (meta_ranking == "escalate")
+
+
+def test_the_last_failed_attempt_raises_without_waiting(configure, monkeypatch):
+    delays = []
+    monkeypatch.setattr(recursive_self_improvement_suite.time, "sleep", delays.append)
+    configure(backends.StubBackend(error_rate=1.0), max_attempts=3)
+    with pytest.raises(ChatError) as raised:
+        recursive_self_improvement_suite.chat(["prompt"])
+    assert raised.value.retryable
+    assert len(delays) == 2
+
+
+def test_a_configuration_error_is_not_a_failed_call(configure):
+    configure(backend="nonexistent")
+    with pytest.raises(ValueError, match="Unknown backend nonexistent"):
+        recursive_self_improvement_suite.chat(["prompt"])
+
+
+def test_a_rerun_of_a_challenge_is_fully_cached(configure, tmp_path):
+    cache = {"path": str(tmp_path / "cache.sqlite")}
+    challenge = {"id": "a", "description": "Route the trucks."}
+    configure(cache=cache)
+    trajectory = coding.CodingTaskFamily().process_task(challenge, Checkpoint(), engine.DEFAULT_CONCURRENCY)
+    # The run times are kept in the trajectory, but not in the prompts.
+    assert "duration_seconds" in trajectory["evaluation_function_outputs"][0][0]
+    context = configure(cache=cache)
+    coding.CodingTaskFamily().process_task(challenge, Checkpoint(), engine.DEFAULT_CONCURRENCY)
+    summary = context.metrics.summary()
+    assert all(stage["calls"] == stage["cached_calls"] for stage in summary.values())
+    assert {"solution_evaluations", "ranking_of_solution_evaluations", "ranking_of_evaluation_functions"} <= set(summary)
+
+
+def test_evaluation_functions_are_ranked_by_their_outputs_on_the_best_solution(stub_backend):
+    trajectory = coding.CodingTaskFamily().process_task(
+        {"id": "a", "description": "Route the trucks."}, Checkpoint(), engine.DEFAULT_CONCURRENCY
+    )
+    ranking = trajectory["ranking_of_evaluation_functions"]
+    assert sorted(ranked["id"] for ranked in ranking) == list(range(len(trajectory["evaluation_functions"])))
+    prompt = coding.rank_evaluation_functions_by_outputs(
+        "Route the trucks.", "def solution(): pass", [{"id": 0, "evaluation_function": "harness", "output": "ok"}], [0]
+    )
+    solution_section = prompt[prompt.index("<solution>"):prompt.index("</solution>")]
+    functions_section = prompt[prompt.index("<evaluation-functions-with-outputs>"):]
+    assert "def solution(): pass" in solution_section and "harness" not in solution_section
+    assert "evaluation_function: harness" in functions_section
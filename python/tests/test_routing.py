@@ -0,0 +1,22 @@
+"""Tests for `recursive_self_improvement_suite.routing`."""
+
+import pytest
+
+from recursive_self_improvement_suite import config
+from recursive_self_improvement_suite import routing
+
+
+def test_roles_take_their_models_or_the_default():
+    routed = config.Config(model="default", models={"ranking": ["a", "b"], "meta_ranking": "strong"})
+    assert routing.panel(routed, routing.RANKING) == ["a", "b"]
+    assert routing.panel(routed, routing.META_RANKING) == ["strong"]
+    assert routing.panel(routed, routing.SOLUTION_GENERATION) == ["default"]
+    assert routing.panel(routed, None) == ["default"]
+    assert [routing.model_for(routed, routing.RANKING, sample_index) for sample_index in range(3)] == ["a", "b", "a"]
+
+
+def test_invalid_models_are_rejected():
+    with pytest.raises(ValueError, match="Unknown roles"):
+        routing.panel(config.Config(models={"judging": "a"}), routing.RANKING)
+    with pytest.raises(ValueError, match="No models"):
+        routing.panel(config.Config(models={"ranking": []}), routing.RANKING)
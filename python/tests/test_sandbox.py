@@ -0,0 +1,112 @@
+"""Tests for `recursive_self_improvement_suite.sandbox`."""
+
+import os
+import threading
+import time
+
+import pytest
+
+from recursive_self_improvement_suite import sandbox
+
+
+def test_extract_code_joins_markdown_blocks():
+    response = "Here you go:\n```python\ndef solution():\n    return 1\n```\nAnd:\n```\nprint(solution())\n```\n"
+    assert sandbox.extract_code(response) == "def solution():\n    return 1\n\nprint(solution())"
+    assert sandbox.extract_code("print(1)") == "print(1)"
+
+
+def test_run_evaluations_pairs_every_evaluation_function_with_every_solution():
+    solutions = [f"```python\ndef solution():\n    return {value}\n```" for value in range(3)]
+    evaluation_functions = ["```python\nprint(solution())\n```", "```python\nprint(solution() * 10)\n```"]
+    results = sandbox.run_evaluations(evaluation_functions, solutions)
+    assert [[result.stdout for result in row] for row in results] == [
+        ["0\n", "1\n", "2\n"],
+        ["0\n", "10\n", "20\n"],
+    ]
+    assert all(result.returncode == 0 and not result.timed_out for row in results for result in row)
+
+
+def test_concurrent_evaluations_share_the_cores(monkeypatch):
+    lock = threading.Lock()
+    in_flight = [0]
+    peak = [0]
+
+    def counting_run_python(code, limits):
+        with lock:
+            in_flight[0] += 1
+            peak[0] = max(peak[0], in_flight[0])
+        time.sleep(0.01)
+        with lock:
+            in_flight[0] -= 1
+        return sandbox.ExecutionResult(0, "", "", 0.01, False)
+
+    monkeypatch.setattr(sandbox, "run_python", counting_run_python)
+    monkeypatch.setattr(sandbox, "MAX_CONCURRENT_EVALUATIONS", 2)
+    monkeypatch.setattr(sandbox, "_evaluation_executor", None)
+    challenges = [
+        threading.Thread(target=sandbox.run_evaluations, args=(["print(1)"] * 2, ["solution"] * 3)) for _ in range(4)
+    ]
+    for challenge in challenges:
+        challenge.start()
+    for challenge in challenges:
+        challenge.join()
+    sandbox._evaluation_executor.shutdown()
+    assert peak[0] == 2
+
+
+def test_run_python_captures_errors():
+    result = sandbox.run_python("raise ValueError('broken')")
+    assert result.returncode != 0
+    assert "ValueError: broken" in result.stderr
+
+
+def test_run_python_enforces_wall_time():
+    result = sandbox.run_python("import time\ntime.sleep(10)", sandbox.Limits(wall_time_seconds=0.5))
+    assert result.timed_out
+    assert result.returncode is None
+    assert result.duration_seconds < 5
+
+
+def test_sandbox_pool_runs_each_program_once(monkeypatch):
+    runs = []
+    run_python = sandbox.run_python
+
+    def counting_run_python(code, limits):
+        runs.append(code)
+        return run_python(code, limits)
+
+    monkeypatch.setattr(sandbox, "run_python", counting_run_python)
+    pool = sandbox.SandboxPool(workers=2, max_memoized=2)
+    try:
+        results = pool.run_all(["print(1)", "print(2)", "print(1)"])
+        assert [result.stdout for result in results] == ["1\n", "2\n", "1\n"]
+        assert pool.run("print(2)").stdout == "2\n"
+        assert sorted(runs) == ["print(1)", "print(2)"]
+        # Only the most recently run programs are remembered.
+        pool.run("print(3)")
+        pool.run("print(1)")
+        assert runs.count("print(1)") == 2
+    finally:
+        pool.close()
+
+
+def test_run_python_limits_the_resources_in_the_child():
+    if os.name != "posix":
+        pytest.skip("The resource limits are only applied on POSIX.")
+    result = sandbox.run_python(
+        "import resource, sys\nprint(resource.getrlimit(resource.RLIMIT_CPU), sys.argv[0].endswith('program.py'))",
+        sandbox.Limits(cpu_time_seconds=3),
+    )
+    assert result.stdout == "(3, 3) True\n"
+    result = sandbox.run_python("blob = bytearray(512 * 1024 * 1024)", sandbox.Limits(memory_bytes=256 * 1024 * 1024))
+    assert "MemoryError" in result.stderr
+
+
+def test_run_python_keeps_only_the_beginning_of_a_flood_of_output():
+    result = sandbox.run_python(
+        "import sys\nfor _ in range(2000):\n    sys.stdout.write('x' * 10000)\nprint('done', file=sys.stderr)"
+    )
+    assert result.returncode == 0
+    assert result.stdout.startswith("x" * sandbox.MAX_OUTPUT_CHARACTERS + "\n... [")
+    assert len(result.stdout) < sandbox.MAX_OUTPUT_CHARACTERS + 100
+    assert result.stderr == "done\n"
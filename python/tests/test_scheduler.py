@@ -0,0 +1,58 @@
+"""Tests for `recursive_self_improvement_suite.scheduler`."""
+
+import threading
+
+import pytest
+
+from recursive_self_improvement_suite import scheduler
+from recursive_self_improvement_suite.checkpoint import current_stage
+
+
+def test_nodes_run_after_their_dependencies_with_their_results():
+    nodes = [
+        scheduler.Node("sum", lambda results: results["one"] + results["two"], ("one", "two")),
+        scheduler.Node("one", lambda results: 1),
+        scheduler.Node("two", lambda results: 2),
+    ]
+    assert scheduler.run_graph(nodes, workers=2) == {"one": 1, "two": 2, "sum": 3}
+
+
+def test_independent_nodes_run_concurrently_and_see_the_context():
+    # Every node waits for all the others to start, so this deadlocks unless they run at the same time.
+    barrier = threading.Barrier(3, timeout=5)
+    token = current_stage.set("iteration")
+
+    def compute(results):
+        barrier.wait()
+        return current_stage.get()
+
+    try:
+        results = scheduler.run_graph([scheduler.Node(f"node-{index}", compute) for index in range(3)], workers=3)
+    finally:
+        current_stage.reset(token)
+    assert results == {f"node-{index}": "iteration" for index in range(3)}
+
+
+def test_a_failure_stops_the_dependent_nodes():
+    ran = []
+
+    def fail(results):
+        raise RuntimeError("Failed")
+
+    nodes = [
+        scheduler.Node("failing", fail),
+        scheduler.Node("dependent", lambda results: ran.append("dependent"), ("failing",)),
+    ]
+    with pytest.raises(RuntimeError, match="Failed"):
+        scheduler.run_graph(nodes, workers=2)
+    assert ran == []
+
+
+def test_invalid_graphs_are_rejected():
+    with pytest.raises(ValueError, match="unknown"):
+        scheduler.run_graph([scheduler.Node("a", lambda results: 1, ("b",))], workers=1)
+    with pytest.raises(ValueError, match="cyclic"):
+        scheduler.run_graph(
+            [scheduler.Node("a", lambda results: 1, ("b",)), scheduler.Node("b", lambda results: 1, ("a",))],
+            workers=1,
+        )
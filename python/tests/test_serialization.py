@@ -0,0 +1,39 @@
+"""Tests for `recursive_self_improvement_suite.serialization`."""
+
+import json
+import re
+
+from recursive_self_improvement_suite import coding
+from recursive_self_improvement_suite import serialization
+
+
+def test_render_keeps_code_unescaped_and_skips_empty_fields():
+    rendered = serialization.render(
+        {"id": 1, "solution": "def f():\n    return 'x'", "output": {"stdout": "", "returncode": 0}}, "sample"
+    )
+    assert rendered == (
+        '<sample id="1">\n<solution>\ndef f():\n    return \'x\'\n</solution>\n<output>\nreturncode: 0\n</output>\n</sample>'
+    )
+
+
+def test_an_item_with_only_the_field_of_its_tag_is_rendered_once():
+    evaluation_function = {"id": 2, "evaluation_function": "print(solution())\n"}
+    assert serialization.render(evaluation_function, "evaluation-function") == (
+        '<evaluation-function id="2">\nprint(solution())\n</evaluation-function>'
+    )
+
+
+def test_compact_json_is_deterministic():
+    assert serialization.compact_json({"b": [1, 2], "a": "ä"}) == '{"a":"ä","b":[1,2]}'
+
+
+def test_prompts_embed_valid_compact_schemas():
+    prompt = coding.evaluate_challenges([{"id": "a", "description": "Challenge"}], ["a"], 1)
+    schema = re.search(r"<JSON-Schema>\n(.*)\n</JSON-Schema>", prompt).group(1)
+    assert json.loads(schema) == coding.evaluate_challenges_schema(["a"], 1)
+    assert "\n" not in schema
+    assert "{'id'" not in prompt
+
+
+def test_count_tokens_is_positive():
+    assert serialization.count_tokens("Hello, world! " * 10) > 0
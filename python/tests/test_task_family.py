@@ -0,0 +1,64 @@
+"""Tests for `recursive_self_improvement_suite.task_family`."""
+
+import os
+import subprocess
+import sys
+
+import pytest
+
+from recursive_self_improvement_suite import batch
+from recursive_self_improvement_suite import dpo
+from recursive_self_improvement_suite import recursive_self_improvement_suite as suite
+from recursive_self_improvement_suite import task_family
+from recursive_self_improvement_suite.checkpoint import Checkpoint
+
+
+class CountingTaskFamily(task_family.TaskFamily):
+    """Tasks of counting to a number, with the longer counts preferred."""
+
+    name = "counting"
+    task_name = "count"
+
+    def select_tasks(self, checkpoint, concurrency, number_of_tasks, iteration=0):
+        best_counts = [{"n": n} for n in range(3, 3 - number_of_tasks, -1)]
+        return checkpoint.stage("counts", lambda: {"counts": [3, 1, 2], "best_counts": best_counts})
+
+    def process_task(self, task, checkpoint, concurrency):
+        count = " ".join(map(str, range(task["n"])))
+        return checkpoint.stage("counting", lambda: {"task": task, "responses": [count, ""]})
+
+    def preference_pairs(self, trajectory):
+        yield "count", f"Count to {trajectory['task']['n']}.", trajectory["responses"][0], trajectory["responses"][1]
+
+
+@pytest.fixture
+def counting():
+    task_family.register_task_family("counting", CountingTaskFamily)
+    yield task_family.get_task_family("counting")
+    del task_family.TASK_FAMILIES["counting"]
+
+
+def test_unknown_task_families_are_rejected():
+    assert isinstance(task_family.get_task_family("coding"), task_family.TaskFamily)
+    with pytest.raises(ValueError, match="Unknown task family"):
+        task_family.get_task_family("chess")
+
+
+def test_the_shared_pipeline_runs_any_task_family(counting, tmp_path):
+    trajectories = suite.run_iteration(Checkpoint(str(tmp_path)), number_of_tasks=2, family=counting)
+    assert [trajectory["task"]["n"] for trajectory in trajectories] == [3, 2]
+    assert (tmp_path / "count-1" / "counting.json.gz").exists()
+
+    batched = list(batch.run_batch(iterations=2, challenges_per_iteration=1, family=counting))
+    assert sorted((trajectory["iteration"], trajectory["count_index"]) for trajectory in batched) == [(0, 0), (1, 0)]
+    assert all(trajectory["count_selection"] == {"counts": [3, 1, 2]} for trajectory in batched)
+    pairs = list(dpo.preference_pairs(batched[0]))
+    assert pairs == [{"task": "count", "prompt": "Count to 3.", "chosen": "0 1 2", "rejected": ""}]
+
+
+def test_the_shared_pipeline_does_not_import_the_coding_family():
+    code = "import sys, recursive_self_improvement_suite.batch, recursive_self_improvement_suite.trivia\n"
+    code += "print('recursive_self_improvement_suite.coding' in sys.modules)"
+    directory = os.path.dirname(os.path.dirname(task_family.__file__))
+    result = subprocess.run([sys.executable, "-c", code], capture_output=True, text=True, check=True, cwd=directory)
+    assert result.stdout == "False\n"
@@ -0,0 +1,37 @@
+"""Tests for `recursive_self_improvement_suite.tournament`."""
+
+from recursive_self_improvement_suite import tournament
+
+
+def test_bradley_terry_orders_by_results():
+    comparisons = [
+        {"first": "a", "second": "b", "winner": "a"},
+        {"first": "b", "second": "c", "winner": "b"},
+        {"first": "a", "second": "c", "winner": None},
+        {"first": "c", "second": "d", "winner": "c"},
+    ]
+    strengths = tournament.bradley_terry(["a", "b", "c", "d"], comparisons)
+    assert sorted(strengths, key=lambda candidate_id: -strengths[candidate_id]) == ["a", "b", "c", "d"]
+    assert tournament.bradley_terry(["a", "b"], []) == {"a": 1.0, "b": 1.0}
+
+
+def test_swiss_pairings_avoid_rematches():
+    comparisons = [
+        {"first": 0, "second": 1, "winner": 0},
+        {"first": 2, "second": 3, "winner": 2},
+    ]
+    assert tournament.swiss_pairings([0, 1, 2, 3, 4], comparisons) == [(0, 2), (1, 4)]
+
+
+def test_tournament_finds_the_best_of_many_candidates():
+    calls = []
+
+    def compare(first, second):
+        calls.append((first, second))
+        return {"winner": max(first, second)}
+
+    result = tournament.run_tournament(range(64), compare)
+    assert result["ranking"][0]["id"] == 63
+    assert len(result["comparisons"]) == len(calls) == 32 * tournament.default_rounds(64)
+    # Both presentation orders are used.
+    assert any(first < second for first, second in calls) and any(first > second for first, second in calls)
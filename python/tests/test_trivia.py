@@ -0,0 +1,117 @@
+"""Tests for `recursive_self_improvement_suite.trivia`."""
+
+import json
+
+import pytest
+
+from recursive_self_improvement_suite import backends
+from recursive_self_improvement_suite import dpo
+from recursive_self_improvement_suite import recursive_self_improvement_suite as suite
+from recursive_self_improvement_suite import task_family
+from recursive_self_improvement_suite.checkpoint import Checkpoint
+
+from .test_wikipedia import write_dump
+
+
+class TriviaBackend(backends.Backend):
+    """Asks a question by the sample index, answers it right only in sample 2, and ranks the candidates in order."""
+
+    def complete(self, session, model, temperature, sample_index=0):
+        prompt = session[-1]["content"]
+        if "to judge the judges" in prompt:
+            return backends.Completion(json.dumps({"rationale": "Fine.", "ranking_id": 0}))
+        if "Please rank the questions" in prompt:
+            order = range(4)
+        elif "Please rank the answers" in prompt:
+            order = [2, 0, 1, 3, 4]
+        elif "Please write a challenging trivia question" in prompt:
+            title = prompt.split("Title: ")[1].split("\n")[0]
+            return backends.Completion(json.dumps({"question": f"{title} {sample_index}?", "answer": title}))
+        else:
+            answer = "Right" if sample_index == 2 else f"Wrong {sample_index}"
+            return backends.Completion(json.dumps({"answer": answer}))
+        return backends.Completion(json.dumps([{"rationale": "Fine.", "id": id} for id in order]))
+
+
+@pytest.fixture
+def trivia_context(configure, tmp_path):
+    wikipedia = write_dump(
+        tmp_path, [[(1, "Alpha", "First."), (2, "Talk:Alpha", "Chat.", 1)], [(3, "Beta", "Second.")]]
+    )
+    return configure(TriviaBackend(), wikipedia=wikipedia)
+
+
+def test_iteration_asks_about_random_articles_and_ranks_the_answers(trivia_context):
+    family = task_family.get_task_family("trivia")
+    trajectories = suite.run_iteration(Checkpoint(), number_of_tasks=2, family=family)
+    assert len(trajectories) == 2
+    for trajectory in trajectories:
+        question = trajectory["question"]
+        assert question["page"]["title"] in {"Alpha", "Beta"}
+        assert question["question"] == f"{question['page']['title']} 0?"
+        assert trajectory["answers"][trajectory["best_answer"]] == {"answer": "Right"}
+    pairs = list(dpo.preference_pairs({"task_family": "trivia", **trajectories[0]}))
+    # Each of the 4 questions and 5 answers is preferred over the ones ranked after it.
+    assert [pair["task"] for pair in pairs] == ["trivia_question"] * 6 + ["trivia_answer"] * 10
+    assert {pair["chosen"] for pair in pairs if pair["task"] == "trivia_answer"} >= {'{"answer":"Right"}'}
+
+
+def test_trivia_needs_a_wikipedia_dump(configure):
+    configure(TriviaBackend())
+    with pytest.raises(ValueError):
+        task_family.get_task_family("trivia").select_tasks(Checkpoint(), 1, 1)
+
+
+class ProseFirstTriviaBackend(TriviaBackend):
+    """Writes the first question of every iteration in prose instead of JSON, so that it is sampled again."""
+
+    def complete(self, session, model, temperature, sample_index=0):
+        if "Please write a challenging trivia question" in session[-1]["content"]:
+            if sample_index % suite.ITERATION_STRIDE == 0:
+                return backends.Completion("What a page!")
+        return super().complete(session, model, temperature, sample_index)
+
+
+def test_later_iterations_never_get_the_resampled_questions_of_earlier_ones(configure, tmp_path):
+    wikipedia = write_dump(tmp_path, [[(1, "Alpha", "First.")]])
+    configure(ProseFirstTriviaBackend(), wikipedia=wikipedia, cache={"path": str(tmp_path / "cache.sqlite")})
+    family = task_family.get_task_family("trivia")
+    questions = [
+        {
+            question["question"]
+            for question in family.select_tasks(Checkpoint(), 1, 1, iteration)["best_questions"][0]["questions"]
+        }
+        for iteration in (0, suite.RESAMPLE_STRIDE // family.number_of_questions)
+    ]
+    assert len(questions[0]) == len(questions[1]) == family.number_of_questions
+    assert not questions[0] & questions[1]
+
+
+class DisagreeingTriviaBackend(TriviaBackend):
+    """Judges who rank all the answers, but each of three of them a different answer the best."""
+
+    def __init__(self):
+        self.meta_rankings = 0
+
+    def complete(self, session, model, temperature, sample_index=0):
+        prompt = session[-1]["content"]
+        if "to judge the judges" in prompt:
+            self.meta_rankings += 1
+        if "Please rank the answers" in prompt and "to judge the judges" not in prompt:
+            best = [2, 0, 1][sample_index % 3]
+            order = [best] + [id for id in range(5) if id != best]
+            return backends.Completion(json.dumps([{"rationale": "Fine.", "id": id} for id in order]))
+        return super().complete(session, model, temperature, sample_index)
+
+
+def test_adaptive_sampling_compares_the_best_answers_of_the_judges(configure, tmp_path):
+    backend = DisagreeingTriviaBackend()
+    configure(backend, wikipedia=write_dump(tmp_path, [[(1, "Alpha", "First.")]]), adaptive_sampling=True)
+    family = task_family.get_task_family("trivia")
+    [trajectory] = suite.run_iteration(Checkpoint(), number_of_tasks=1, family=family)
+    # The question judges agree on the best question, but the answer judges don't, so more are sampled and ranked.
+    assert len(trajectory["question"]["question_rankings"]) == 2
+    assert "agree" in trajectory["question"]["best_question_ranking"]["rationale"]
+    assert len(trajectory["answer_rankings"]) == 5
+    assert trajectory["best_answer_ranking"] == {"rationale": "Fine.", "ranking_id": 0}
+    assert backend.meta_rankings == 1
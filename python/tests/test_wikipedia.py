@@ -0,0 +1,87 @@
+"""Tests for `recursive_self_improvement_suite.wikipedia`."""
+
+import bz2
+import random
+
+import pytest
+
+from recursive_self_improvement_suite import wikipedia
+from recursive_self_improvement_suite.wikipedia import WikipediaDump, plain_text
+
+HEADER = "<mediawiki><siteinfo><sitename>Wikipedia</sitename></siteinfo>\n"
+
+
+def page_xml(page_id, title, text, namespace=0, redirect=False):
+    return (
+        f"<page><title>{title}</title><ns>{namespace}</ns><id>{page_id}</id>"
+        + ("<redirect title=\"Elsewhere\" />" if redirect else "")
+        + f"<revision><id>{1000 + page_id}</id><text>{text}</text></revision></page>\n"
+    )
+
+
+def write_dump(directory, streams):
+    """Writes a multistream dump of the streams of (page_id, title, text, namespace, redirect) pages, and its index."""
+    dump = bytearray(bz2.compress(HEADER.encode("utf-8")))
+    index_lines = []
+    for pages in streams:
+        offset = len(dump)
+        dump += bz2.compress("".join(page_xml(*page) for page in pages).encode("utf-8"))
+        index_lines += [f"{offset}:{page[0]}:{page[1]}\n" for page in pages]
+    dump += bz2.compress(b"</mediawiki>\n")
+    dump_path = str(directory / "pages-articles-multistream.xml.bz2")
+    index_path = str(directory / "pages-articles-multistream-index.txt.bz2")
+    with open(dump_path, "wb") as dump_file:
+        dump_file.write(dump)
+    with bz2.open(index_path, "wt", encoding="utf-8") as index_file:
+        index_file.writelines(index_lines)
+    return {"dump": dump_path, "index": index_path}
+
+
+STREAMS = [
+    [(1, "Alpha", "First [[letter|letters]]."), (2, "Talk:Alpha", "Chat.", 1), (3, "Beta", "Second.")],
+    [(4, "Gamma", "Third &amp; last.", 0), (5, "Gama", "", 0, True)],
+]
+
+
+def test_pages_are_read_by_position_from_their_streams(tmp_path):
+    dump = WikipediaDump(**write_dump(tmp_path, STREAMS))
+    assert len(dump) == 5
+    assert [dump.page(position).title for position in range(5)] == ["Alpha", "Talk:Alpha", "Beta", "Gamma", "Gama"]
+    gamma = dump.page(3)
+    assert (gamma.page_id, gamma.text, gamma.is_article) == (4, "Third & last.", True)
+    assert not dump.page(1).is_article and not dump.page(4).is_article
+    dump.close()
+
+
+def test_random_pages_are_articles_and_the_offset_index_is_reused(tmp_path):
+    paths = write_dump(tmp_path, STREAMS)
+    WikipediaDump(**paths).close()
+    offsets = tmp_path / "pages-articles-multistream-index.txt.bz2.offsets"
+    assert offsets.stat().st_size == 5 * 16
+    built = offsets.stat().st_mtime_ns
+    dump = WikipediaDump(**paths)
+    assert offsets.stat().st_mtime_ns == built
+    rng = random.Random(0)
+    assert {dump.random_page(rng).title for _ in range(50)} == {"Alpha", "Beta", "Gamma"}
+
+
+def test_random_page_gives_up_without_articles(tmp_path):
+    dump = WikipediaDump(**write_dump(tmp_path, [[(1, "Talk:Alpha", "Chat.", 1)]]), max_attempts=3)
+    with pytest.raises(ValueError):
+        dump.random_page(random.Random(0))
+
+
+def test_plain_text_strips_the_markup():
+    wikitext = (
+        "'''Alpha''' is a {{lang|el|letter {{nested}}}} of the [[Greek alphabet|alphabet]].<ref>Source.</ref>"
+        "<!-- comment -->\n\n\n\n[[Category:Letters]]See [[Beta]]."
+    )
+    assert plain_text(wikitext) == "Alpha is a  of the alphabet.\n\nSee Beta."
+    assert plain_text(wikitext, max_characters=5) == "Alpha"
+
+
+def test_pages_are_decompressed_in_small_chunks(tmp_path, monkeypatch):
+    monkeypatch.setattr(wikipedia, "READ_BYTES", 7)
+    monkeypatch.setattr(wikipedia, "DECOMPRESSED_BYTES", 5)
+    dump = WikipediaDump(**write_dump(tmp_path, STREAMS))
+    assert [dump.page(position).page_id for position in range(5)] == [1, 2, 3, 4, 5]
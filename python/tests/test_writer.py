@@ -0,0 +1,45 @@
+"""Tests for `recursive_self_improvement_suite.writer`."""
+
+import gzip
+import json
+import os
+import zlib
+
+from recursive_self_improvement_suite.writer import ShardedJsonlWriter
+
+
+def read_records(directory):
+    records = []
+    for name in sorted(os.listdir(directory)):
+        opener = gzip.open if name.endswith(".gz") else open
+        with opener(os.path.join(directory, name), "rt", encoding="utf-8") as shard:
+            records.extend(json.loads(line) for line in shard)
+    return records
+
+
+def test_rotates_shards_by_size(tmp_path):
+    with ShardedJsonlWriter(str(tmp_path), max_shard_bytes=30) as writer:
+        for index in range(5):
+            writer.write({"index": index, "text": "äö"})
+    assert len(os.listdir(tmp_path)) == 5
+    assert [record["index"] for record in read_records(tmp_path)] == list(range(5))
+
+
+def test_compressed_records_are_flushed_before_closing(tmp_path):
+    writer = ShardedJsonlWriter(str(tmp_path), compress=True)
+    writer.write({"index": 0})
+    with open(tmp_path / "trajectories-00000.jsonl.gz", "rb") as shard:
+        # The stream isn't finished yet, but everything written so far decompresses.
+        content = zlib.decompressobj(16 + zlib.MAX_WBITS).decompress(shard.read())
+    assert json.loads(content) == {"index": 0}
+    writer.close()
+    assert read_records(tmp_path) == [{"index": 0}]
+
+
+def test_resumed_writer_continues_numbering(tmp_path):
+    with ShardedJsonlWriter(str(tmp_path)) as writer:
+        writer.write({"run": 0})
+    with ShardedJsonlWriter(str(tmp_path)) as writer:
+        writer.write({"run": 1})
+    assert sorted(os.listdir(tmp_path)) == ["trajectories-00000.jsonl", "trajectories-00001.jsonl"]
+    assert read_records(tmp_path) == [{"run": 0}, {"run": 1}]